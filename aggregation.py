@@ -0,0 +1,302 @@
+"""forestfires Temperature Aggregation
+
+Overview and Description
+========================
+
+This Python module contains functions to group temperature readings by the
+period (month, season, year or decade) they were recorded in and average them.
+Groups are computed with np.bincount over integer period keys, and can also be
+kept as running sums and counts, so a temperature file can be read in chunks
+and aggregated with memory that does not grow with the size of the file.
+
+Copyright and Usage Information
+===============================
+
+All forms of distribution of this code, whether as given or with any changes,
+are expressly prohibited.
+
+This file is Copyright (c) 2020 Will Assad, Jessica Zhai,
+Raghav Banka, and Fatimeh Hassan.
+"""
+from typing import Dict, List, Tuple, Union
+import numpy as np
+from entities import iter_temperature_chunks
+from instrumentation import instrumented
+
+GRANULARITIES = ['month', 'season', 'year', 'decade']
+
+# Meteorological seasons, where December belongs to the winter of the following year.
+SEASONS = ['DJF', 'MAM', 'JJA', 'SON']
+
+
+def period_keys(dates: np.ndarray, granularity: str) -> np.ndarray:
+    """Return an integer key for the period of each date in dates.
+
+    A key is the number of months since January 1970 for 'month', the number of
+    seasons since the winter of 1970 for 'season', the year for 'year' and the
+    first year of the decade for 'decade'.
+
+    Preconditions:
+     - granularity in GRANULARITIES
+
+    >>> dates = np.array(['1753-01-01', '1753-02-01', '1754-01-01'], dtype='datetime64[D]')
+    >>> period_keys(dates, 'year').tolist()
+    [1753, 1753, 1754]
+    >>> period_keys(dates, 'decade').tolist()
+    [1750, 1750, 1750]
+    """
+    if granularity in {'year', 'decade'}:
+        years = dates.astype('datetime64[Y]').astype(np.int64) + 1970
+        return years if granularity == 'year' else years // 10 * 10
+
+    months = dates.astype('datetime64[M]').astype(np.int64)
+    if granularity == 'month':
+        return months
+    else:
+        # shift by one month so that December falls in the following winter
+        return (months + 1) // 3
+
+
+def period_label(key: int, granularity: str) -> Union[int, Tuple[int, Union[int, str]]]:
+    """Return the period that key (as returned by period_keys) stands for: the year
+    for 'year', the first year of the decade for 'decade', a (year, month) tuple for
+    'month' and a (year, season) tuple for 'season'.
+
+    Preconditions:
+     - granularity in GRANULARITIES
+
+    >>> period_label(-2603, 'month')
+    (1753, 2)
+    >>> period_label(-868, 'season')  # December 1752
+    (1753, 'DJF')
+    """
+    if granularity in {'year', 'decade'}:
+        return key
+    elif granularity == 'month':
+        return (key // 12 + 1970, key % 12 + 1)
+    else:
+        return (key // 4 + 1970, SEASONS[key % 4])
+
+
+def group_sums(keys: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the distinct keys in sorted order, the sum of the values under each of
+    them and the number of values under each of them.
+
+    Keys are offset to start at 0 and counted with np.bincount, which takes time
+    linear in the number of values plus the range of the keys.
+
+    Preconditions:
+     - len(keys) == len(values)
+
+    >>> keys, sums, counts = group_sums(np.array([1754, 1753, 1754]), np.array([1.0, 2.0, 4.0]))
+    >>> (keys.tolist(), sums.tolist(), counts.tolist())
+    ([1753, 1754], [2.0, 5.0], [1, 2])
+    """
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0, dtype=np.int64)
+
+    lowest = keys.min()
+    offsets = keys - lowest
+    counts = np.bincount(offsets)
+    sums = np.bincount(offsets, weights=values, minlength=len(counts))
+
+    present = np.flatnonzero(counts)
+    return present + lowest, sums[present], counts[present]
+
+
+@instrumented
+def aggregate(dates: np.ndarray, values: np.ndarray,
+              granularity: str) -> Tuple[List, np.ndarray, np.ndarray]:
+    """Return the periods of the given granularity that dates fall in, in order, with
+    the mean of values in each period and the number of values in each period.
+
+    Preconditions:
+     - len(dates) == len(values)
+     - granularity in GRANULARITIES
+
+    >>> dates = np.array(['1753-01-01', '1753-02-01', '1754-01-01'], dtype='datetime64[D]')
+    >>> periods, means, counts = aggregate(dates, np.array([7.0, 9.0, 5.0]), 'year')
+    >>> (periods, means.tolist(), counts.tolist())
+    ([1753, 1754], [8.0, 5.0], [2, 1])
+    """
+    keys, sums, counts = group_sums(period_keys(dates, granularity), values)
+    return [period_label(key, granularity) for key in keys.tolist()], sums / counts, counts
+
+
+@instrumented
+def aggregate_with_uncertainty(dates: np.ndarray, values: np.ndarray, uncertainties: np.ndarray,
+                               granularity: str) -> Tuple[List, np.ndarray, np.ndarray]:
+    """Return the periods of the given granularity that dates fall in, in order, with
+    the mean of values in each period and the uncertainty of that mean, where
+    uncertainties[i] is the uncertainty of values[i] and the errors of different
+    values are independent.
+
+    The uncertainty of the mean of m values is sqrt(the sum of their squared
+    uncertainties) / m. The values themselves are not weighted by their
+    uncertainties, since the readings in a period are of different months, whose
+    uncertainties vary with the season, and weighting them would bias the mean
+    towards the better measured seasons. Instead, the periods can be weighted by
+    the inverse variance of their means when a line is fitted to them.
+
+    Preconditions:
+     - len(dates) == len(values) == len(uncertainties)
+     - granularity in GRANULARITIES
+
+    >>> dates = np.array(['1753-01-01', '1753-02-01', '1754-01-01'], dtype='datetime64[D]')
+    >>> periods, means, errors = aggregate_with_uncertainty(
+    ...     dates, np.array([7.0, 9.0, 5.0]), np.array([3.0, 4.0, 0.5]), 'year')
+    >>> (periods, means.tolist(), errors.tolist())
+    ([1753, 1754], [8.0, 5.0], [2.5, 0.5])
+    """
+    keys = period_keys(dates, granularity)
+    unique_keys, sums, counts = group_sums(keys, values)
+    _, variances, _ = group_sums(keys, uncertainties ** 2)
+    return ([period_label(key, granularity) for key in unique_keys.tolist()],
+            sums / counts, np.sqrt(variances) / counts)
+
+
+
+@instrumented
+def aggregate_weighted(dates: np.ndarray, values: np.ndarray, uncertainties: np.ndarray,
+                       granularity: str) -> Tuple[List, np.ndarray, np.ndarray]:
+    """Return the periods of the given granularity that dates fall in, in order, with
+    the inverse-variance weighted mean of values in each period and the uncertainty of
+    that mean, where uncertainties[i] is the uncertainty of values[i].
+
+    Each value is weighted by 1 / uncertainties[i] ** 2, and the uncertainty of the
+    weighted mean of a period is 1 / sqrt(the sum of its weights).
+
+    Preconditions:
+     - granularity in GRANULARITIES
+     - np.all(uncertainties > 0)
+
+    >>> dates = np.array(['1753-01-01', '1753-02-01', '1754-01-01'], dtype='datetime64[D]')
+    >>> periods, means, errors = aggregate_weighted(
+    ...     dates, np.array([7.0, 9.0, 5.0]), np.array([1.0, 2.0, 0.5]), 'year')
+    >>> (periods, means.tolist(), errors.tolist())
+    ([1753, 1754], [7.4, 5.0], [0.8944271909999159, 0.5])
+    """
+    keys = period_keys(dates, granularity)
+    weights = 1.0 / uncertainties ** 2
+    unique_keys, weighted_sums, _ = group_sums(keys, weights * values)
+    _, total_weights, _ = group_sums(keys, weights)
+    return ([period_label(key, granularity) for key in unique_keys.tolist()],
+            weighted_sums / total_weights, 1.0 / np.sqrt(total_weights))
+
+class RunningMeans:
+    """Running sums and counts of values grouped by an integer key.
+
+    Instance Attributes:
+     - sums: maps each key to the sum of the values added under it
+     - counts: maps each key to the number of values added under it
+
+    Representation Invariants:
+     - self.sums.keys() == self.counts.keys()
+     - all(self.counts[key] > 0 for key in self.counts)
+
+    >>> means = RunningMeans()
+    >>> means.add(np.array([1753, 1753]), np.array([7.0, 9.0]))
+    >>> means.add(np.array([1753, 1754]), np.array([11.0, 5.0]))
+    >>> means.means()
+    {1753: 9.0, 1754: 5.0}
+    """
+    sums: Dict[int, float]
+    counts: Dict[int, int]
+
+    def __init__(self) -> None:
+        self.sums = {}
+        self.counts = {}
+
+    def add(self, keys: np.ndarray, values: np.ndarray) -> None:
+        """Add each value in values under the key at the same index of keys.
+
+        Preconditions:
+         - len(keys) == len(values)
+        """
+        unique_keys, sums, counts = group_sums(keys, values)
+
+        for key, total, count in zip(unique_keys.tolist(), sums.tolist(), counts.tolist()):
+            self.sums[key] = self.sums.get(key, 0.0) + total
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def means(self) -> Dict[int, float]:
+        """Return a dictionary mapping each key to the mean of its values, in key order."""
+        return {key: self.sums[key] / self.counts[key] for key in sorted(self.sums)}
+
+
+@instrumented
+def stream_aggregate(file_path: str, city: str, granularity: str = 'year',
+                     chunk_size: int = 65536,
+                     with_uncertainty: bool = False) -> Tuple[List, np.ndarray, np.ndarray]:
+    """Return the same periods, means and counts as aggregate for the temperatures
+    of city, reading file_path chunk_size rows at a time. If with_uncertainty is True,
+    return the same periods, means and uncertainties as aggregate_with_uncertainty
+    instead.
+
+    Peak memory depends on chunk_size and the number of periods, not on the size
+    of the file.
+
+    Preconditions:
+     - os.path.exists(file_path)
+     - data at file_path is in the form as described by fileformats.md
+     - granularity in GRANULARITIES
+     - chunk_size > 0
+    """
+    running = RunningMeans()
+    # the sums of the squared uncertainties of each period
+    running_variances = RunningMeans()
+
+    for records, cities in iter_temperature_chunks(file_path, chunk_size):
+        if city in cities:
+            rows = records[records['city'] == cities.index(city)]
+            keys = period_keys(rows['date'], granularity)
+            running.add(keys, rows['temperature'])
+            if with_uncertainty:
+                running_variances.add(keys, rows['uncertainty'] ** 2)
+
+    keys = sorted(running.sums)
+    counts = np.array([running.counts[key] for key in keys], dtype=np.int64)
+    means = np.array([running.sums[key] for key in keys]) / counts
+    labels = [period_label(key, granularity) for key in keys]
+
+    if with_uncertainty:
+        return (labels, means,
+                np.sqrt(np.array([running_variances.sums[key] for key in keys])) / counts)
+    return labels, means, counts
+
+
+def stream_average_temperatures(file_path: str, city: str, granularity: str = 'year',
+                                chunk_size: int = 65536) -> Dict:
+    """Return a dictionary mapping each period to the average temperature in city,
+    reading file_path chunk_size rows at a time.
+
+    Preconditions:
+     - os.path.exists(file_path)
+     - data at file_path is in the form as described by fileformats.md
+     - granularity in GRANULARITIES
+     - chunk_size > 0
+
+    >>> averages = stream_average_temperatures('data/portugaltemperatures.csv', 'Amadora')
+    >>> round(averages[1753], 3)
+    15.521
+    """
+    periods, means, _ = stream_aggregate(file_path, city, granularity, chunk_size)
+    return dict(zip(periods, means.tolist()))
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 100,
+        'extra-imports': ['python_ta.contracts', 'typing', 'numpy', 'entities',
+                          'instrumentation'],
+        'allowed-io': []
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+
+    import doctest
+    doctest.testmod()
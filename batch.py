@@ -0,0 +1,320 @@
+"""forestfires Batch Analyses
+
+Overview and Description
+========================
+
+This Python module runs a declared list of analyses without any interaction
+and without displaying anything. The analyses are read from a JSON file like
+the following, where "cities" may also be "all":
+
+    {
+        "fires_file": "data/forestfires.csv",
+        "temperatures_file": "data/portugaltemperatures.csv",
+        "cities": ["Braga", "Lisbon"],
+        "analyses": [
+            {"type": "trendline", "x": "temperature", "y": "dc", "start": null},
+            {"type": "trendline", "x": "temperature", "y": "isi", "months": [6, 9],
+             "percentiles": [5, 95]},
+            {"type": "trendline", "pairs": "all"},
+            {"type": "double_regression", "x1": "temperature", "x2": "humidity", "y": "isi"},
+            {"type": "predict_temperature", "years": [2040, 2060]},
+            {"type": "dc_projection", "weighted": true},
+            {"type": "scenarios", "years": [2040, 2060], "offsets": [0, 1, 2],
+             "targets": ["dc", "isi", "area"]}
+        ]
+    }
+
+Numeric results are written as a list of records to a .json file, or as a
+table to a .parquet file (which needs pyarrow). Figures can optionally be
+written to .html files, or to .png/.svg/.pdf files (which needs kaleido).
+
+    python batch.py analyses.json -o results.json --figures figures/
+
+Run without arguments, this module is checked with python_ta and its doctests.
+
+Copyright and Usage Information
+===============================
+
+All forms of distribution of this code, whether as given or with any changes,
+are expressly prohibited.
+
+This file is Copyright (c) 2020 Will Assad, Jessica Zhai,
+Raghav Banka, and Fatimeh Hassan.
+"""
+import argparse
+import importlib.util
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional
+from entities import FIRE_VARIABLES, DatasetCache, load_temperature_store
+from models import Model, trendline_figure
+from rendering import FigureExporter
+from scenarios import sweep_models, table_records
+
+ANALYSES = ['trendline', 'double_regression', 'predict_temperature', 'dc_projection',
+            'scenarios']
+
+FIGURE_FORMATS = ['html', 'png', 'svg', 'pdf']
+
+# the optional modules needed to write results as .parquet files, and figures as
+# .png/.svg/.pdf files
+PARQUET_MODULES = ['pandas', 'pyarrow']
+IMAGE_MODULES = ['kaleido']
+
+
+def run_analyses(spec: Dict[str, Any], figures_dir: Optional[str] = None,
+                 figure_format: str = 'html') -> List[Dict[str, Any]]:
+    """Run every analysis in spec and return one record per result.
+
+    Analyses of the forest fire data are run once; analyses of temperatures are run
+    for every city in spec, and a 'scenarios' analysis sweeps every city at once.
+    Each record names its analysis, city (None if it does not depend on the city)
+    and parameters, and holds the results and the seconds the analysis took. If
+    figures_dir is given, a figure of each result is written there in figure_format,
+    from background threads while the analyses continue.
+
+    Preconditions:
+     - all(analysis['type'] in ANALYSES for analysis in spec['analyses'])
+     - figure_format in FIGURE_FORMATS
+
+    >>> spec = {'fires_file': 'data/forestfires.csv',
+    ...         'temperatures_file': 'data/portugaltemperatures.csv', 'cities': ['Amadora'],
+    ...         'analyses': [{'type': 'predict_temperature', 'years': [2060]}]}
+    >>> records = run_analyses(spec)
+    >>> (records[0]['city'], round(records[0]['temperature'], 3))
+    ('Amadora', 16.069)
+    """
+    fires_file = spec.get('fires_file', 'data/forestfires.csv')
+    temperatures_file = spec.get('temperatures_file', 'data/portugaltemperatures.csv')
+    cities = spec.get('cities', 'all')
+    if cities == 'all':
+        cities = load_temperature_store(temperatures_file).cities()
+
+    # every model shares one cache, so each file is parsed once for the whole batch
+    cache = DatasetCache()
+    models = [Model(fires_file, temperatures_file, city, cache) for city in cities]
+
+    exporter = None if figures_dir is None else FigureExporter(figures_dir, figure_format)
+
+    records = []  # ACCUMULATOR: the records of the analyses run so far
+    try:
+        for analysis in spec['analyses']:
+            if analysis['type'] in {'trendline', 'double_regression'}:
+                records.extend(run_fire_analysis(models[0], analysis, exporter))
+            elif analysis['type'] == 'scenarios':
+                records.extend(run_scenario_analysis(models, analysis))
+            else:
+                for model in models:
+                    records.extend(run_city_analysis(model, analysis, exporter))
+    finally:
+        if exporter is not None:
+            exporter.close()
+
+    return records
+
+
+def run_fire_analysis(model: Model, analysis: Dict[str, Any],
+                      exporter: Optional[FigureExporter]) -> List[Dict[str, Any]]:
+    """Return the records of a 'trendline' or 'double_regression' analysis of the
+    forest fire data of model.
+
+    Preconditions:
+     - analysis['type'] in {'trendline', 'double_regression'}
+    """
+    start_time = time.perf_counter()
+
+    if analysis['type'] == 'double_regression':
+        x1, x2, y = analysis['x1'], analysis['x2'], analysis['y']
+        fit = model.regression([x1, x2], y)
+        constant, x1_coefficient, x2_coefficient = fit.coefficients.tolist()
+        records = [{'analysis': 'double_regression', 'city': None, 'x1': x1, 'x2': x2, 'y': y,
+                    'constant': constant, 'x1_coefficient': x1_coefficient,
+                    'x2_coefficient': x2_coefficient, 'r_squared': fit.r_squared}]
+        figures = {f'double_regression_{x1}_{x2}_{y}': lambda: model.variables_figure(x1, x2, y)}
+
+    elif analysis.get('pairs') == 'all':
+        fits = model.all_trendlines()
+        records = [{'analysis': 'trendline', 'city': None, 'x': x, 'y': y, 'start': None,
+                    'intercept': float(fits.intercepts[i, j]), 'slope': float(fits.slopes[i, j]),
+                    'r_squared': float(fits.r_squared[i, j])}
+                   for i, x in enumerate(FIRE_VARIABLES) for j, y in enumerate(FIRE_VARIABLES)
+                   if i != j]
+        figures = {}
+
+    else:
+        x, y = analysis['x'], analysis['y']
+        domain = {key: analysis.get(key) for key in ['start', 'end', 'months', 'percentiles']}
+        x_data, y_data = model.restrict_domain(x, y, **domain)
+        fit = model.trendline_fit(x, y, **domain)
+        records = [{'analysis': 'trendline', 'city': None, 'x': x, 'y': y, **domain,
+                    'intercept': fit.intercept, 'slope': fit.slope, 'r_squared': fit.r_squared}]
+        figures = {f'trendline_{x}_{y}{domain_name(domain)}':
+                   lambda: trendline_figure((x, x_data), (y, y_data))}
+
+    seconds = time.perf_counter() - start_time
+    for record in records:
+        record['seconds'] = seconds
+
+    write_figures(figures, exporter)
+    return records
+
+
+def domain_name(domain: Dict[str, Any]) -> str:
+    """Return the part of a figure's file name that tells apart the trendlines of the
+    same variables over the given domain, with each bound that is None left out.
+
+    >>> domain_name({'start': 30, 'end': None, 'months': [6, 9], 'percentiles': None})
+    '_start30_months6-9'
+    >>> domain_name({'start': None})
+    ''
+    """
+    name = ''  # ACCUMULATOR: the parts of the name for the bounds seen so far
+    for key, value in domain.items():
+        if value is not None:
+            bounds = value if isinstance(value, (list, tuple)) else [value]
+            name += f'_{key}' + '-'.join(str(bound) for bound in bounds)
+    return name
+
+
+def run_city_analysis(model: Model, analysis: Dict[str, Any],
+                      exporter: Optional[FigureExporter]) -> List[Dict[str, Any]]:
+    """Return the records of a 'predict_temperature' or 'dc_projection' analysis of
+    model.city, from the weighted temperature fit if analysis['weighted'] is true.
+
+    Preconditions:
+     - analysis['type'] in {'predict_temperature', 'dc_projection'}
+    """
+    start_time = time.perf_counter()
+    weighted = analysis.get('weighted', False)
+
+    if analysis['type'] == 'predict_temperature':
+        records = [{'analysis': 'predict_temperature', 'city': model.city, 'year': year,
+                    'weighted': weighted, 'temperature': model.predict_temperature(year, weighted)}
+                   for year in analysis.get('years', [2060])]
+        series = ('Temperature', model.get_average_temperatures())
+    else:
+        series = ('dc', model.project_dc(weighted))
+        records = [{'analysis': 'dc_projection', 'city': model.city, 'year': year,
+                    'weighted': weighted, 'dc': dc}
+                   for year, dc in series[1].items()]
+
+    seconds = time.perf_counter() - start_time
+    for record in records:
+        record['seconds'] = seconds
+
+    name = f'{analysis["type"]}_{model.city}{"_weighted" if weighted else ""}'
+    write_figures({name: lambda: trendline_figure(('Year', list(series[1].keys())),
+                                                  (series[0], list(series[1].values())))},
+                  exporter)
+    return records
+
+
+def run_scenario_analysis(models: List[Model],
+                          analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Return one record per scenario and target of a 'scenarios' analysis of the cities
+    of models, as computed by scenarios.sweep_models.
+
+    Preconditions:
+     - analysis['type'] == 'scenarios'
+    """
+    start_time = time.perf_counter()
+    table = sweep_models(models, analysis.get('years', [2060]), analysis.get('offsets', [0.0]),
+                         analysis.get('targets', ['dc']), weighted=analysis.get('weighted', False))
+    seconds = time.perf_counter() - start_time
+
+    return [{'analysis': 'scenarios', **record, 'seconds': seconds}
+            for record in table_records(table)]
+
+
+def write_figures(figures: Dict[str, Any], exporter: Optional[FigureExporter]) -> None:
+    """Build each figure in figures (a dictionary mapping a file name to a function
+    returning a figure) and submit it to exporter to be written. Do nothing if
+    exporter is None.
+    """
+    if exporter is None:
+        return
+
+    for name, build in figures.items():
+        exporter.submit(name, build())
+
+
+def missing_modules(modules: List[str]) -> List[str]:
+    """Return the modules in modules that are not installed.
+
+    >>> missing_modules(['json', 'no_such_module'])
+    ['no_such_module']
+    """
+    return [module for module in modules if importlib.util.find_spec(module) is None]
+
+
+def write_records(records: List[Dict[str, Any]], output_path: str) -> None:
+    """Write records to output_path as a JSON list, or as a Parquet table if
+    output_path ends in .parquet.
+
+    Raise ImportError if output_path ends in .parquet and PARQUET_MODULES are not all
+    installed.
+    """
+    if output_path.endswith('.parquet'):
+        missing = missing_modules(PARQUET_MODULES)
+        if missing != []:
+            raise ImportError(f'writing .parquet files needs {", ".join(missing)}')
+        import pandas as pd
+        pd.DataFrame(records).to_parquet(output_path)
+    else:
+        with open(output_path, 'w') as file:
+            json.dump(records, file, indent=2)
+
+
+def run_cli(arguments: List[str]) -> int:
+    """Run the analyses of the JSON file named in arguments, as described in the module
+    docstring, and return the exit status."""
+    parser = argparse.ArgumentParser(description='Run forest fire analyses without interaction.')
+    parser.add_argument('spec', help='JSON file declaring the analyses to run')
+    parser.add_argument('-o', '--output', default='results.json',
+                        help='file to write the results to (.json or .parquet)')
+    parser.add_argument('--figures', default=None,
+                        help='directory to write a figure of each result to')
+    parser.add_argument('--figure-format', default='html', choices=FIGURE_FORMATS)
+    options = parser.parse_args(arguments)
+
+    # check for optional modules before running any analysis, rather than failing after
+    missing = []  # ACCUMULATOR: the modules the requested output needs but are missing
+    if options.output.endswith('.parquet'):
+        missing.extend(missing_modules(PARQUET_MODULES))
+    if options.figures is not None and options.figure_format != 'html':
+        missing.extend(missing_modules(IMAGE_MODULES))
+    if missing != []:
+        parser.error(f'the requested output needs {", ".join(missing)} to be installed; '
+                     f'write results to .json and figures to .html instead')
+
+    with open(options.spec) as file:
+        spec = json.load(file)
+
+    records = run_analyses(spec, options.figures, options.figure_format)
+    write_records(records, options.output)
+    return 0
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        # run the analyses, e.g. python batch.py analyses.json -o results.json
+        sys.exit(run_cli(sys.argv[1:]))
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 100,
+        'extra-imports': ['python_ta.contracts', 'argparse', 'importlib.util', 'json', 'sys',
+                          'time', 'typing', 'pandas', 'entities', 'models', 'rendering',
+                          'scenarios'],
+        'allowed-io': ['write_records', 'run_cli'],
+        'disable': ['C0415']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+
+    import doctest
+    doctest.testmod()
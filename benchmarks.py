@@ -0,0 +1,389 @@
+"""forestfires Benchmarks
+
+Overview and Description
+========================
+
+This Python module measures the performance of the program. The startup
+benchmark times importing a module in a fresh interpreter and checks that it
+does not import any of the plotting or statistics libraries, which are only
+needed once a figure is built.
+
+    python benchmarks.py startup
+
+The suite benchmark times the loaders and the main computations of Model on the
+bundled data and on synthetic copies of it with every row repeated 10 or 100
+times (or any other --scales), each on a freshly constructed Model so that
+parsing is included. Each benchmark runs in a fresh interpreter, which reports
+the best wall time over the repeats and, from a first run, how much the peak
+resident memory grew and how many more memory blocks were still allocated
+afterwards, once its result was freed (which needs the resource module, so not on
+Windows), and, from a separate last run traced by tracemalloc so that the timed
+runs are not slowed by tracing, the peak size of the memory Python allocated.
+Results can be saved as a baseline, and a later run compared against it fails if
+any benchmark got slower, used more memory or retained more blocks than the
+tolerance allows.
+
+    python benchmarks.py suite --save baseline.json
+    python benchmarks.py suite --compare baseline.json
+
+Run without arguments, this module is checked with python_ta and its doctests.
+
+Copyright and Usage Information
+===============================
+
+All forms of distribution of this code, whether as given or with any changes,
+are expressly prohibited.
+
+This file is Copyright (c) 2020 Will Assad, Jessica Zhai,
+Raghav Banka, and Fatimeh Hassan.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+from entities import process_forestfires, process_temperatures
+from models import Model
+
+# Libraries that must not be imported until they are used.
+HEAVY_MODULES = ['plotly', 'pandas', 'scipy', 'statsmodels']
+
+# The most time, in seconds, that importing a module may add to interpreter startup.
+STARTUP_LIMIT = 1.0
+
+# The modules a short-lived process may start with.
+STARTUP_MODULES = ['entities', 'models', 'multicity', 'batch', 'main']
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FIRES_FILE = os.path.join(PROJECT_DIR, 'data', 'forestfires.csv')
+TEMPERATURES_FILE = os.path.join(PROJECT_DIR, 'data', 'portugaltemperatures.csv')
+
+# The city whose temperatures are benchmarked.
+CITY = 'Braga'
+
+# How many times each row of the bundled data is repeated in the synthetic datasets.
+DEFAULT_SCALES = [1, 10, 100]
+
+# How much slower or larger than its baseline a benchmark may be before a comparison fails.
+DEFAULT_TOLERANCE = 0.5
+# measurements below these are treated as noise when comparing against a baseline
+NOISE_FLOORS = {'seconds': 0.001, 'peak_bytes': 1 << 20, 'retained_blocks': 1000,
+                'traced_peak_bytes': 1 << 20}
+
+
+def time_import(module: str, repeats: int = 5) -> float:
+    """Return the least time, in seconds, that starting a fresh interpreter and
+    importing module took over the given number of repeats, less the time to
+    start an interpreter that imports nothing.
+
+    Preconditions:
+     - repeats >= 1
+    """
+    return max(min_run_time(f'import {module}', repeats) - min_run_time('pass', repeats), 0.0)
+
+
+def min_run_time(code: str, repeats: int) -> float:
+    """Return the least wall time, in seconds, of running code in a fresh interpreter."""
+    times = []  # ACCUMULATOR: the time of each run so far
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True, cwd=PROJECT_DIR)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def heavy_imports(module: str) -> List[str]:
+    """Return the modules of HEAVY_MODULES that importing module in a fresh interpreter
+    imports.
+
+    >>> heavy_imports('models')
+    []
+    """
+    code = (f'import json, sys, {module}\n'
+            f'print(json.dumps(sorted({{name.split(".")[0] for name in sys.modules}}\n'
+            f'                        & {set(HEAVY_MODULES)})))')
+    result = subprocess.run([sys.executable, '-c', code], check=True, cwd=PROJECT_DIR,
+                            capture_output=True, text=True)
+    return json.loads(result.stdout)
+
+
+def check_startup(modules: List[str], limit: float = STARTUP_LIMIT) -> List[Dict[str, Any]]:
+    """Return the import time and heavy imports of each module in modules, and raise
+    an AssertionError if any module imports a heavy module or takes longer than limit
+    seconds to import.
+    """
+    results = [{'module': module, 'seconds': time_import(module),
+                'heavy_imports': heavy_imports(module)} for module in modules]
+
+    for result in results:
+        assert result['heavy_imports'] == [], \
+            f'importing {result["module"]} imports {", ".join(result["heavy_imports"])}'
+        assert result['seconds'] <= limit, \
+            f'importing {result["module"]} took {result["seconds"]:.3f}s (limit {limit}s)'
+
+    return results
+
+
+def bench_process_forestfires(fires_file: str, _: str) -> Any:
+    """Benchmark process_forestfires."""
+    return process_forestfires(fires_file)
+
+
+def bench_process_temperatures(_: str, temperatures_file: str) -> Any:
+    """Benchmark process_temperatures."""
+    return process_temperatures(temperatures_file, CITY)
+
+
+def bench_get_average_temperatures(fires_file: str, temperatures_file: str) -> Any:
+    """Benchmark Model.get_average_temperatures, including loading the data."""
+    return Model(fires_file, temperatures_file, CITY).get_average_temperatures()
+
+
+def bench_trendline(fires_file: str, temperatures_file: str) -> Any:
+    """Benchmark Model.trendline without a plot, including loading the data."""
+    return Model(fires_file, temperatures_file, CITY).trendline('temperature', 'dc', False)
+
+
+def bench_coef_double_regression(fires_file: str, temperatures_file: str) -> Any:
+    """Benchmark Model.coef_double_regression, including loading the data."""
+    return Model(fires_file, temperatures_file, CITY).coef_double_regression(
+        'temperature', 'humidity', 'isi')
+
+
+def bench_dc_versus_year(fires_file: str, temperatures_file: str) -> Any:
+    """Benchmark the computation of Model.dc_versus_year (Model.project_dc, which it
+    plots), including loading the data."""
+    return Model(fires_file, temperatures_file, CITY).project_dc()
+
+
+BENCHMARKS: Dict[str, Callable[[str, str], Any]] = {
+    'process_forestfires': bench_process_forestfires,
+    'process_temperatures': bench_process_temperatures,
+    'get_average_temperatures': bench_get_average_temperatures,
+    'trendline': bench_trendline,
+    'coef_double_regression': bench_coef_double_regression,
+    'dc_versus_year': bench_dc_versus_year
+}
+
+
+def write_scaled_copy(file_path: str, scale: int, directory: str) -> str:
+    """Write a copy of the csv file at file_path to directory with every row after the
+    header repeated scale times, and return the path of the copy.
+
+    Preconditions:
+     - scale >= 1
+    """
+    with open(file_path, encoding='utf-8') as file:
+        header = file.readline()
+        body = file.read()
+    if not body.endswith('\n'):
+        body += '\n'
+
+    copy_path = os.path.join(directory, f'{scale}x_{os.path.basename(file_path)}')
+    with open(copy_path, 'w', encoding='utf-8') as file:
+        file.write(header)
+        for _ in range(scale):
+            file.write(body)
+    return copy_path
+
+
+def measure(name: str, files: Tuple[str, str], repeats: int) -> Dict[str, float]:
+    """Return the measurements of the benchmark called name on files, as returned by
+    measure_in_process, taken in a fresh interpreter.
+
+    A fresh interpreter is used so that no benchmark sees the caches of another, and
+    so that the peak memory of earlier runs does not hide that of this one.
+
+    Preconditions:
+     - name in BENCHMARKS
+     - repeats >= 1
+    """
+    code = (f'import benchmarks, json; '
+            f'print(json.dumps(benchmarks.measure_in_process({name!r}, {files!r}, {repeats})))')
+    result = subprocess.run([sys.executable, '-c', code], check=True, cwd=PROJECT_DIR,
+                            capture_output=True, text=True)
+    return json.loads(result.stdout)
+
+
+def measure_in_process(name: str, files: Tuple[str, str], repeats: int) -> Dict[str, float]:
+    """Run the benchmark called name on files once, then the given number of repeats
+    more times, and return the best wall time in seconds of the repeats, how many
+    bytes the peak resident memory of this process grew by in the first run, how
+    many more memory blocks Python had allocated after the first run (and freeing its
+    result) than before it, which are those retained by caches or leaked, and the
+    peak number of bytes Python had allocated during one more run traced by
+    tracemalloc.
+
+    The traced run comes after the timed repeats, since tracing slows every
+    allocation, and after the first run, since the traces take memory of their own.
+
+    Preconditions:
+     - name in BENCHMARKS
+     - repeats >= 1
+    """
+    import resource
+
+    peak_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    blocks_before = sys.getallocatedblocks()
+    result = BENCHMARKS[name](*files)
+    peak_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - peak_before
+    del result
+    retained_blocks = sys.getallocatedblocks() - blocks_before
+
+    times = []  # ACCUMULATOR: the wall time of each repeat so far
+    for _ in range(repeats):
+        start = time.perf_counter()
+        BENCHMARKS[name](*files)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    BENCHMARKS[name](*files)
+    traced_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # ru_maxrss is in bytes on macOS and in kibibytes elsewhere
+    return {'seconds': min(times),
+            'peak_bytes': peak_growth if sys.platform == 'darwin' else peak_growth * 1024,
+            'retained_blocks': retained_blocks, 'traced_peak_bytes': traced_peak}
+
+
+def run_suite(scales: List[int], repeats: int) -> List[Dict[str, Any]]:
+    """Return the measurements of every benchmark in BENCHMARKS at every scale in scales.
+
+    Preconditions:
+     - all(scale >= 1 for scale in scales)
+     - repeats >= 1
+    """
+    results = []  # ACCUMULATOR: the measurements so far
+
+    with tempfile.TemporaryDirectory() as directory:
+        for scale in scales:
+            if scale == 1:
+                files = (FIRES_FILE, TEMPERATURES_FILE)
+            else:
+                files = (write_scaled_copy(FIRES_FILE, scale, directory),
+                         write_scaled_copy(TEMPERATURES_FILE, scale, directory))
+
+            for name in BENCHMARKS:
+                results.append({'benchmark': name, 'scale': scale,
+                                **measure(name, files, repeats)})
+
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]],
+            tolerance: float) -> List[str]:
+    """Return a description of every result whose time, peak memory, retained blocks or
+    traced peak memory were more than (1 + tolerance) times its measurement in baseline, or its
+    NOISE_FLOORS value if larger. Measurements missing from baseline are not compared.
+
+    >>> old = [{'benchmark': 'trendline', 'scale': 1, 'seconds': 1.0, 'peak_bytes': 100,
+    ...         'retained_blocks': 5000}]
+    >>> new = [{'benchmark': 'trendline', 'scale': 1, 'seconds': 2.0, 'peak_bytes': 100,
+    ...         'retained_blocks': 9000}]
+    >>> compare(new, old, 0.5)  # doctest: +NORMALIZE_WHITESPACE
+    ['trendline at 1x: seconds 2 > 1 (baseline) * 1.5',
+     'trendline at 1x: retained_blocks 9000 > 5000 (baseline) * 1.5']
+    """
+    previous = {(result['benchmark'], result['scale']): result for result in baseline}
+    regressions = []  # ACCUMULATOR: the descriptions of the regressions found so far
+
+    for result in results:
+        key = (result['benchmark'], result['scale'])
+        if key not in previous:
+            continue
+        for measurement, floor in NOISE_FLOORS.items():
+            if measurement not in previous[key]:
+                continue
+            if result[measurement] > max(previous[key][measurement], floor) * (1 + tolerance):
+                regressions.append(f'{key[0]} at {key[1]}x: {measurement} '
+                                   f'{result[measurement]:.4g} > '
+                                   f'{previous[key][measurement]:.4g} (baseline) * {1 + tolerance}')
+
+    return regressions
+
+
+def run_cli(arguments: List[str]) -> int:
+    """Run the benchmark named in arguments, print its results and return the exit status."""
+    parser = argparse.ArgumentParser(description='Benchmark the forest fire program.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    startup = commands.add_parser('startup', help='time and check module imports')
+    startup.add_argument('modules', nargs='*', default=STARTUP_MODULES)
+    startup.add_argument('--limit', type=float, default=STARTUP_LIMIT)
+
+    suite = commands.add_parser('suite', help='time the loaders and models')
+    suite.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES)
+    suite.add_argument('--repeats', type=int, default=5)
+    suite.add_argument('--save', help='file to save the results to as a baseline')
+    suite.add_argument('--compare', help='baseline file to compare the results against')
+    suite.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+
+    options = parser.parse_args(arguments)
+    if options.command == 'suite':
+        return run_suite_cli(options)
+
+    try:
+        results = check_startup(options.modules, options.limit)
+    except AssertionError as error:
+        print(f'FAILED: {error}')
+        return 1
+
+    for result in results:
+        print(f'{result["module"]:<12} {result["seconds"] * 1000:8.1f} ms')
+    return 0
+
+
+def run_suite_cli(options: argparse.Namespace) -> int:
+    """Run the suite with the parsed command line options, print its results and
+    return the exit status."""
+    results = run_suite(options.scales, options.repeats)
+
+    print(f'{"benchmark":<26} {"scale":>6} {"ms":>10} {"peak KiB":>10} {"retained":>9} '
+          f'{"traced KiB":>11}')
+    for result in results:
+        print(f'{result["benchmark"]:<26} {result["scale"]:>5}x {result["seconds"] * 1000:10.2f} '
+              f'{result["peak_bytes"] / 1024:10.0f} {result["retained_blocks"]:9} '
+              f'{result["traced_peak_bytes"] / 1024:11.0f}')
+
+    if options.save is not None:
+        with open(options.save, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if options.compare is not None:
+        with open(options.compare) as file:
+            regressions = compare(results, json.load(file), options.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION: {regression}')
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        # run a benchmark, e.g. python benchmarks.py startup
+        sys.exit(run_cli(sys.argv[1:]))
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 100,
+        'extra-imports': ['python_ta.contracts', 'argparse', 'json', 'os', 'subprocess', 'sys',
+                          'tempfile', 'time', 'tracemalloc', 'typing', 'resource', 'entities',
+                          'models'],
+        'allowed-io': ['write_scaled_copy', 'run_cli', 'run_suite_cli'],
+        'disable': ['C0415']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+
+    import doctest
+    doctest.testmod()
@@ -7,7 +7,8 @@ This Python module contains the data class definitions and functions to read
 datasets located in the data subdirectory. In some cases, data is read as
 dictionaries with the key as the column name and values as a list of values.
 In other cases, we use Python's dataclass to represent a row of temperature
-data.
+data. Both files are parsed in one vectorized pass into structured NumPy
+arrays, which the other representations are built from.
 
 Copyright and Usage Information
 ===============================
@@ -18,10 +19,14 @@ are expressly prohibited.
 This file is Copyright (c) 2020 Will Assad, Jessica Zhai,
 Raghav Banka, and Fatimeh Hassan.
 """
-import csv
 from dataclasses import dataclass
 import datetime
-from typing import List, Dict
+import itertools
+import json
+from typing import Any, Callable, Iterator, List, Dict, Optional, Tuple
+
+import numpy as np
+from instrumentation import instrumented
 
 # this import statement is used in preconditions, but PythonTA and PyCharm cannot detect this.
 import os
@@ -31,6 +36,36 @@ MONTHS_DICT = {'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
 
 DAYS_DICT = {'mon': 1, 'tue': 2, 'wed': 3, 'thu': 4, 'fri': 5, 'sat': 6, 'sun': 7}
 
+FIRE_VARIABLES = ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity', 'wind', 'rain', 'area']
+
+# The X and Y coordinates of the cell of the park's grid that a fire was recorded in.
+FIRE_COORDINATES = ['x', 'y']
+
+# The columns of forest fire data returned by load_forestfire_columns.
+FIRE_COLUMNS = ['timestamp'] + FIRE_COORDINATES + FIRE_VARIABLES
+
+# The fields of a row of forest fire data read into a structured NumPy array.
+FIRE_DTYPE = np.dtype([('timestamp', 'datetime64[D]'), ('month', np.int8), ('day', np.int8)]
+                      + [(key, np.int8) for key in FIRE_COORDINATES]
+                      + [(key, np.float64) for key in FIRE_VARIABLES])
+
+# The columns of a csv file of forest fire data, as parsed by np.loadtxt. The month and
+# day have room for one more character than their names, so that a longer string is
+# not cut down to a valid name.
+FIRE_FIELDS_DTYPE = np.dtype([(key, np.int8) for key in FIRE_COORDINATES]
+                             + [('month', 'U4'), ('day', 'U4')]
+                             + [(key, np.float64) for key in FIRE_VARIABLES])
+
+# The fields of a row of temperature data read into a structured NumPy array, where
+# city is an index into a list of city names.
+TEMPERATURE_DTYPE = np.dtype([('date', 'datetime64[D]'), ('temperature', np.float64),
+                              ('uncertainty', np.float64), ('city', np.int16)])
+
+# The fields of a row of temperature data as parsed from the text of the row, before
+# the city names are coded.
+TEMPERATURE_FIELDS_DTYPE = np.dtype([('date', 'datetime64[D]'), ('temperature', np.float64),
+                                     ('uncertainty', np.float64), ('city', object)])
+
 
 @dataclass
 class PortugalTemperatureData:
@@ -53,6 +88,7 @@ class PortugalTemperatureData:
     uncertainty: float
 
 
+@instrumented
 def process_temperatures(file_path: str, city: str) -> List[PortugalTemperatureData]:
     """Process a csv file into a list of PortugalTemperatureData.
 
@@ -61,20 +97,22 @@ def process_temperatures(file_path: str, city: str) -> List[PortugalTemperatureD
      - data at file_path is in the form as described by fileformats.md
      - the city exists in the file
 
-    >>> data = process_temperatures('data/portugaltemperatures2.csv', 'Amadora')
+    >>> data = process_temperatures('data/portugaltemperatures.csv', 'Amadora')
     >>> data[0].average_temp == 7.106
     True
     """
-    with open(file_path) as file:
-        reader = csv.reader(file)
+    records, cities = read_temperatures_array(file_path)
+    if city not in cities:
+        return []
 
-        data_so_far = []  # ACCUMULATOR: update list of data
-        for row in reader:
-            if city in row and row[1] != '':
-                # process each row and add to data_so_far
-                data_so_far.append(row_to_temperature_data(row))
+    rows = records[records['city'] == cities.index(city)]
+    timestamps = rows['date'].astype('datetime64[us]').tolist()
 
-    return data_so_far
+    return [PortugalTemperatureData(timestamp=timestamp, city=city, average_temp=temperature,
+                                    uncertainty=uncertainty)
+            for timestamp, temperature, uncertainty in zip(timestamps,
+                                                           rows['temperature'].tolist(),
+                                                           rows['uncertainty'].tolist())]
 
 
 def row_to_temperature_data(row: List[str]) -> PortugalTemperatureData:
@@ -92,6 +130,7 @@ def row_to_temperature_data(row: List[str]) -> PortugalTemperatureData:
                                    average_temp=float(row[1]), uncertainty=float(row[2]))
 
 
+@instrumented
 def process_forestfires(file_path: str) -> Dict[str, List]:
     """Process a csv file of forest fire data into a dictionary
     containing a list of each column.
@@ -103,32 +142,27 @@ def process_forestfires(file_path: str) -> Dict[str, List]:
     >>> data['temperature'][0] == 8.2
     True
     """
-    with open(file_path) as file:
-        reader = csv.reader(file)
-        next(reader)  # skip header
-
-        data_so_far = {'timestamp': [], 'ffmc': [], 'dmc': [], 'dc': [], 'isi': [],
-                       'temperature': [], 'humidity': [], 'wind': [],
-                       'rain': [], 'area': []}  # ACCUMULATOR: update dict of data
-        for row in reader:
-            # process each row and add to data_so_far
-            add_row_to_dict(data_so_far, row)
+    records = read_forestfires_array(file_path)
 
-    return data_so_far
+    data = {'timestamp': records['timestamp'].astype('datetime64[us]').tolist()}
+    data.update({key: records[key].tolist() for key in FIRE_COORDINATES + FIRE_VARIABLES})
+    return data
 
 
 def add_row_to_dict(data: Dict[str, List], row: List[str]) -> None:
     """Mutate dictionary data_so_far to add row
 
-    >>> d = {'timestamp': [], 'ffmc': [], 'dmc': [], 'dc': [], 'isi': [],\
+    >>> d = {'timestamp': [], 'x': [], 'y': [], 'ffmc': [], 'dmc': [], 'dc': [], 'isi': [],\
             'temperature': [], 'humidity': [], 'wind': [],\
             'rain': [], 'area': []}
     >>> r = ['7', '5', 'mar', 'fri', '86.2', '26.2', '94.3', '5.1', '8.2', '51', '6.7', '0', '0']
     >>> add_row_to_dict(d, r)
-    >>> d['ffmc'] == [86.2]
+    >>> d['ffmc'] == [86.2] and d['x'] == [7]
     True
     """
     data['timestamp'].append(datetime.datetime(2000, MONTHS_DICT[row[2]], DAYS_DICT[row[3]]))
+    data['x'].append(int(row[0]))
+    data['y'].append(int(row[1]))
     data['ffmc'].append(float(row[4]))
     data['dmc'].append(float(row[5]))
     data['dc'].append(float(row[6]))
@@ -140,13 +174,619 @@ def add_row_to_dict(data: Dict[str, List], row: List[str]) -> None:
     data['area'].append(float(row[12]))
 
 
+@instrumented
+def read_forestfires_array(file_path: str) -> np.ndarray:
+    """Read a csv file of forest fire data into a structured NumPy array with the
+    fields of FIRE_DTYPE, parsing the whole file in one vectorized pass.
+
+    Preconditions:
+     - os.path.exists(file_path)
+     - data at file_path is in the form as described by fileformats.md
+
+    >>> records = read_forestfires_array('data/forestfires.csv')
+    >>> records['dc'][:3].tolist()
+    [94.3, 669.1, 686.9]
+    >>> str(records['timestamp'][0])
+    '2000-03-05'
+    """
+    return parse_forestfire_rows(read_forestfire_fields(file_path, skiprows=1))
+
+
+def read_forestfire_fields(source: Any, skiprows: int = 0) -> np.ndarray:
+    """Parse the rows of forest fire data in source (a path or a list of lines), after
+    skipping the first skiprows lines, into a structured array of FIRE_FIELDS_DTYPE.
+
+    Each field is parsed straight into its type, without an intermediate array of
+    every field as a string.
+
+    >>> read_forestfire_fields(['7,5,mar,fri,86.2,26.2,94.3,5.1,8.2,51,6.7,0,0'])['month']
+    array(['mar'], dtype='<U4')
+    """
+    return np.loadtxt(source, dtype=FIRE_FIELDS_DTYPE, delimiter=',', skiprows=skiprows,
+                      ndmin=1, encoding='utf-8')
+
+
+@instrumented
+def parse_forestfire_rows(raw: np.ndarray) -> np.ndarray:
+    """Convert the fields of forest fire rows, as returned by read_forestfire_fields,
+    into a structured array of FIRE_DTYPE.
+
+    Raise KeyError if a month or day is not in MONTHS_DICT or DAYS_DICT.
+
+    >>> raw = read_forestfire_fields(['7,5,mar,fri,86.2,26.2,94.3,5.1,8.2,51,6.7,0,0'])
+    >>> parse_forestfire_rows(raw)['dc'].tolist()
+    [94.3]
+    """
+    records = np.empty(len(raw), dtype=FIRE_DTYPE)
+    records['month'] = lookup_codes(raw['month'], MONTHS_DICT)
+    records['day'] = lookup_codes(raw['day'], DAYS_DICT)
+    # as in add_row_to_dict, the timestamp is in the year 2000 with the weekday as the day
+    records['timestamp'] = (np.datetime64('2000-01', 'M') + (records['month'] - 1)
+                            ).astype('datetime64[D]') + (records['day'] - 1)
+
+    for key in FIRE_COORDINATES + FIRE_VARIABLES:
+        records[key] = raw[key]
+
+    return records
+
+
+@instrumented
+def read_temperatures_array(file_path: str) -> Tuple[np.ndarray, List[str]]:
+    """Read a csv file of temperature data into a structured NumPy array with the
+    fields of TEMPERATURE_DTYPE, along with the sorted list of city names that the
+    'city' field indexes into. The file is parsed in vectorized chunks, as by
+    iter_temperature_chunks, so only the records of the whole file are held at once.
+
+    Rows with no recorded temperature are skipped.
+
+    Preconditions:
+     - os.path.exists(file_path)
+     - data at file_path is in the form as described by fileformats.md
+
+    >>> records, cities = read_temperatures_array('data/portugaltemperatures.csv')
+    >>> cities[records['city'][0]]
+    'Amadora'
+    >>> records['temperature'][:2].tolist()
+    [7.106, 9.266]
+    """
+    chunks = list(iter_temperature_chunks(file_path))
+    cities = sorted(set().union(*(chunk_cities for _, chunk_cities in chunks)))
+
+    for records, chunk_cities in chunks:
+        # remap the codes of each chunk from its own cities to the cities of every chunk
+        records['city'] = np.searchsorted(cities, chunk_cities).astype(np.int16)[records['city']]
+
+    return np.concatenate([records for records, _ in chunks]
+                          or [np.empty(0, dtype=TEMPERATURE_DTYPE)]), cities
+
+
+def read_temperature_fields(lines: List[str]) -> Tuple[np.ndarray, List[str]]:
+    """Parse the date, temperature, error and city fields of lines, each a row of
+    temperature data, into a structured array of TEMPERATURE_DTYPE, along with the
+    sorted list of city names that the 'city' field indexes into.
+
+    The other columns are not read. Missing temperatures and errors are filled in as
+    nan in each line before it is parsed, so every field is parsed by np.loadtxt with
+    no per-field Python converters, and the cities are read as strings and coded with
+    np.unique.
+
+    >>> fields, cities = read_temperature_fields(['1753-01-01,7.106,5.358,Braga,Portugal',
+    ...                                           '1753-02-01,,,Braga,Portugal',
+    ...                                           '1753-01-01,9.3,2.1,Amadora,Portugal'])
+    >>> (fields['temperature'].tolist(), fields['city'].tolist(), cities)
+    ([7.106, nan, 9.3], [1, 1, 0], ['Amadora', 'Braga'])
+    """
+    raw = np.loadtxt((line.replace(',,', ',nan,').replace(',,', ',nan,') for line in lines),
+                     dtype=TEMPERATURE_FIELDS_DTYPE, delimiter=',', usecols=(0, 1, 2, 3),
+                     ndmin=1)
+
+    fields = np.empty(len(raw), dtype=TEMPERATURE_DTYPE)
+    for key in ['date', 'temperature', 'uncertainty']:
+        fields[key] = raw[key]
+
+    # the rows of a city are mostly contiguous, so only the first row of each run of
+    # rows of the same city is passed to np.unique, and its code repeated over the run
+    city = raw['city']
+    starts = np.flatnonzero(np.concatenate([[True], city[1:] != city[:-1]]))
+    names, codes = np.unique(city[starts], return_inverse=True)
+    fields['city'] = np.repeat(codes, np.diff(np.append(starts, len(city))))
+    return fields, names.tolist()
+
+
+def iter_temperature_chunks(file_path: str,
+                            chunk_size: int = 65536) -> Iterator[Tuple[np.ndarray, List[str]]]:
+    """Yield the rows of a csv file of temperature data in chunks of at most chunk_size
+    lines, each parsed by read_temperature_fields and parse_temperature_rows.
+
+    Only one chunk is held in memory at a time. The city codes of each chunk index
+    into the list of city names yielded with that chunk.
+
+    Preconditions:
+     - os.path.exists(file_path)
+     - data at file_path is in the form as described by fileformats.md
+     - chunk_size > 0
+
+    >>> chunks = iter_temperature_chunks('data/portugaltemperatures.csv', 10000)
+    >>> sum(len(records) for records, _ in chunks)
+    22010
+    """
+    with open(file_path, encoding='utf-8') as file:
+        next(file)  # skip header
+
+        lines = list(itertools.islice(file, chunk_size))
+        while lines != []:
+            yield parse_temperature_rows(*read_temperature_fields(lines))
+            lines = list(itertools.islice(file, chunk_size))
+
+
+@instrumented
+def parse_temperature_rows(fields: np.ndarray,
+                           cities: List[str]) -> Tuple[np.ndarray, List[str]]:
+    """Return the rows of fields (as returned by read_temperature_fields, whose 'city'
+    field indexes into the sorted list of city names cities) that have a recorded
+    temperature, along with cities.
+
+    >>> fields, cities = read_temperature_fields(['1753-01-01,7.106,5.358,Braga',
+    ...                                           '1753-02-01,,,Braga',
+    ...                                           '1753-01-01,9.3,2.1,Amadora'])
+    >>> records, cities = parse_temperature_rows(fields, cities)
+    >>> cities
+    ['Amadora', 'Braga']
+    >>> records['city'].tolist()
+    [1, 0]
+    """
+    return fields[~np.isnan(fields['temperature'])], cities
+
+
+def lookup_codes(values: np.ndarray, codes: Dict[str, int]) -> np.ndarray:
+    """Return an array of the code of each string in values, according to codes.
+
+    Raise KeyError if a string in values is not in codes.
+
+    >>> lookup_codes(np.array(['mar', 'jan', 'mar']), MONTHS_DICT).tolist()
+    [3, 1, 3]
+    >>> lookup_codes(np.array(['mar', 'june']), MONTHS_DICT)
+    Traceback (most recent call last):
+    ...
+    KeyError: 'june'
+    """
+    keys = np.array(sorted(codes))
+    positions = np.minimum(np.searchsorted(keys, values), len(keys) - 1)
+    unknown = keys[positions] != values
+    if np.any(unknown):
+        raise KeyError(str(values[unknown][0]))
+    return np.array([codes[key] for key in keys])[positions]
+
+
+@instrumented
+def load_forestfire_columns(file_path: str) -> Dict[str, np.ndarray]:
+    """Load a csv file of forest fire data into a dictionary mapping each
+    column name to a NumPy array of its values.
+
+    If the file has been converted with convert_to_binary since it last changed,
+    the columns are memory-mapped from the binary directory instead of parsed.
+
+    Preconditions:
+     - os.path.exists(file_path)
+
+    >>> columns = load_forestfire_columns('data/forestfires.csv')
+    >>> columns['temperature'][:3].tolist()
+    [8.2, 18.0, 14.6]
+    """
+    binary = read_binary(file_path, 'forestfires')
+    # directories converted before a column was added to FIRE_COLUMNS are not used
+    if binary is not None and all(key in binary[0] for key in FIRE_COLUMNS):
+        return binary[0]
+
+    return forestfire_columns(read_forestfires_array(file_path))
+
+
+def forestfire_columns(records: np.ndarray) -> Dict[str, np.ndarray]:
+    """Return the columns of load_forestfire_columns for records of FIRE_DTYPE."""
+    return {key: np.ascontiguousarray(records[key]) for key in FIRE_COLUMNS}
+
+
+@instrumented
+def load_temperature_columns(file_path: str) -> Dict[str, np.ndarray]:
+    """Load a csv file of temperature data for every city into a dictionary
+    mapping 'date', 'temperature', 'uncertainty' and 'city' to NumPy arrays.
+
+    Rows with no recorded temperature are skipped.
+
+    Preconditions:
+     - os.path.exists(file_path)
+     - data at file_path is in the form as described by fileformats.md
+
+    >>> columns = load_temperature_columns('data/portugaltemperatures.csv')
+    >>> columns['temperature'][:2].tolist()
+    [7.106, 9.266]
+    >>> str(columns['city'][0])
+    'Amadora'
+    """
+    records, cities = read_temperatures_array(file_path)
+
+    columns = {key: np.ascontiguousarray(records[key])
+               for key in ['date', 'temperature', 'uncertainty']}
+    columns['city'] = np.array(cities)[records['city']]
+    return columns
+
+
+def file_signature(file_path: str) -> Tuple[int, int]:
+    """Return the modification time (in nanoseconds) and size of the file at file_path.
+
+    Preconditions:
+     - os.path.exists(file_path)
+    """
+    stat = os.stat(file_path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def cache_key(file_path: str, loader: Callable[[str], Any]) -> Tuple[str, str]:
+    """Return the key of the result of loader(file_path) in a DatasetCache."""
+    return (os.path.abspath(file_path), f'{loader.__module__}.{loader.__qualname__}')
+
+
+class DatasetCache:
+    """A cache of parsed datasets, so that each file is read at most once for as
+    long as it stays unchanged on disk.
+
+    Entries are keyed by the file's absolute path and the loader used to parse it.
+    An entry is discarded as soon as the file's modification time or size changes.
+    Parsed data is only kept in memory. Processes share a file's data by memory-mapping
+    its binary directory (see convert_to_binary), which the loaders read when it is
+    up to date.
+
+    Instance Attributes:
+     - entries: maps (file path, loader name) to the signature of the file when it
+                was loaded and the data returned by the loader
+
+    >>> cache = DatasetCache()
+    >>> first = cache.get('data/forestfires.csv', load_forestfire_columns)
+    >>> first is cache.get('data/forestfires.csv', load_forestfire_columns)
+    True
+    """
+    entries: Dict[Tuple[str, str], Tuple[Tuple[int, int], Any]]
+
+    def __init__(self) -> None:
+        self.entries = {}
+
+    def get(self, file_path: str, loader: Callable[[str], Any]) -> Any:
+        """Return loader(file_path), reusing the cached result if the file has not
+        changed since it was last loaded.
+
+        Preconditions:
+         - os.path.exists(file_path)
+        """
+        key = cache_key(file_path, loader)
+        signature = file_signature(file_path)
+
+        if key in self.entries and self.entries[key][0] == signature:
+            return self.entries[key][1]
+
+        data = loader(file_path)
+        self.entries[key] = (signature, data)
+        return data
+
+    def put(self, file_path: str, loader: Callable[[str], Any], data: Any) -> None:
+        """Record data as the result of loader(file_path) for the current version of
+        the file, so that get returns it without calling loader.
+
+        Preconditions:
+         - os.path.exists(file_path)
+        """
+        self.entries[cache_key(file_path, loader)] = (file_signature(file_path), data)
+
+    def clear(self) -> None:
+        """Remove every entry from this cache."""
+        self.entries.clear()
+
+
+class TemperatureStore:
+    """Temperature data for every city in a file, indexed by city.
+
+    The rows of each city are stored contiguously, so looking up one city takes
+    time proportional to the number of rows of that city rather than a scan of
+    the whole file.
+
+    Instance Attributes:
+     - columns: maps 'date', 'temperature' and 'uncertainty' to NumPy arrays whose
+                rows are grouped by city, in the order each row appeared in the file
+     - offsets: maps each city to the (start, stop) indices of its rows in columns
+
+    Representation Invariants:
+     - all(len(self.columns[key]) == len(self.columns['date']) for key in self.columns)
+
+    >>> store = load_temperature_store('data/portugaltemperatures.csv')
+    >>> store.cities()
+    ['Amadora', 'Braga', 'Coimbra', 'Lisbon', 'Porto', 'Queluz', 'Setúbal']
+    >>> store.lookup('Amadora')['temperature'][:2].tolist()
+    [7.106, 9.266]
+    """
+    columns: Dict[str, np.ndarray]
+    offsets: Dict[str, Tuple[int, int]]
+
+    def __init__(self, columns: Dict[str, np.ndarray],
+                 offsets: Dict[str, Tuple[int, int]]) -> None:
+        self.columns = columns
+        self.offsets = offsets
+
+    def cities(self) -> List[str]:
+        """Return the names of the cities in this store, in sorted order."""
+        return sorted(self.offsets)
+
+    def lookup(self, city: str) -> Dict[str, np.ndarray]:
+        """Return the columns of the rows recorded in city.
+
+        The returned arrays are views into this store and must not be mutated.
+
+        Preconditions:
+         - city in self.offsets
+        """
+        start, stop = self.offsets[city]
+        return {key: self.columns[key][start:stop] for key in self.columns}
+
+
+class ColumnBuffer:
+    """Columns of equal length that rows can be appended to, in time proportional to
+    the number of rows appended (averaged over many appends).
+
+    Each column is stored in an array with room for more rows than it holds, whose
+    capacity is doubled whenever it fills up.
+
+    Instance Attributes:
+     - arrays: maps each column name to an array whose first self.size rows are its values
+     - size: the number of rows in each column
+
+    Representation Invariants:
+     - all(len(self.arrays[key]) >= self.size for key in self.arrays)
+
+    >>> buffer = ColumnBuffer({'x': np.array([1.0, 2.0])})
+    >>> buffer.append({'x': np.array([3.0])})
+    >>> buffer.columns()['x'].tolist()
+    [1.0, 2.0, 3.0]
+    """
+    arrays: Dict[str, np.ndarray]
+    size: int
+
+    def __init__(self, columns: Dict[str, np.ndarray]) -> None:
+        """Copy columns into a new buffer.
+
+        Preconditions:
+         - len({len(columns[key]) for key in columns}) == 1
+        """
+        self.size = len(next(iter(columns.values())))
+        self.arrays = {key: np.array(columns[key]) for key in columns}
+
+    @instrumented
+    def append(self, columns: Dict[str, np.ndarray]) -> None:
+        """Append the rows of columns to the end of this buffer.
+
+        Preconditions:
+         - columns.keys() == self.arrays.keys()
+         - len({len(columns[key]) for key in columns}) == 1
+        """
+        added = len(next(iter(columns.values())))
+        size = self.size + added
+
+        for key, array in self.arrays.items():
+            if size > len(array):
+                grown = np.empty(max(size, 2 * len(array)), dtype=array.dtype)
+                grown[:self.size] = array[:self.size]
+                self.arrays[key] = array = grown
+            array[self.size:size] = columns[key]
+
+        self.size = size
+
+    @instrumented
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Return the columns of this buffer.
+
+        The returned arrays are views into this buffer. Later appends do not change
+        them, and they must not be mutated.
+        """
+        return {key: array[:self.size] for key, array in self.arrays.items()}
+
+
+class AppendableTemperatureStore:
+    """Temperature data for every city, indexed by city like a TemperatureStore, that
+    new readings can be appended to.
+
+    Instance Attributes:
+     - buffers: maps each city to the columns of its rows, in the order they were added
+
+    >>> store = AppendableTemperatureStore(load_temperature_store('data/portugaltemperatures.csv'))
+    >>> fields = read_temperature_fields(['2020-01-01,9.5,0.2,Braga'])
+    >>> records, cities = parse_temperature_rows(*fields)
+    >>> store.append(records, cities)
+    >>> store.lookup('Braga')['temperature'][-1:].tolist()
+    [9.5]
+    """
+    buffers: Dict[str, ColumnBuffer]
+
+    def __init__(self, store: TemperatureStore) -> None:
+        self.buffers = {city: ColumnBuffer(store.lookup(city)) for city in store.cities()}
+
+    def cities(self) -> List[str]:
+        """Return the names of the cities in this store, in sorted order."""
+        return sorted(self.buffers)
+
+    def lookup(self, city: str) -> Dict[str, np.ndarray]:
+        """Return the columns of the rows recorded in city.
+
+        The returned arrays are views into this store and must not be mutated.
+
+        Preconditions:
+         - city in self.cities()
+        """
+        return self.buffers[city].columns()
+
+    def append(self, records: np.ndarray, cities: List[str]) -> None:
+        """Append records (as returned by parse_temperature_rows) to the rows of their
+        cities, which their 'city' field indexes into cities.
+
+        Preconditions:
+         - records.dtype == TEMPERATURE_DTYPE
+         - all(0 <= code < len(cities) for code in records['city'])
+        """
+        for code, city in enumerate(cities):
+            rows = records[records['city'] == code]
+            columns = {key: rows[key] for key in ['date', 'temperature', 'uncertainty']}
+
+            if city in self.buffers:
+                self.buffers[city].append(columns)
+            elif len(rows) > 0:
+                self.buffers[city] = ColumnBuffer(columns)
+
+
+@instrumented
+def load_temperature_store(file_path: str) -> TemperatureStore:
+    """Load a csv file of temperature data into a TemperatureStore indexed by city.
+
+    If the file has been converted with convert_to_binary since it last changed,
+    the columns are memory-mapped from the binary directory instead of parsed.
+
+    Preconditions:
+     - os.path.exists(file_path)
+     - data at file_path is in the form as described by fileformats.md
+    """
+    binary = read_binary(file_path, 'temperatures')
+    if binary is not None:
+        columns, manifest = binary
+        return TemperatureStore(columns, {city: (start, stop) for city, (start, stop)
+                                          in manifest['offsets'].items()})
+
+    records, cities = read_temperatures_array(file_path)
+    return index_temperature_records(records, cities)
+
+
+@instrumented
+def index_temperature_records(records: np.ndarray, cities: List[str]) -> TemperatureStore:
+    """Return a TemperatureStore of records (as returned by read_temperatures_array)
+    indexed by their 'city' field.
+
+    Preconditions:
+     - records.dtype == TEMPERATURE_DTYPE
+     - all(0 <= code < len(cities) for code in records['city'])
+    """
+    # a stable sort keeps the rows of each city in their original order
+    order = np.argsort(records['city'], kind='stable')
+    columns = {key: records[key][order] for key in ['date', 'temperature', 'uncertainty']}
+
+    # the rows of city code c are the ones between the first code >= c and the first > c
+    bounds = np.searchsorted(records['city'][order], np.arange(len(cities) + 1))
+    offsets = {city: (int(bounds[code]), int(bounds[code + 1]))
+               for code, city in enumerate(cities) if bounds[code] < bounds[code + 1]}
+    return TemperatureStore(columns, offsets)
+
+
+def binary_path(file_path: str) -> str:
+    """Return the directory that holds the binary columns of the csv file at file_path.
+
+    >>> binary_path('data/forestfires.csv')
+    'data/forestfires.columns'
+    """
+    return os.path.splitext(file_path)[0] + '.columns'
+
+
+@instrumented
+def convert_to_binary(file_path: str, kind: str) -> str:
+    """Write the data of the csv file at file_path to its binary directory as one
+    .npy file per column plus a manifest.json, and return the directory.
+
+    Forest fire data is written as the columns of load_forestfire_columns.
+    Temperature data is written as the columns of its TemperatureStore, with the
+    offsets of each city recorded in the manifest. The data is always parsed from the
+    csv file, never read from an existing binary directory.
+
+    The manifest is removed before any column is written, and each column is written
+    to a temporary file that then replaces the old one. Processes that still have the
+    old columns memory-mapped keep their pages, and if a conversion fails partway, the
+    directory is not used until it is converted again.
+
+    >>> import shutil, tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> path = shutil.copy('data/forestfires.csv', directory)
+    >>> _ = convert_to_binary(path, 'forestfires')
+    >>> _ = convert_to_binary(path, 'forestfires')
+    >>> load_forestfire_columns(path)['dc'][:3].tolist()
+    [94.3, 669.1, 686.9]
+    >>> shutil.rmtree(directory)
+
+    Preconditions:
+     - os.path.exists(file_path)
+     - data at file_path is in the form as described by fileformats.md
+     - kind in {'forestfires', 'temperatures'}
+    """
+    # read the signature first, so a file changed while converting is seen as stale
+    manifest = {'kind': kind, 'source_signature': list(file_signature(file_path))}
+    if kind == 'forestfires':
+        # not load_forestfire_columns, whose columns may be mapped from the files replaced
+        columns = forestfire_columns(read_forestfires_array(file_path))
+    else:
+        records, cities = read_temperatures_array(file_path)
+        store = index_temperature_records(records, cities)
+        columns = store.columns
+        manifest['offsets'] = store.offsets
+
+    directory = binary_path(file_path)
+    os.makedirs(directory, exist_ok=True)
+    # readers stop using the directory before any column in it changes
+    manifest_path = os.path.join(directory, 'manifest.json')
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    for key in columns:
+        column_path = os.path.join(directory, key + '.npy')
+        with open(column_path + '.tmp', 'wb') as file:
+            np.save(file, np.ascontiguousarray(columns[key]))
+        os.replace(column_path + '.tmp', column_path)
+    manifest['columns'] = list(columns)
+
+    # the manifest is written last and atomically, so readers never see a partial conversion
+    temporary_path = os.path.join(directory, 'manifest.json.tmp')
+    with open(temporary_path, 'w') as file:
+        json.dump(manifest, file)
+    os.replace(temporary_path, manifest_path)
+
+    return directory
+
+
+@instrumented
+def read_binary(file_path: str, kind: str) -> Optional[Tuple[Dict[str, np.ndarray], Dict]]:
+    """Return the memory-mapped columns and the manifest of the binary directory of the
+    csv file at file_path, or None if there is no binary directory of the given kind
+    or it was converted from an older version of the file.
+
+    Preconditions:
+     - os.path.exists(file_path)
+     - kind in {'forestfires', 'temperatures'}
+    """
+    manifest_path = os.path.join(binary_path(file_path), 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return None
+
+    with open(manifest_path) as file:
+        manifest = json.load(file)
+    if manifest['kind'] != kind or manifest['source_signature'] != list(file_signature(file_path)):
+        return None
+
+    columns = {key: np.load(os.path.join(binary_path(file_path), key + '.npy'), mmap_mode='r')
+               for key in manifest['columns']}
+    return columns, manifest
+
+
+# A cache shared by every Model in this process that opts into it.
+SHARED_CACHE = DatasetCache()
+
+
 if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(config={
         'max-line-length': 100,
-        'extra-imports': ['python_ta.contracts', 'dataclasses', 'datetime', 'os', 'typing', 'csv'],
-        'allowed-io': ['process_forestfires', 'process_temperatures'],
+        'extra-imports': ['python_ta.contracts', 'dataclasses', 'datetime', 'os', 'typing',
+                          'itertools', 'json', 'numpy', 'instrumentation'],
+        'allowed-io': ['iter_temperature_chunks', 'convert_to_binary', 'read_binary'],
         'disable': ['W0611']
     })
 
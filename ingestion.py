@@ -0,0 +1,342 @@
+"""forestfires Ingestion
+
+Overview and Description
+========================
+
+This Python module appends new forest fire observations and temperature
+readings to the data files as they arrive, without parsing the files again.
+
+An Ingestor keeps the columns of both files in memory along with running
+statistics: the means and centred sums of products of the forest fire
+variables, and the sum and count of temperatures in every period of every city.
+Appending rows writes them to the end of the .csv file, adds them to the
+columns and statistics, and records the results in the caches its models read
+from, so that the trendlines, regressions and average temperatures of the new
+version of the files are not computed from the whole files again. Only the
+periods that new readings fall in are averaged again, but since cached results
+are keyed by the version of their file, every append records the results of
+every city and pair of variables anew: a fixed number of cache entries, given
+by Ingestor.published_fits.
+
+Copyright and Usage Information
+===============================
+
+All forms of distribution of this code, whether as given or with any changes,
+are expressly prohibited.
+
+This file is Copyright (c) 2020 Will Assad, Jessica Zhai,
+Raghav Banka, and Fatimeh Hassan.
+"""
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from entities import FIRE_VARIABLES, AppendableTemperatureStore, ColumnBuffer, DatasetCache, \
+    forestfire_columns, load_forestfire_columns, load_temperature_store, \
+    parse_forestfire_rows, parse_temperature_rows, read_forestfire_fields, read_temperature_fields
+from aggregation import GRANULARITIES, RunningMeans, period_keys, period_label
+from models import FitCache, Model, trendline_query
+from regression import RegressionDesign, RunningProducts
+
+# the forest fire fits stored on every append: the design, and the trendline of every
+# ordered pair of distinct variables
+PUBLISHED_FIRE_FITS = 1 + len(FIRE_VARIABLES) * (len(FIRE_VARIABLES) - 1)
+
+# the room left in the default FitCache of an ingestor for the fits its models compute
+MODEL_FITS = 256
+
+
+class Ingestor:
+    """Forest fire and temperature data that new rows are appended to as they arrive.
+
+    Instance Attributes:
+     - fires_file: the path of the forest fire data
+     - temperatures_file: the path of the temperature data
+     - cache: the columns of both files, shared by every model of this ingestor
+     - fits: the fitted models, shared by every model of this ingestor
+     - fire_buffer: the columns of the forest fire data
+     - fire_products: the running statistics of the forest fire variables
+     - temperatures: the temperature data of every city
+     - temperature_means: maps each city and granularity to the running sums and
+                          counts of temperatures in each period of that granularity
+     - temperature_keys: maps each city and granularity to the keys of the periods of
+                         temperature_means, as returned by period_keys, in sorted order
+     - temperature_groups: maps each city and granularity to the periods, means and
+                           counts of temperature_means in the order of
+                           temperature_keys, as returned by Model.temperature_groups
+     - lock: held while rows are appended
+
+    >>> import os, shutil, tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> fires = shutil.copy('data/forestfires.csv', directory)
+    >>> temperatures = shutil.copy('data/portugaltemperatures.csv', directory)
+    >>> ingestor = Ingestor(fires, temperatures)
+    >>> ingestor.append_fires(['7,5,aug,sat,92.5,121.1,674.4,8.6,25.1,27,4,0,1.5'])
+    1
+    >>> fit = ingestor.model('Braga').trendline_fit('temperature', 'dc')
+    >>> refit = Model(fires, temperatures, 'Braga').trendline_fit('temperature', 'dc')
+    >>> (fit.n, abs(fit.slope - refit.slope) < 1e-9)
+    (518, True)
+    >>> ingestor.append_temperatures(['2020-01-01,9.5,0.2,Braga,Portugal,42.59N,8.73W'])
+    1
+    >>> ingestor.model('Braga').get_reading_counts()[2020]
+    1
+    >>> shutil.rmtree(directory)
+    """
+    fires_file: str
+    temperatures_file: str
+    cache: DatasetCache
+    fits: FitCache
+    fire_buffer: ColumnBuffer
+    fire_products: RunningProducts
+    temperatures: AppendableTemperatureStore
+    temperature_means: Dict[Tuple[str, str], RunningMeans]
+    temperature_keys: Dict[Tuple[str, str], np.ndarray]
+    temperature_groups: Dict[Tuple[str, str], Tuple[List, np.ndarray, np.ndarray]]
+    lock: threading.Lock
+
+    def __init__(self, fires_file: str, temperatures_file: str,
+                 cache: Optional[DatasetCache] = None, fits: Optional[FitCache] = None) -> None:
+        """Load both files, reusing their columns in cache if they are there.
+
+        Every append stores self.published_fits() fits in fits, so a fits holding fewer
+        evicts some of them (and every fit the models computed) on each append. By
+        default, fits holds MODEL_FITS more than that.
+
+        Preconditions:
+         - os.path.exists(fires_file)
+         - os.path.exists(temperatures_file)
+         - fits is None or fits.maxsize > self.published_fits()
+        """
+        self.fires_file = fires_file
+        self.temperatures_file = temperatures_file
+        self.cache = DatasetCache() if cache is None else cache
+        self.lock = threading.Lock()
+
+        self.fire_buffer = ColumnBuffer(self.cache.get(fires_file, load_forestfire_columns))
+        self.fire_products = RunningProducts(FIRE_VARIABLES)
+        self.fire_products.add(fire_matrix(self.fire_buffer.columns()))
+
+        self.temperatures = AppendableTemperatureStore(
+            self.cache.get(temperatures_file, load_temperature_store))
+        self.temperature_means = {}
+        self.temperature_keys = {}
+        self.temperature_groups = {}
+        for city in self.temperatures.cities():
+            self.add_temperatures(city, self.temperatures.lookup(city))
+
+        self.fits = FitCache(self.published_fits() + MODEL_FITS) if fits is None else fits
+
+        self.publish_fires()
+        self.publish_temperatures()
+
+    def model(self, city: str) -> Model:
+        """Return a model of city that reads from this ingestor's caches.
+
+        Preconditions:
+         - city is None or city in self.temperatures.cities()
+        """
+        return Model(self.fires_file, self.temperatures_file, city, self.cache, fits=self.fits)
+
+    def published_fits(self) -> int:
+        """Return the number of fits stored in self.fits on every append: the forest fire
+        fits, and the average temperatures of every city at every granularity.
+
+        >>> ingestor = Ingestor('data/forestfires.csv', 'data/portugaltemperatures.csv')
+        >>> ingestor.published_fits()
+        101
+        """
+        return PUBLISHED_FIRE_FITS + len(GRANULARITIES) * len(self.temperatures.cities())
+
+    def append_fires(self, lines: List[str]) -> int:
+        """Append lines, each a row of forest fire data in the form of the .csv file,
+        to self.fires_file and to the data of this ingestor, and return how many rows
+        were appended.
+
+        Preconditions:
+         - data in lines is in the form as described by fileformats.md
+        """
+        if lines == []:
+            return 0
+
+        columns = forestfire_columns(parse_forestfire_rows(read_forestfire_fields(lines)))
+
+        with self.lock:
+            append_lines(self.fires_file, lines)
+            self.fire_buffer.append(columns)
+            self.fire_products.add(fire_matrix(columns))
+            self.publish_fires()
+
+        return len(lines)
+
+    def append_temperatures(self, lines: List[str]) -> int:
+        """Append lines, each a row of temperature data in the form of the .csv file,
+        to self.temperatures_file and to the data of this ingestor, and return how many
+        readings were appended. Rows with no recorded temperature are written to the
+        file but not counted.
+
+        Preconditions:
+         - data in lines is in the form as described by fileformats.md
+        """
+        if lines == []:
+            return 0
+
+        records, cities = parse_temperature_rows(*read_temperature_fields(lines))
+
+        with self.lock:
+            append_lines(self.temperatures_file, lines)
+            self.temperatures.append(records, cities)
+            for code, city in enumerate(cities):
+                rows = records[records['city'] == code]
+                if len(rows) > 0:
+                    self.add_temperatures(city, {key: rows[key]
+                                                 for key in ['date', 'temperature']})
+            self.publish_temperatures()
+
+        return len(records)
+
+    def add_temperatures(self, city: str, columns: Dict[str, np.ndarray]) -> None:
+        """Add the readings in columns to the running means of city at every granularity,
+        and update the average temperatures of city in the periods they fall in."""
+        for granularity in GRANULARITIES:
+            key = (city, granularity)
+            running = self.temperature_means.setdefault(key, RunningMeans())
+            touched = period_keys(columns['date'], granularity)
+            running.add(touched, columns['temperature'])
+
+            self.temperature_keys[key], self.temperature_groups[key] = update_groups(
+                self.temperature_keys.get(key, np.array([], dtype=np.int64)),
+                self.temperature_groups.get(key, ([], np.array([]), np.array([], dtype=np.int64))),
+                np.unique(touched), running, granularity)
+
+    def publish_fires(self) -> None:
+        """Record the forest fire columns of this ingestor, and the fits computed from
+        its running statistics, as those of the current version of self.fires_file."""
+        self.cache.put(self.fires_file, load_forestfire_columns, self.fire_buffer.columns())
+
+        # any model will do, since the keys of the forest fire fits do not depend on the city
+        model = self.model(None)
+        self.fits.put(model.fires_key('design'),
+                      RegressionDesign(self.fire_buffer.columns(), FIRE_VARIABLES,
+                                       self.fire_products))
+        for x_axis in FIRE_VARIABLES:
+            for y_axis in FIRE_VARIABLES:
+                if x_axis != y_axis:
+                    self.fits.put(model.fires_key(*trendline_query(x_axis, y_axis)),
+                                  self.fire_products.line(x_axis, y_axis))
+
+    def publish_temperatures(self) -> None:
+        """Record the temperature data of this ingestor, and the average temperatures of
+        every city in every period, as those of the current version of
+        self.temperatures_file."""
+        self.cache.put(self.temperatures_file, load_temperature_store, self.temperatures)
+
+        # the averages of every city are stored again, since the file has a new signature,
+        # but the groups of the cities that got no readings are the same objects as before
+        model = self.model(None)
+        for (city, granularity), groups in self.temperature_groups.items():
+            self.fits.put(model.temperatures_key('temperature_groups', city, granularity),
+                          groups)
+
+
+def update_groups(keys: np.ndarray, groups: Tuple[List, np.ndarray, np.ndarray],
+                  touched: np.ndarray, running: RunningMeans,
+                  granularity: str) -> Tuple[np.ndarray, Tuple[List, np.ndarray, np.ndarray]]:
+    """Return the sorted period keys and the groups (periods, means and counts, as
+    returned by Model.temperature_groups) of running, given its keys and groups before
+    values were added under the keys in touched.
+
+    Only the periods of touched are averaged again, and those that are new are inserted
+    in order. keys and groups are not mutated, since models may hold them.
+
+    Preconditions:
+     - np.all(np.diff(keys) > 0) and np.all(np.diff(touched) > 0)
+     - granularity in GRANULARITIES
+
+    >>> running = RunningMeans()
+    >>> running.add(np.array([1753, 1755]), np.array([7.0, 5.0]))
+    >>> keys, groups = update_groups(np.array([], dtype=np.int64), ([], np.array([]), np.array([])),
+    ...                              np.array([1753, 1755]), running, 'year')
+    >>> running.add(np.array([1754, 1755]), np.array([6.0, 9.0]))
+    >>> keys, (periods, means, counts) = update_groups(keys, groups, np.array([1754, 1755]),
+    ...                                                running, 'year')
+    >>> (periods, means.tolist(), counts.tolist())
+    ([1753, 1754, 1755], [7.0, 6.0, 7.0], [1, 1, 2])
+    """
+    periods, means, counts = groups
+    touched_means = np.array([running.sums[key] / running.counts[key]
+                              for key in touched.tolist()], dtype=float)
+    touched_counts = np.array([running.counts[key] for key in touched.tolist()],
+                              dtype=np.int64)
+
+    positions = np.searchsorted(keys, touched)
+    present = positions < len(keys)
+    present[present] = keys[positions[present]] == touched[present]
+
+    means = means.astype(float)
+    counts = counts.astype(np.int64)
+    means[positions[present]] = touched_means[present]
+    counts[positions[present]] = touched_counts[present]
+
+    new = ~present
+    if not np.any(new):
+        return keys, (periods, means, counts)
+
+    # splice the labels of the new periods into the list of periods, in order
+    spliced = []  # ACCUMULATOR: the periods up to the last new period spliced in so far
+    previous = 0
+    for position, key in zip(positions[new].tolist(), touched[new].tolist()):
+        spliced.extend(periods[previous:position])
+        spliced.append(period_label(key, granularity))
+        previous = position
+    spliced.extend(periods[previous:])
+
+    return (np.insert(keys, positions[new], touched[new]),
+            (spliced, np.insert(means, positions[new], touched_means[new]),
+             np.insert(counts, positions[new], touched_counts[new])))
+
+
+def fire_matrix(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """Return the forest fire variables of columns as the columns of a 2D array.
+
+    >>> fire_matrix({key: np.arange(2.0) for key in FIRE_VARIABLES}).shape
+    (2, 9)
+    """
+    return np.column_stack([columns[key] for key in FIRE_VARIABLES])
+
+
+def append_lines(file_path: str, lines: List[str]) -> None:
+    """Append lines to the end of the file at file_path, using the same line endings
+    as the file and starting a new line if the file does not end with one.
+
+    Preconditions:
+     - os.path.exists(file_path)
+    """
+    with open(file_path, 'rb+') as file:
+        file.seek(0, 2)
+        end = file.tell()
+        file.seek(max(end - 2, 0))
+        last = file.read()
+
+        newline = b'\r\n' if last.endswith(b'\r\n') else b'\n'
+        data = newline.join(line.rstrip('\r\n').encode('utf-8') for line in lines) + newline
+        if end > 0 and not last.endswith(b'\n'):
+            data = newline + data
+        file.write(data)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 100,
+        'extra-imports': ['python_ta.contracts', 'threading', 'typing', 'numpy', 'entities',
+                          'aggregation', 'models', 'regression'],
+        'allowed-io': ['append_lines']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+
+    import doctest
+    doctest.testmod()
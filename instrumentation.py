@@ -0,0 +1,285 @@
+"""forestfires Instrumentation
+
+Overview and Description
+========================
+
+This Python module records where the program spends its time. Nothing is
+recorded unless a recording is active, so the loaders and Model methods that
+are instrumented cost a single check when it is not.
+
+A recording is started with the recording context manager, which collects one
+record per stage (an instrumented function, or a block of code wrapped in
+stage) with its wall time, the number of rows it returned and, if memory is
+traced, how many bytes of memory it allocated. It can also profile the whole
+recording with cProfile.
+
+    with recording(memory=True, profile=True) as recorder:
+        Model(FIRES_FILE, TEMPERATURES_FILE, 'Braga').dc_versus_year()
+    recorder.export('stages.json')
+    recorder.dump_profile('stages.prof')
+
+Setting the environment variable FORESTFIRES_INSTRUMENT to a file path records
+everything the process does and writes the records to that path when it exits.
+
+Copyright and Usage Information
+===============================
+
+All forms of distribution of this code, whether as given or with any changes,
+are expressly prohibited.
+
+This file is Copyright (c) 2020 Will Assad, Jessica Zhai,
+Raghav Banka, and Fatimeh Hassan.
+"""
+import atexit
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+ENVIRONMENT_VARIABLE = 'FORESTFIRES_INSTRUMENT'
+
+# the recorders that are currently recording, which every stage is recorded by
+ACTIVE = []
+ACTIVE_LOCK = threading.Lock()
+
+# the records of the stages that each thread is inside, outermost first
+STACKS = threading.local()
+
+
+class Recorder:
+    """A collection of the records of stages that ran while it was recording.
+
+    Each record is a dictionary with the keys:
+     - 'stage': the name of the stage
+     - 'parent': the name of the stage it ran inside, or None
+     - 'depth': the number of stages it ran inside
+     - 'thread': the name of the thread it ran in
+     - 'start': when it started, in seconds since the recording started
+     - 'seconds': its wall time in seconds
+     - 'rows': the number of rows it returned, or None if that is unknown
+     - 'memory_bytes': the bytes it allocated less those it freed, or None if
+       memory is not traced
+
+    >>> with recording() as recorder:
+    ...     with stage('outer'):
+    ...         rows = record_rows([1, 2, 3])
+    >>> [(record['stage'], record['rows']) for record in recorder.records]
+    [('outer', 3)]
+    """
+    records: List[Dict[str, Any]]
+    memory: bool
+    profiler: Optional[cProfile.Profile]
+    started: float
+    _lock: threading.Lock
+
+    def __init__(self, memory: bool = False, profile: bool = False) -> None:
+        self.records = []
+        self.memory = memory
+        self.profiler = cProfile.Profile() if profile else None
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """Add a record of a stage that ran while self was recording."""
+        record['start'] -= self.started
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Return a dictionary mapping the name of each recorded stage to the number of
+        times it ran and its total wall time and rows over those runs.
+
+        >>> recorder = Recorder()
+        >>> recorder.records = [{'stage': 'a', 'seconds': 1.0, 'rows': 2},
+        ...                     {'stage': 'a', 'seconds': 0.5, 'rows': None}]
+        >>> recorder.summary()
+        {'a': {'calls': 2, 'seconds': 1.5, 'rows': 2}}
+        """
+        totals = {}  # ACCUMULATOR: the totals of each stage seen so far
+
+        for record in self.records:
+            total = totals.setdefault(record['stage'], {'calls': 0, 'seconds': 0.0, 'rows': 0})
+            total['calls'] += 1
+            total['seconds'] += record['seconds']
+            total['rows'] += record['rows'] or 0
+
+        return totals
+
+    def export(self, file_path: str) -> None:
+        """Write the records of self to file_path as a JSON array."""
+        with open(file_path, 'w') as file:
+            json.dump(self.records, file, indent=2)
+
+    def dump_profile(self, file_path: str) -> None:
+        """Write the cProfile statistics of the recording to file_path, which can be
+        read with pstats or snakeviz.
+
+        Preconditions:
+         - self.profiler is not None
+        """
+        self.profiler.dump_stats(file_path)
+
+
+@contextlib.contextmanager
+def recording(memory: bool = False, profile: bool = False) -> Iterator[Recorder]:
+    """Record every stage that runs, in any thread, inside the with block.
+
+    If memory is True, memory allocations are traced so that each record includes
+    the memory its stage allocated, which makes the program run several times
+    slower. If profile is True, the block is also profiled with cProfile.
+    """
+    recorder = Recorder(memory, profile)
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    if recorder.profiler is not None:
+        recorder.profiler.enable()
+
+    with ACTIVE_LOCK:
+        ACTIVE.append(recorder)
+    try:
+        yield recorder
+    finally:
+        with ACTIVE_LOCK:
+            ACTIVE.remove(recorder)
+        if recorder.profiler is not None:
+            recorder.profiler.disable()
+        if started_tracing:
+            tracemalloc.stop()
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Record the with block as a stage called name in every active recording.
+
+    The number of rows of the stage can be given inside the block by record_rows.
+    """
+    if not ACTIVE:
+        yield
+        return
+
+    stack = current_stack()
+    parent = stack[-1]['stage'] if stack else None
+    record = {'stage': name, 'parent': parent, 'depth': len(stack),
+              'thread': threading.current_thread().name, 'start': time.perf_counter(),
+              'seconds': 0.0, 'rows': None, 'memory_bytes': None}
+    memory_before = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+
+    stack.append(record)
+    try:
+        yield
+    finally:
+        stack.pop()
+        record['seconds'] = time.perf_counter() - record['start']
+        if memory_before is not None and tracemalloc.is_tracing():
+            record['memory_bytes'] = tracemalloc.get_traced_memory()[0] - memory_before
+
+        with ACTIVE_LOCK:
+            recorders = list(ACTIVE)
+        for recorder in recorders:
+            recorder.add(dict(record))
+
+
+def instrumented(func: Callable) -> Callable:
+    """Return func wrapped so that each call is recorded as a stage named after it,
+    with the number of rows of its return value as given by count_rows.
+    """
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not ACTIVE:
+            return func(*args, **kwargs)
+
+        with stage(func.__qualname__):
+            return record_rows(func(*args, **kwargs))
+
+    return wrapper
+
+
+def record_rows(value: Any) -> Any:
+    """Set the number of rows of the innermost stage of this thread to the number of
+    rows in value, as given by count_rows, and return value.
+    """
+    stack = current_stack()
+    if stack:
+        stack[-1]['rows'] = count_rows(value)
+    return value
+
+
+def count_rows(value: Any) -> Optional[int]:
+    """Return the number of rows in value, or None if value has no rows.
+
+    Arrays and lists have as many rows as their length, and columns (a dictionary of
+    arrays or lists) or a tuple as many as their first value. Fits have as many rows
+    as the data they were fitted to.
+
+    >>> import numpy as np
+    >>> count_rows({'dc': np.zeros(5), 'isi': np.zeros(5)})
+    5
+    >>> count_rows({'dc': [94.3, 669.1, 686.9], 'isi': [5.1, 6.7, 6.7]})
+    3
+    >>> count_rows(([1, 2], np.zeros(2)))
+    2
+    >>> count_rows(3.0) is None
+    True
+    """
+    if hasattr(value, 'shape'):
+        return value.shape[0] if value.shape else None
+    elif isinstance(value, dict) and value:
+        first = next(iter(value.values()))
+        if hasattr(first, 'shape') or isinstance(first, list):
+            return count_rows(first)
+        return len(value)
+    elif isinstance(value, tuple):
+        return count_rows(value[0]) if value else None
+    elif isinstance(value, (list, dict)):
+        return len(value)
+    elif isinstance(getattr(value, 'n', None), int):
+        return value.n
+    elif isinstance(getattr(value, 'columns', None), dict):
+        return count_rows(value.columns)
+    else:
+        return None
+
+
+def current_stack() -> List[Dict[str, Any]]:
+    """Return the records of the stages the current thread is inside, outermost first."""
+    if not hasattr(STACKS, 'stack'):
+        STACKS.stack = []
+    return STACKS.stack
+
+
+def record_process(file_path: str) -> None:
+    """Record every stage this process runs, and write the records to file_path as a
+    JSON array when it exits."""
+    recorder = Recorder()
+    with ACTIVE_LOCK:
+        ACTIVE.append(recorder)
+    atexit.register(recorder.export, file_path)
+
+
+if os.environ.get(ENVIRONMENT_VARIABLE):
+    record_process(os.environ[ENVIRONMENT_VARIABLE])
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 100,
+        'extra-imports': ['python_ta.contracts', 'atexit', 'contextlib', 'cProfile', 'functools',
+                          'json', 'os', 'threading', 'time', 'tracemalloc', 'typing', 'numpy'],
+        'allowed-io': ['Recorder.export'],
+        'disable': ['C0415']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+
+    import doctest
+    doctest.testmod()
@@ -5,7 +5,8 @@ Overview and Description
 
 This Python file is the main interactive file of our program where a user
 can interact with our data and perform computations. This is a simple
-console implementation using plotly.
+console implementation using plotly. Given a JSON file of analyses as an
+argument, it instead runs them without interaction (see batch.py).
 
 Copyright and Usage Information
 ===============================
@@ -16,11 +17,16 @@ are expressly prohibited.
 This file is Copyright (c) 2020 Will Assad, Jessica Zhai,
 Raghav Banka, and Fatimeh Hassan.
 """
+import sys
 from models import Model, plot_trendline_axis_known
+from batch import run_cli
 
 
 def main() -> None:
     """ Main function to run interactions with user. """
+    # imported here so that running analyses from a JSON file does not import plotly
+    import plotly.io as pio
+    pio.renderers.default = 'browser'
 
     model = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
     print('INTERACTIVE ANALYSIS OF FOREST FIRE DATA AND CLIMATE CHANGE')
@@ -87,14 +93,19 @@ def main() -> None:
 
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        # run non-interactively, e.g. python main.py analyses.json -o results.json
+        sys.exit(run_cli(sys.argv[1:]))
+
     main()
 
     import python_ta
 
     python_ta.check_all(config={
         'max-line-length': 100,
-        'extra-imports': ['models', 'python_ta.contracts'],
-        'allowed-io': ['main']
+        'extra-imports': ['models', 'batch', 'sys', 'plotly.io', 'python_ta.contracts'],
+        'allowed-io': ['main'],
+        'disable': ['C0415']
     })
 
     import python_ta.contracts
@@ -16,28 +16,169 @@ are expressly prohibited.
 This file is Copyright (c) 2020 Will Assad, Jessica Zhai,
 Raghav Banka, and Fatimeh Hassan.
 """
-from typing import Dict, List, Tuple
-import plotly.express as px
-import plotly.io as pio
-import pandas as pd
-import statsmodels.api as sm
-from entities import process_temperatures, process_forestfires
-
-pio.renderers.default = 'browser'
+from collections import OrderedDict
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, List, Optional, Sequence, \
+    Tuple, Union
+import numpy as np
+from entities import FIRE_VARIABLES, DatasetCache, file_signature, load_forestfire_columns, \
+    load_temperature_store
+from aggregation import aggregate, aggregate_weighted, aggregate_with_uncertainty, \
+    stream_aggregate
+from instrumentation import instrumented, stage
+from regression import LinearFit, MultipleFit, PairwiseFits, RegressionDesign, \
+    fit_all_pairs, fit_line, fit_weighted_line
+from resampling import Intervals, confidence_intervals, freedman_lane_data, \
+    freedman_lane_statistic, line_statistic, regression_statistic, resample_statistics
+from rendering import scatter_3d_figure, scatter_figure, temperature_animation, \
+    trendline_figure
+from ranges import SortedIndex
+from resultcache import ResultCache, default_result_cache
+from spatial import GridIndex
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+
+class FitCache:
+    """A bounded cache of fitted models, which evicts the least recently used fit
+    once it holds maxsize fits.
+
+    Instance Attributes:
+     - maxsize: the most fits this cache holds
+     - fits: maps each key to its fit, from least to most recently used
+     - hits: the number of lookups that found their key
+     - misses: the number of lookups that had to compute their fit
+     - evictions: the number of fits removed to make room for others
+
+    Representation Invariants:
+     - self.maxsize > 0
+     - len(self.fits) <= self.maxsize
+
+    >>> fits = FitCache(maxsize=1)
+    >>> fits.get('a', lambda: 1), fits.get('a', lambda: 2), fits.get('b', lambda: 3)
+    (1, 1, 3)
+    >>> fits.stats()
+    {'hits': 1, 'misses': 2, 'evictions': 1, 'size': 1, 'maxsize': 1}
+    """
+    maxsize: int
+    fits: OrderedDict
+    hits: int
+    misses: int
+    evictions: int
+    lock: threading.Lock
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self.fits = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return the fit stored under key, computing and storing it with compute if
+        it is not in this cache.
+
+        compute is called without holding the lock, so concurrent misses on the same
+        key may each compute the fit.
+        """
+        with self.lock:
+            if key in self.fits:
+                self.hits += 1
+                self.fits.move_to_end(key)
+                return self.fits[key]
+            self.misses += 1
+
+        fit = compute()
+        self.put(key, fit)
+        return fit
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hits, misses, evictions, size and maxsize of this cache."""
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'size': len(self.fits), 'maxsize': self.maxsize}
+
+    def put(self, key: Hashable, fit: Any) -> None:
+        """Store fit under key, replacing any fit already stored under it."""
+        with self.lock:
+            self.fits[key] = fit
+            self.fits.move_to_end(key)
+            while len(self.fits) > self.maxsize:
+                self.fits.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove every fit from this cache, keeping its statistics."""
+        with self.lock:
+            self.fits.clear()
 
 
 class Model:
-    """ Main class to model and predict forest fires. """
+    """ Main class to model and predict forest fires.
+
+    Each file is parsed once into NumPy columns and kept in self.cache, which is
+    private to this model unless a shared cache (such as entities.SHARED_CACHE)
+    is passed in. If streaming is True, temperatures are instead aggregated while
+    reading self.temperatures_file in chunks, for files too large to hold in memory.
+
+    Fitted regressions and yearly averages are kept in self.fits, keyed by the
+    signatures of the files they were computed from, so they are recomputed only
+    when a file changes. Models can share a FitCache like they share a DatasetCache.
+
+    If a ResultCache is given (or the environment variable FORESTFIRES_CACHE names
+    its directory), averages and fits that are not in self.fits are looked up on
+    disk before they are computed, so processes reuse each other's results for as
+    long as the contents of the files are unchanged. Parsed files are not stored
+    there, since processes share them by memory-mapping their binary directories.
+
+    Every method is recorded as a stage while an instrumentation.recording is active,
+    as are the building and showing of the figure when plotting.
+    """
     fires_file: str
     temperatures_file: str
     city: str
-
-    def __init__(self, fires_file: str, temperatures_file: str, city: str) -> None:
+    cache: DatasetCache
+    streaming: bool
+    fits: FitCache
+    results: Optional[ResultCache]
+
+    def __init__(self, fires_file: str, temperatures_file: str, city: str,
+                 cache: Optional[DatasetCache] = None, streaming: bool = False,
+                 fits: Optional[FitCache] = None,
+                 results: Optional[ResultCache] = None) -> None:
         # static file name paths
         self.fires_file = fires_file
         self.temperatures_file = temperatures_file
         self.city = city
+        self.results = default_result_cache() if results is None else results
+        self.cache = DatasetCache() if cache is None else cache
+        self.streaming = streaming
+        self.fits = FitCache() if fits is None else fits
+
+    @instrumented
+    def fire_columns(self) -> Dict[str, np.ndarray]:
+        """Return the columns of self.fires_file, loading them only if they are not cached.
+
+        >>> model = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
+        >>> model.fire_columns() is model.fire_columns()
+        True
+        """
+        return self.cache.get(self.fires_file, load_forestfire_columns)
+
+    @instrumented
+    def temperature_columns(self) -> Dict[str, np.ndarray]:
+        """Return the columns of self.temperatures_file restricted to the rows of self.city.
+
+        >>> model = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
+        >>> str(model.temperature_columns()['date'][0])
+        '1743-11-01'
+        """
+        store = self.cache.get(self.temperatures_file, load_temperature_store)
+        return store.lookup(self.city)
 
+    @instrumented
     def plot_variables(self, indep_var1: str, indep_var2: str, dep_var: str) -> None:
         """ Plot the scatter plot of dependent variable in a 3d graph with
         the 2 independent variables.
@@ -55,19 +196,32 @@ class Model:
          - dep_var in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
                        'wind', 'rain', 'area']
         """
-        # put the data from datafile into list of columns of each factor.
-        data_col = process_forestfires(self.fires_file)
+        fig = self.variables_figure(indep_var1, indep_var2, dep_var)
+        with stage('show'):
+            fig.show()  # show the figure in browser
 
-        # generate dataframe of the columns of factors
-        df = pd.DataFrame(data_col, columns=['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
-                                             'wind', 'rain', 'area'])
+    @instrumented
+    def variables_figure(self, indep_var1: str, indep_var2: str, dep_var: str) -> 'go.Figure':
+        """ Return the 3d scatter plot shown by plot_variables, without showing it.
 
-        fig = px.scatter_3d(df[[indep_var1, indep_var2, dep_var]], x=indep_var1,
-                            y=indep_var2, z=dep_var, opacity=0.6)
-        # generate a 3d scatter plot, the x and y axis are value of the 2 independent variables,
-        # z-axis is the value for the dependent variable.
-        fig.show()  # show the figure in browser
+        Preconditions:
+         - indep_var1 in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
+                       'wind', 'rain', 'area']
+         - indep_var2 in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
+                       'wind', 'rain', 'area']
+         - dep_var in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
+                       'wind', 'rain', 'area']
+        """
+        data_col = self.fire_columns()
+
+        # the x and y axes are the values of the 2 independent variables, and the z axis is
+        # the value of the dependent variable.
+        with stage('figure'):
+            return scatter_3d_figure((indep_var1, data_col[indep_var1]),
+                                     (indep_var2, data_col[indep_var2]),
+                                     (dep_var, data_col[dep_var]))
 
+    @instrumented
     def trendline(self, x_axis: str, y_axis: str,
                   show_plot: bool = True, start: int = None) -> List[float]:
         """Function to give a general trend of the input forest fire values
@@ -86,53 +240,138 @@ class Model:
 
         >>> model = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
         >>> model.trendline('humidity', 'isi', False)
-        [10.6615826813379, -0.03702835507934204]
+        [10.66158268133789, -0.03702835507934179]
         """
-        # process data and get the appropriate x/y values
-        data = process_forestfires(self.fires_file)
-        x_axis_data = data[x_axis]
-        y_axis_data = data[y_axis]
-
-        # if the domain is restricted by start
-        if start is not None:
-            # get all the x-values greater than given starting point
-            x_axis_data = [x for x in x_axis_data if x > start]
-
-            # get all the corresponding y-values
-            y_axis_data = [y_axis_data[i] for i in range(
-                len(y_axis_data) - len(x_axis_data), len(y_axis_data))]
+        x_axis_data, y_axis_data = self.restrict_domain(x_axis, y_axis, start)
 
         # plot the values and return the linear regression parameters
         return plot_trendline_axis_known((x_axis, x_axis_data), (y_axis, y_axis_data), show_plot)
 
-    def dc_versus_year(self) -> None:
+    @instrumented
+    def trendline_fit(self, x_axis: str, y_axis: str, start: float = None, end: float = None,
+                      months: Tuple[int, int] = None,
+                      percentiles: Tuple[float, float] = None) -> LinearFit:
+        """Return the full linear regression results that trendline gives the
+        parameters of, including R squared and standard errors, without plotting.
+
+        The fit is restricted to the points given by restrict_domain, and raises
+        ValueError for the same invalid or degenerate domains.
+
+        Preconditions:
+         - x_axis in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
+                      'wind', 'rain', 'area']
+         - y_axis in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
+                      'wind', 'rain', 'area']
+
+        >>> model = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
+        >>> round(model.trendline_fit('humidity', 'isi').r_squared, 4)
+        0.0176
+        >>> model.trendline_fit('temperature', 'dc', months=(6, 9)).n
+        405
+        """
+        return self.cached(self.fires_file, trendline_query(x_axis, y_axis, start, end, months,
+                                                            percentiles),
+                           lambda: fit_line(*self.restrict_domain(x_axis, y_axis, start, end,
+                                                                  months, percentiles)))
+
+    @instrumented
+    def all_trendlines(self) -> PairwiseFits:
+        """Return the linear regression parameters of trendline for every ordered pair
+        of the forest fire variables, computed together in a single pass.
+
+        >>> model = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
+        >>> fits = model.all_trendlines()
+        >>> [round(value, 6) for value in fits.parameters('humidity', 'isi')]
+        [10.661583, -0.037028]
+        """
+        data = self.fire_columns()
+        return fit_all_pairs(np.column_stack([data[key] for key in FIRE_VARIABLES]),
+                             FIRE_VARIABLES)
+
+    @instrumented
+    def restrict_domain(self, x_axis: str, y_axis: str, start: float = None, end: float = None,
+                        months: Tuple[int, int] = None,
+                        percentiles: Tuple[float, float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the x/y values of the forest fire data whose x-value is greater than
+        start and at most end, whose rank by x-value lies between the (lower, upper)
+        percentiles, and that were recorded in the (first, last) window of months (which
+        wraps around the end of the year if last comes before first). Each bound that is
+        None does not restrict the domain, so by default all of the values are returned.
+
+        The rows in each range are found by binary search in the sorted_index, and the
+        x and y values are taken from the same rows, so each pair stays aligned. Raise
+        ValueError if the months are not from 1 to 12, if the percentiles are not in
+        increasing order from 0 to 100, or if the domain has fewer than two distinct
+        x-values, so that no line can be fitted to it.
+
+        Preconditions:
+         - x_axis in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
+                      'wind', 'rain', 'area']
+         - y_axis in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
+                      'wind', 'rain', 'area']
+
+        >>> model = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
+        >>> x, y = model.restrict_domain('temperature', 'dc', start=30)
+        >>> data = model.fire_columns()
+        >>> sorted(zip(x, y)) == sorted(zip(data['temperature'][data['temperature'] > 30],
+        ...                                 data['dc'][data['temperature'] > 30]))
+        True
+        >>> model.restrict_domain('temperature', 'dc', start=1000)
+        Traceback (most recent call last):
+        ...
+        ValueError: the domain of temperature has fewer than two distinct values
+        """
+        return self.sorted_index().restrict(x_axis, y_axis, start, end, months, percentiles)
+
+    @instrumented
+    def dc_versus_year(self, weighted: bool = False) -> None:
         """ Look at the relationship between dc and year.
         Trying to find a trend for how the dc will change as temperatures
         change over time.
 
         For each year in TEMPERATURES_FILE in the city CITY, take
         the temperature and find the expected DC value from that temperature
-        from the data in FIRES_FILE
+        from the data in FIRES_FILE, as given by project_dc with weighted.
 
         Graph the results in browser.
         """
-        # get the results of linear regression on dc vs. temperature
-        temperatures_dc = self.trendline('temperature', 'dc', False)
-        average_temps = self.get_average_temperatures()
+        projection = self.project_dc(weighted)
+
+        # graph the results
+        plot_trendline_axis_known(('time', list(projection.keys())),
+                                  ('dc', list(projection.values())))
 
-        list_of_times = []  # ACCUMULATOR: list of the years (x-axis)
-        list_of_dc = []  # ACCUMULATOR: list of predicted DC (y-axis)
+    @instrumented
+    def project_dc(self, weighted: bool = False) -> Dict[int, float]:
+        """Return a dictionary of each year in self.temperatures_file for self.city
+        corresponding to the DC expected from that year's average temperature,
+        according to the linear regression of dc on temperature in self.fires_file.
 
-        # loop through each year and calculate the expected DC value
-        for year in average_temps:
-            # use results of linear regression to predict a dc value from temperature
-            predicted_dc = temperatures_dc[0] + temperatures_dc[1] * average_temps[year]
-            list_of_times.append(year)
-            list_of_dc.append(predicted_dc)
+        If weighted is True, the average temperature of each year is instead the
+        inverse-variance weighted mean of its readings, as given by
+        weighted_temperature_groups, so that uncertain readings count for less. (The DC
+        of the weighted temperature trend is given by predict_dc.)
 
-        # graph the results
-        plot_trendline_axis_known(('time', list_of_times), ('dc', list_of_dc))
+        >>> model = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
+        >>> round(model.project_dc()[2000], 3)
+        453.373
+        >>> round(model.project_dc(weighted=True)[2000], 3)
+        441.695
+        """
+        # get the results of linear regression on dc vs. temperature
+        temperatures_dc = self.trendline_fit('temperature', 'dc')
+
+        if weighted:
+            years, temperatures, _ = self.weighted_temperature_groups('year')
+        else:
+            average_temps = self.get_average_temperatures()
+            years, temperatures = list(average_temps.keys()), np.array(list(average_temps.values()))
 
+        # use results of linear regression to predict a dc value from every temperature at once
+        predicted_dc = temperatures_dc.predict(temperatures)
+        return dict(zip(years, predicted_dc.tolist()))
+
+    @instrumented
     def plot_prediction_vs_outcome(self, dep_var: str, prediction: List[float]) -> None:
         """ Plot the prediction of a factor calculated from regression vs the actual
             values of that factor from datafile.
@@ -146,82 +385,223 @@ class Model:
         Preconditions:
          - dep_var in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
                        'wind', 'rain', 'area']
-         - len(prediction) == len(process_forestfires('forestfires.csv'))
+         - len(prediction) == len(self.fire_columns()['dc'])
         """
-        # put the data into columns of each factor.
-        data_col = process_forestfires(self.fires_file)
-
-        # generate dataframe of the columns of factors
-        df = pd.DataFrame(data_col, columns=['ffmc', 'dmc', 'dc', 'isi', 'temperature',
-                                             'humidity', 'wind', 'rain', 'area'])
+        data_col = self.fire_columns()
 
-        # add the column of predictions, since it is not in data_col
-        df['prediction'] = prediction
+        # original value from the datafile on x-axis, prediction calculated from double
+        # regression on the y-axis
+        with stage('figure'):
+            fig = scatter_figure((dep_var, data_col[dep_var]), ('prediction', prediction))
 
-        # generate scatter plot, original value
-        fig = px.scatter(df[[dep_var, 'prediction']], x=dep_var, y='prediction')
+        with stage('show'):
+            fig.show()  # show the plot in browser
 
-        # from the datafile on x-axis, prediction calculated from double regression on the y-axis
-        fig.show()  # show the plot in browser
+    @instrumented
+    def predict_temperature(self, year: Union[int, np.ndarray],
+                            weighted: bool = False) -> Union[float, np.ndarray]:
+        """ Predict future temperature in the given year in self.CITY, or in each
+        year of an array of years.
 
-    def predict_temperature(self, year: int) -> float:
-        """ Predict future temperature in the given year in self.CITY
+        If weighted is True, the prediction is from the weighted fit of temperature_fit,
+        in which years measured with less uncertainty count for more.
 
         Preconditions:
-         - year >= min(self.get_average_temperatures().keys())
+         - np.all(year >= min(self.get_average_temperatures().keys()))
 
          >>> model = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Amadora')
          >>> model.predict_temperature(2060)
-         16.670193437009456
+         16.06886913640867
+         >>> [round(t, 3) for t in model.predict_temperature(np.array([2040, 2060])).tolist()]
+         [16.008, 16.069]
+         >>> round(model.predict_temperature(2060, weighted=True), 3)
+         16.592
+        """
+        # return predicted temperature from the line fitted to the yearly averages
+        return self.temperature_fit(weighted).predict(year)
+
+    @instrumented
+    def predict_dc(self, year: Union[int, np.ndarray],
+                   weighted: bool = False) -> Union[float, np.ndarray]:
+        """ Predict the DC in the given year in self.CITY, or in each year of an array
+        of years, from the predicted temperature of that year (from the weighted fit of
+        temperature_fit if weighted is True).
+
+        Preconditions:
+         - np.all(year >= min(self.get_average_temperatures().keys()))
+
+         >>> model = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
+         >>> [round(dc, 1) for dc in model.predict_dc(np.array([2040, 2050, 2060])).tolist()]
+         [450.2, 451.0, 451.8]
         """
-        # get parameters of linear regression and return predicted temperature
-        temperature_data = self.get_average_temperatures()
-        parameters = plot_trendline_axis_known(('Year', list(temperature_data.keys())),
-                                               ('Temperature', list(temperature_data.values())),
-                                               False)
-        return parameters[0] + parameters[1] * year
+        return self.trendline_fit('temperature', 'dc').predict(
+            self.predict_temperature(year, weighted))
+
+    @instrumented
+    def temperature_fit(self, weighted: bool = False) -> LinearFit:
+        """ Return the line fitted to the yearly average temperatures in self.CITY.
 
+        If weighted is True, the line is fitted by weighted least squares, weighting each
+        year by the inverse of the variance of its average (as given by
+        get_average_uncertainties), so that years whose readings are uncertain (such as
+        the earliest ones, or years with few readings) count for less.
+        """
+        if weighted:
+            def compute() -> LinearFit:
+                periods, means, uncertainties = self.temperature_groups('year', True)
+                return fit_weighted_line(periods, means, 1.0 / uncertainties ** 2)
+
+            return self.cached(self.temperatures_file, ('weighted_temperature', self.city),
+                               compute)
+
+        def compute() -> LinearFit:
+            temperature_data = self.get_average_temperatures()
+            return fit_line(list(temperature_data.keys()), list(temperature_data.values()))
+
+        return self.cached(self.temperatures_file, ('temperature', self.city), compute)
+
+    @instrumented
     def animate_temperatures(self) -> None:
         """" Function to plot the average temperature of a particular city
         for each year in an animated bar chart.
         """
-        # process data from datafile and get a dictionary datatype
-        data = self.get_average_temperatures()
-        # get a list of keys and values from the dictionary
-        list_of_years = list(data.keys())
-        list_of_temp = list(data.values())
-        length = len(list_of_temp)
-        list_of_city = [self.city] * length
-        # generate dataframe from the list of keys and values from the dictionary
-        df = pd.DataFrame(dict(year=list_of_years, temp=list_of_temp,
-                               city=list_of_city))
-        # plot animated bar chart taking the average temperatures as the y axis,
-        # city to be the x axis and the frame of reference to be the years concerned
-        fig = px.bar(df, x="city", y="temp",
-                     animation_frame="year", animation_group="city", range_y=[0, 30])
+        fig = self.temperatures_figure()
         # to display the bar chart
-        fig.show()
+        with stage('show'):
+            fig.show()
+
+    @instrumented
+    def temperatures_figure(self, granularity: str = 'year') -> 'go.Figure':
+        """Return the animated bar chart shown by animate_temperatures, with one frame
+        for each period of the given granularity, without showing it.
 
-    def get_average_temperatures(self) -> Dict[int, float]:
-        """Return a dictionary of the year corresponding to the average temperature """
-        temperatures_data = process_temperatures(self.temperatures_file, self.city)
-        yearly_temperatures = {}  # ACCUMULATOR: map each year to a list of all the
-        # temperatures recorded in that year
+        The frames are built from the averages of temperature_groups, so the figure
+        holds one value per period.
+
+        Preconditions:
+         - granularity in ['month', 'season', 'year', 'decade']
+
+        >>> model = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Amadora')
+        >>> len(model.temperatures_figure('decade').frames)
+        27
+        """
+        periods, means, _ = self.temperature_groups(granularity)
+        # plot animated bar chart taking the average temperatures as the y axis,
+        # city to be the x axis and the frame of reference to be the periods concerned
+        with stage('figure'):
+            return temperature_animation([self.city], periods, means[np.newaxis, :])
 
-        for row in temperatures_data:
-            year = row.timestamp.year
-            temperature = row.average_temp
+    @instrumented
+    def get_average_temperatures(self, granularity: str = 'year') -> Dict:
+        """Return a dictionary of the year (or other period of the given granularity)
+        corresponding to the average temperature.
 
-            # mutate list or create it if it does not exist
-            if year in yearly_temperatures:
-                yearly_temperatures[year].append(temperature)
-            else:
-                yearly_temperatures[year] = []
+        Periods are labelled as by aggregation.period_label: a year for 'year', the
+        first year of the decade for 'decade', and (year, month) or (year, season)
+        tuples for 'month' and 'season'.
 
-        # return the average of all the temperatures of each year
-        return {key: sum(yearly_temperatures[key]) / len(yearly_temperatures[key])
-                for key in yearly_temperatures if len(yearly_temperatures[key]) > 0}
+        Preconditions:
+         - granularity in ['month', 'season', 'year', 'decade']
+
+        >>> model = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Amadora')
+        >>> round(model.get_average_temperatures()[1753], 3)
+        15.521
+        >>> round(model.get_average_temperatures('season')[(1753, 'JJA')], 3)
+        22.882
+        """
+        periods, means, _ = self.temperature_groups(granularity)
+        return dict(zip(periods, means.tolist()))
+
+    @instrumented
+    def get_average_uncertainties(self, granularity: str = 'year') -> Dict:
+        """Return a dictionary of each period of the given granularity corresponding to
+        the uncertainty of the average temperature of that period, computed from the
+        uncertainties of its readings as by aggregation.aggregate_with_uncertainty.
+
+        Preconditions:
+         - granularity in ['month', 'season', 'year', 'decade']
+
+        >>> model = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Amadora')
+        >>> uncertainties = model.get_average_uncertainties()
+        >>> uncertainties[1753] > uncertainties[2000]
+        True
+        """
+        periods, _, uncertainties = self.temperature_groups(granularity, True)
+        return dict(zip(periods, uncertainties.tolist()))
 
+    @instrumented
+    def get_reading_counts(self, granularity: str = 'year') -> Dict:
+        """Return a dictionary of each period of the given granularity corresponding
+        to the number of temperature readings averaged by get_average_temperatures.
+
+        Preconditions:
+         - granularity in ['month', 'season', 'year', 'decade']
+
+        >>> model = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Amadora')
+        >>> model.get_reading_counts('decade')[1750]
+        84
+        """
+        periods, _, counts = self.temperature_groups(granularity)
+        return dict(zip(periods, counts.tolist()))
+
+    @instrumented
+    def temperature_groups(self, granularity: str,
+                           with_uncertainty: bool = False) -> Tuple[List, np.ndarray, np.ndarray]:
+        """Return the periods of the given granularity with temperature readings in
+        self.city, in order, along with the mean temperature and the number of
+        readings in each period.
+
+        If with_uncertainty is True, return the uncertainty of the mean temperature of
+        each period instead of the number of readings, as by
+        aggregation.aggregate_with_uncertainty.
+
+        Preconditions:
+         - granularity in ['month', 'season', 'year', 'decade']
+        """
+        if with_uncertainty:
+            query = ('temperature_uncertainties', self.city, granularity)
+        else:
+            query = ('temperature_groups', self.city, granularity)
+
+        def compute() -> Tuple[List, np.ndarray, np.ndarray]:
+            if self.streaming:
+                return stream_aggregate(self.temperatures_file, self.city, granularity,
+                                        with_uncertainty=with_uncertainty)
+
+            temperatures_data = self.temperature_columns()
+            if with_uncertainty:
+                return aggregate_with_uncertainty(temperatures_data['date'],
+                                                  temperatures_data['temperature'],
+                                                  temperatures_data['uncertainty'], granularity)
+            return aggregate(temperatures_data['date'], temperatures_data['temperature'],
+                             granularity)
+
+        return self.cached(self.temperatures_file, query, compute)
+
+    @instrumented
+    def weighted_temperature_groups(self, granularity: str) -> Tuple[List, np.ndarray,
+                                                                      np.ndarray]:
+        """Return the periods of the given granularity with temperature readings in
+        self.city, in order, along with the inverse-variance weighted mean temperature of
+        each period and its uncertainty, as by aggregation.aggregate_weighted.
+
+        Preconditions:
+         - granularity in ['month', 'season', 'year', 'decade']
+
+        >>> model = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Amadora')
+        >>> periods, means, _ = model.weighted_temperature_groups('year')
+        >>> (periods[0], round(float(means[0]), 2))
+        (1753, 16.99)
+        """
+        def compute() -> Tuple[List, np.ndarray, np.ndarray]:
+            temperatures_data = self.temperature_columns()
+            return aggregate_weighted(temperatures_data['date'], temperatures_data['temperature'],
+                                      temperatures_data['uncertainty'], granularity)
+
+        return self.cached(self.temperatures_file,
+                           ('weighted_temperature_groups', self.city, granularity), compute)
+
+    @instrumented
     def calc_double_regression(self, params: Tuple[float, float, float],
                                x1: str, x2: str) -> List[float]:
         """ Calculate the value of dependent variable y using equation of double regression.
@@ -245,23 +625,18 @@ class Model:
         >>> result[1] == 415.4
         True
         """
-        # get the data into dict of columns of each factor
-        data_col = process_forestfires(self.fires_file)
-
-        x1_list = data_col[x1]  # get the column corresponding to x1
-        x2_list = data_col[x2]  # get the column corresponding to x2
-        y = []  # ACCUMULATOR: the results of regression
+        # get the dict of columns of each factor
+        data_col = self.fire_columns()
 
-        for i, val in enumerate(x1_list):  # looping through all elements in x1 and x2.
-            # perform calculation of double regression using formula,
-            y.append(params[0] + params[1] * val + params[2] * x2_list[i])
-            # add the result into the list
+        # perform calculation of double regression using formula on the whole columns
+        y = params[0] + params[1] * data_col[x1] + params[2] * data_col[x2]
 
-        return y  # return the list
+        return y.tolist()  # return the list
 
+    @instrumented
     def coef_double_regression(self, indep_var1: str, indep_var2: str, dep_var: str) -> tuple:
         """ given 2 independent variable names and 1 dependent variable name, use
-            statsmodel.OLS to model the change of dependent variable due to changes
+            ordinary least squares to model the change of dependent variable due to changes
             of independent variables. Returns a tuple with 3 floats, in the order of constant,
             coefficient of 1st independent variable, coefficient of 2nd independent
             variable.
@@ -281,52 +656,293 @@ class Model:
 
         >>> m = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
         >>> m.coef_double_regression('ffmc', 'dc', 'temperature')
-        (-14.839067312278363, 0.31592664888750815, 0.009291464340286205)
+        (-14.83906731227821, 0.31592664888750654, 0.009291464340286246)
         """
-        # put data into dict of columns of each factor
-        data_col = process_forestfires(self.fires_file)
+        # find the coefficients of the independent variables that result in
+        # R squared closest to 1
+        fit = self.regression([indep_var1, indep_var2], dep_var)
 
-        # generate dataframe from data_col
-        df = pd.DataFrame(data_col, columns=['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
-                                             'wind', 'rain', 'area'])
+        # return the values of the constant, first coefficient, and second coefficient
+        return tuple(fit.coefficients.tolist())
 
-        # x is the dataframe with only columns of the 2 independent variables
-        x = df[[indep_var1, indep_var2]]
+    @instrumented
+    def regression(self, indep_vars: List[str], dep_var: str) -> MultipleFit:
+        """ Return the ordinary least squares fit of dep_var on any number of
+        independent variables from the forest fire data.
 
-        # y is the dataframe with only column of the dependent variable
-        y = df[dep_var]
+        The cross-products of the forest fire variables are computed once per model,
+        and the factorization for each set of independent variables is cached, so
+        repeated and stepwise fits do not pass over the data again.
 
-        x = sm.add_constant(x)  # add a constant to x
+        Preconditions:
+         - all(var in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
+                       'wind', 'rain', 'area'] for var in indep_vars)
+         - dep_var in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
+                       'wind', 'rain', 'area']
 
-        model = sm.OLS(y, x).fit()  # perform OSL on x and y, find the coefficients of
-        # the independent variables that results in R squared closest to 1
+        >>> m = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
+        >>> fit = m.regression(['ffmc', 'dc', 'humidity'], 'temperature')
+        >>> round(fit.r_squared, 4)
+        0.5228
+        """
+        return self.fire_design().fit(indep_vars, dep_var)
 
-        # get the constant and the coefficients into a dictionary
-        dict_model = dict(model.params)
+    @instrumented
+    def trendline_intervals(self, x_axis: str, y_axis: str, resamples: int = 1000,
+                            confidence: float = 0.95, seed: Optional[int] = None,
+                            workers: Optional[int] = None) -> Intervals:
+        """Return bootstrap confidence intervals of the intercept and slope of the
+        trendline of y_axis against x_axis, and the permutation p-value of the slope,
+        each from the given number of resamples.
 
-        # return the values of the constant, first coefficient, and second coefficient
-        return (dict_model['const'], dict_model[indep_var1], dict_model[indep_var2])
+        The resamples are computed in the given number of worker processes, or in this
+        process if workers is None.
+
+        Preconditions:
+         - x_axis in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
+                      'wind', 'rain', 'area']
+         - y_axis in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
+                      'wind', 'rain', 'area']
+         - resamples >= 1
+         - 0 < confidence < 1
+
+        >>> m = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
+        >>> intervals = m.trendline_intervals('temperature', 'dc', resamples=200, seed=0)
+        >>> bool(intervals.lower[1] < intervals.estimates[1] < intervals.upper[1])
+        True
+        >>> bool(intervals.p_values[1] < 0.05)
+        True
+        """
+        data = self.restrict_domain(x_axis, y_axis)
+        fit = self.trendline_fit(x_axis, y_axis)
+
+        resampled = resample_statistics(line_statistic, data, resamples, seed, False, workers)
+        permuted = resample_statistics(line_statistic, data, resamples, seed, True, workers)
+        return confidence_intervals(['intercept', 'slope'], np.array([fit.intercept, fit.slope]),
+                                    resampled, confidence, permuted)
+
+    @instrumented
+    def double_regression_intervals(self, indep_var1: str, indep_var2: str, dep_var: str,
+                                    resamples: int = 1000, confidence: float = 0.95,
+                                    seed: Optional[int] = None,
+                                    workers: Optional[int] = None) -> Intervals:
+        """Return bootstrap confidence intervals of the constant and coefficients that
+        coef_double_regression returns, and the permutation p-value of each coefficient,
+        each from the given number of resamples.
+
+        Each coefficient is tested by the Freedman-Lane procedure: the residuals of the
+        fit of dep_var on the other independent variable are permuted and added back to
+        its fitted values, so the p-value of one coefficient does not also count the
+        association of dep_var with the other variable.
+
+        The resamples are computed in the given number of worker processes, or in this
+        process if workers is None.
 
+        Preconditions:
+         - indep_var1 in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
+                       'wind', 'rain', 'area']
+         - indep_var2 in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
+                       'wind', 'rain', 'area']
+         - dep_var in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
+                       'wind', 'rain', 'area']
+         - resamples >= 1
+         - 0 < confidence < 1
+
+        >>> m = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
+        >>> intervals = m.double_regression_intervals('ffmc', 'dc', 'temperature',
+        ...                                           resamples=200, seed=0)
+        >>> intervals.names
+        ['constant', 'ffmc', 'dc']
+        >>> bool(np.all(intervals.lower < intervals.upper))
+        True
+        """
+        data_col = self.fire_columns()
+        data = (np.column_stack([data_col[indep_var1], data_col[indep_var2]]), data_col[dep_var])
+        estimates = np.array(self.coef_double_regression(indep_var1, indep_var2, dep_var))
+
+        resampled = resample_statistics(regression_statistic, data, resamples, seed, False,
+                                        workers)
+        permuted = resample_statistics(freedman_lane_statistic,
+                                       (data[0],) + freedman_lane_data(*data), resamples, seed,
+                                       True, workers)
+        return confidence_intervals(['constant', indep_var1, indep_var2], estimates, resampled,
+                                    confidence, permuted)
+
+    @instrumented
+    def predict_temperature_intervals(self, years: List[int], resamples: int = 1000,
+                                      confidence: float = 0.95, seed: Optional[int] = None,
+                                      workers: Optional[int] = None) -> Intervals:
+        """Return bootstrap confidence intervals of the temperature predicted in
+        self.city in each of years, from the given number of resamples of the yearly
+        average temperatures.
+
+        The resamples are computed in the given number of worker processes, or in this
+        process if workers is None.
 
-def plot_trendline_axis_known(x_axis: Tuple[str, List[float]], y_axis: Tuple[str, List[float]],
+        Preconditions:
+         - years != []
+         - resamples >= 1
+         - 0 < confidence < 1
+
+        >>> m = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Amadora')
+        >>> intervals = m.predict_temperature_intervals([2060], resamples=200, seed=0)
+        >>> bool(intervals.lower[0] < 16.0689 < intervals.upper[0])
+        True
+        """
+        averages = self.get_average_temperatures()
+        data = (np.array(list(averages.keys()), dtype=float), np.array(list(averages.values())))
+        at = np.array(years, dtype=float)
+
+        lines = resample_statistics(line_statistic, data, resamples, seed, False, workers)
+        predictions = lines[:, :1] + lines[:, 1:] * at[np.newaxis, :]
+        return confidence_intervals([str(year) for year in years],
+                                    np.asarray(self.predict_temperature(at)), predictions,
+                                    confidence)
+
+    @instrumented
+    def fire_design(self) -> RegressionDesign:
+        """Return the RegressionDesign of the forest fire variables, computing it only
+        if self.fires_file has changed since it was last computed.
+
+        >>> m = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
+        >>> m.fire_design() is m.fire_design()
+        True
+        """
+        return self.fits.get(self.fires_key('design'),
+                             lambda: RegressionDesign(self.fire_columns(), FIRE_VARIABLES))
+
+    @instrumented
+    def sorted_index(self) -> SortedIndex:
+        """Return the SortedIndex of the forest fire data, computing it only if
+        self.fires_file has changed since it was last computed.
+
+        >>> m = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
+        >>> m.sorted_index() is m.sorted_index()
+        True
+        """
+        return self.fits.get(self.fires_key('sorted_index'),
+                             lambda: SortedIndex(self.fire_columns()))
+
+    @instrumented
+    def grid(self) -> GridIndex:
+        """Return the GridIndex of the forest fire data, computing it only if
+        self.fires_file has changed since it was last computed.
+
+        >>> m = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
+        >>> m.grid().summaries[(7, 5)]['fires']
+        3
+        """
+        return self.fits.get(self.fires_key('grid'), lambda: GridIndex(self.fire_columns()))
+
+    @instrumented
+    def local_trendline_fit(self, x_axis: str, y_axis: str, cell: Tuple[int, int],
+                            radius: int = 0) -> LinearFit:
+        """Return the linear regression of y_axis against x_axis over the fires recorded
+        within radius cells of cell, as given by GridIndex.neighborhood.
+
+        The fit is solved from the statistics of each cell in the neighbourhood, without
+        a pass over its rows.
+
+        Preconditions:
+         - x_axis in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
+                      'wind', 'rain', 'area']
+         - y_axis in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
+                      'wind', 'rain', 'area']
+         - radius >= 0
+         - at least 2 fires with different values of x_axis were recorded in the neighbourhood
+
+        >>> m = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
+        >>> fit = m.local_trendline_fit('temperature', 'dc', (7, 5), radius=1)
+        >>> (fit.n, round(fit.slope, 3))
+        (176, 23.971)
+        """
+        grid = self.grid()
+        return grid.combined_statistics(grid.neighborhood(cell, radius)).line(x_axis, y_axis)
+
+    @instrumented
+    def local_regression(self, indep_vars: List[str], dep_var: str, cell: Tuple[int, int],
+                         radius: int = 0) -> MultipleFit:
+        """Return the ordinary least squares fit of dep_var on indep_vars over the fires
+        recorded within radius cells of cell, as given by GridIndex.neighborhood.
+
+        Preconditions:
+         - all(var in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
+                       'wind', 'rain', 'area'] for var in indep_vars)
+         - dep_var in ['ffmc', 'dmc', 'dc', 'isi', 'temperature', 'humidity',
+                       'wind', 'rain', 'area']
+         - radius >= 0
+         - more fires were recorded in the neighbourhood than there are indep_vars
+
+        >>> m = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
+        >>> m.local_regression(['ffmc', 'dc'], 'temperature', (7, 5), radius=1).n
+        176
+        """
+        grid = self.grid()
+        cells = grid.neighborhood(cell, radius)
+
+        # the design is built from the merged statistics of the cells alone, so no rows
+        # of the neighbourhood are gathered
+        design = RegressionDesign(None, FIRE_VARIABLES, grid.combined_statistics(cells))
+        return design.fit(indep_vars, dep_var)
+
+    def cached(self, file_path: str, query: Tuple, compute: Callable[[], Any]) -> Any:
+        """Return the result of query on the current version of file_path (which is
+        self.fires_file or self.temperatures_file), taken from self.fits or else from
+        self.results, and computed with compute only if it is in neither.
+
+        The design, grid and sorted index are only kept in self.fits, since they hold the columns
+        themselves and are quicker to rebuild from the parsed file than to read.
+        """
+        key = (file_path, file_signature(file_path)) + query
+        if self.results is None:
+            return self.fits.get(key, compute)
+        return self.fits.get(key, lambda: self.results.get(file_path, query, compute))
+
+    def fires_key(self, *query: Hashable) -> Tuple:
+        """Return the key in self.fits of the result of query on the current version of
+        self.fires_file."""
+        return (self.fires_file, file_signature(self.fires_file)) + query
+
+    def temperatures_key(self, *query: Hashable) -> Tuple:
+        """Return the key in self.fits of the result of query on the current version of
+        self.temperatures_file."""
+        return (self.temperatures_file, file_signature(self.temperatures_file)) + query
+
+
+def trendline_query(x_axis: str, y_axis: str, start: float = None, end: float = None,
+                    months: Tuple[int, int] = None,
+                    percentiles: Tuple[float, float] = None) -> Tuple:
+    """Return the query under which Model.trendline_fit caches the fit of y_axis
+    against x_axis over the given domain, with any window given as a list made a tuple.
+
+    >>> trendline_query('temperature', 'dc', months=[6, 9])
+    ('trendline', 'temperature', 'dc', None, None, (6, 9), None)
+    """
+    return ('trendline', x_axis, y_axis, start, end,
+            None if months is None else tuple(months),
+            None if percentiles is None else tuple(percentiles))
+
+
+@instrumented
+def plot_trendline_axis_known(x_axis: Tuple[str, Sequence[float]],
+                              y_axis: Tuple[str, Sequence[float]],
                               show_plot: bool = True) -> List[float]:
     """Function to give a general trend of the input values
 
     >>> x_axis_data = [1.0, 2.0, 3.0, 4.0, 5.0]
     >>> y_axis_data = [2.0, 4.0, 6.0, 8.0, 10.0]
     >>> plot_trendline_axis_known(('x-axis', x_axis_data), ('y-axis', y_axis_data), False)
-    [-3.1086244689504383e-15, 2.0000000000000004]
+    [0.0, 2.0]
     """
-    df = pd.DataFrame({x_axis[0]: x_axis[1], y_axis[0]: y_axis[1]})
-    fig = px.scatter(df, x=x_axis[0], y=y_axis[0], marginal_x="box",
-                     marginal_y="violin", trendline="ols")
-
+    # the figure is only built when it is shown, since the fit does not need it
     if show_plot:  # default is to display plot
-        fig.show()
+        fig = trendline_figure(x_axis, y_axis)
+        with stage('show'):
+            fig.show()
 
     # get results of linear regression and return
-    results = px.get_trendline_results(fig)
-    return list(results.iloc[0]["px_fit_results"].params)
+    fit = fit_line(x_axis[1], y_axis[1])
+    return [fit.intercept, fit.slope]
 
 
 if __name__ == '__main__':
@@ -334,8 +950,10 @@ if __name__ == '__main__':
 
     python_ta.check_all(config={
         'max-line-length': 100,
-        'extra-imports': ['python_ta.contracts', 'typing', 'plotly.express',
-                          'pandas', 'statsmodels.api', 'entities', 'plotly.io'],
+        'extra-imports': ['python_ta.contracts', 'collections', 'threading', 'typing', 'numpy',
+                          'plotly.graph_objects', 'entities', 'aggregation', 'regression',
+                          'instrumentation', 'ranges', 'rendering', 'resultcache', 'spatial',
+                          'resampling'],
         'allowed-io': ['process_forestfires', 'process_temperatures']
     })
 
@@ -0,0 +1,144 @@
+"""forestfires Multi-City Modelling
+
+Overview and Description
+========================
+
+This Python module contains functions to model many cities at once. The
+temperature data is loaded once, copied into shared memory, and every worker
+process of a process pool models its cities from that shared copy instead of
+reading the file or receiving the data through pickling.
+
+Copyright and Usage Information
+===============================
+
+All forms of distribution of this code, whether as given or with any changes,
+are expressly prohibited.
+
+This file is Copyright (c) 2020 Will Assad, Jessica Zhai,
+Raghav Banka, and Fatimeh Hassan.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from entities import DatasetCache, TemperatureStore, load_temperature_store
+from models import Model
+
+# The state of a worker process, set up once by init_worker:
+#  - 'cache': a DatasetCache holding the shared TemperatureStore
+#  - 'blocks': the shared memory blocks the store's columns are views of
+WORKER_STATE = {}
+
+
+def share_store(store: TemperatureStore) -> Tuple[List[shared_memory.SharedMemory], Dict]:
+    """Copy the columns of store into new shared memory blocks, and return the blocks
+    along with a small picklable description of them that attach_store can rebuild
+    the store from.
+
+    The caller must close and unlink the blocks once no process uses them.
+    """
+    blocks = []  # ACCUMULATOR: the shared memory blocks created so far
+    columns = {}  # ACCUMULATOR: maps each column to the name, dtype and length of its block
+
+    for key, column in store.columns.items():
+        block = shared_memory.SharedMemory(create=True, size=max(column.nbytes, 1))
+        np.ndarray(column.shape, dtype=column.dtype, buffer=block.buf)[:] = column
+        blocks.append(block)
+        columns[key] = (block.name, column.dtype.str, len(column))
+
+    return blocks, {'columns': columns, 'offsets': store.offsets}
+
+
+def attach_store(spec: Dict) -> Tuple[List[shared_memory.SharedMemory], TemperatureStore]:
+    """Return the shared memory blocks described by spec (as returned by share_store)
+    and a TemperatureStore whose columns are views of them, without copying.
+
+    The blocks must stay open for as long as the store is used.
+    """
+    blocks = []  # ACCUMULATOR: the shared memory blocks attached so far
+    columns = {}  # ACCUMULATOR: maps each column to a view of its block
+
+    for key, (name, dtype, length) in spec['columns'].items():
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        columns[key] = np.ndarray((length,), dtype=np.dtype(dtype), buffer=block.buf)
+
+    return blocks, TemperatureStore(columns, spec['offsets'])
+
+
+def init_worker(temperatures_file: str, spec: Dict) -> None:
+    """Attach a worker process to the shared temperature store described by spec and
+    cache it as the loaded data of temperatures_file."""
+    blocks, store = attach_store(spec)
+    cache = DatasetCache()
+    cache.put(temperatures_file, load_temperature_store, store)
+
+    WORKER_STATE['blocks'] = blocks
+    WORKER_STATE['cache'] = cache
+
+
+def model_city(fires_file: str, temperatures_file: str, city: str,
+               years: Sequence[int]) -> Dict[str, Any]:
+    """Return the yearly average temperatures of city, its predicted temperature in
+    each of years and its projected DC for each year of data.
+
+    In a worker process set up by init_worker, the temperature data comes from the
+    shared store instead of temperatures_file.
+    """
+    model = Model(fires_file, temperatures_file, city, WORKER_STATE.get('cache'))
+    return {'average_temperatures': model.get_average_temperatures(),
+            'predicted_temperatures': {year: model.predict_temperature(year) for year in years},
+            'dc_projection': model.project_dc()}
+
+
+def run_cities(fires_file: str, temperatures_file: str, cities: Optional[List[str]] = None,
+               years: Sequence[int] = (2060,),
+               max_workers: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+    """Return a dictionary mapping each city in cities (or every city in
+    temperatures_file if cities is None) to the results of model_city, computed
+    across a pool of max_workers processes (by default, one per CPU).
+
+    Preconditions:
+     - os.path.exists(fires_file)
+     - os.path.exists(temperatures_file)
+     - cities is None or all(city in the cities of temperatures_file for city in cities)
+
+    >>> results = run_cities('data/forestfires.csv', 'data/portugaltemperatures.csv',
+    ...                      ['Amadora', 'Braga'], max_workers=2)
+    >>> round(results['Amadora']['predicted_temperatures'][2060], 3)
+    16.069
+    """
+    store = load_temperature_store(temperatures_file)
+    if cities is None:
+        cities = store.cities()
+
+    blocks, spec = share_store(store)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                                 initargs=(temperatures_file, spec)) as executor:
+            results = executor.map(model_city, [fires_file] * len(cities),
+                                   [temperatures_file] * len(cities), cities,
+                                   [list(years)] * len(cities))
+            return dict(zip(cities, results))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 100,
+        'extra-imports': ['python_ta.contracts', 'concurrent.futures', 'multiprocessing',
+                          'typing', 'numpy', 'entities', 'models'],
+        'allowed-io': []
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+
+    import doctest
+    doctest.testmod()
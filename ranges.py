@@ -0,0 +1,215 @@
+"""forestfires Range Queries
+
+Overview and Description
+========================
+
+This Python module finds the rows of forest fire data whose value of a
+variable lies in a range, such as every fire above a temperature, between two
+percentiles of DC, or in the months from June to September.
+
+The order that sorts each variable is computed once, so the rows in any range
+are found by a binary search for its ends, and are a slice of that order. The
+rows are returned as indices into every column, so the values of any other
+variable taken through them stay paired with the values in the range.
+
+Copyright and Usage Information
+===============================
+
+All forms of distribution of this code, whether as given or with any changes,
+are expressly prohibited.
+
+This file is Copyright (c) 2020 Will Assad, Jessica Zhai,
+Raghav Banka, and Fatimeh Hassan.
+"""
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from instrumentation import instrumented
+
+
+def month_numbers(timestamps: np.ndarray) -> np.ndarray:
+    """Return the month (from 1 to 12) of each date in timestamps.
+
+    >>> month_numbers(np.array(['2000-03-05', '2000-12-01'], dtype='datetime64[D]')).tolist()
+    [3, 12]
+    """
+    return timestamps.astype('datetime64[M]').astype(np.int64) % 12 + 1
+
+
+class SortedIndex:
+    """The columns of forest fire data along with the order that sorts each of them.
+
+    Besides the columns themselves, the index has a 'month' variable holding the
+    month of each row's timestamp.
+
+    Instance Attributes:
+     - columns: maps each variable to the array of its values
+     - orders: maps each variable to the indices of the rows in increasing order of
+               its value, with equal values in their original order
+     - sorted_values: maps each variable to its values in increasing order
+
+    Representation Invariants:
+     - self.orders.keys() == self.sorted_values.keys()
+     - all(np.all(np.diff(self.sorted_values[key]) >= 0) for key in self.sorted_values)
+
+    >>> from entities import load_forestfire_columns
+    >>> index = SortedIndex(load_forestfire_columns('data/forestfires.csv'))
+    >>> rows = index.rows('temperature', 30)
+    >>> (len(rows), bool(np.all(index.columns['temperature'][rows] > 30)))
+    (13, True)
+    """
+    columns: Dict[str, np.ndarray]
+    orders: Dict[str, np.ndarray]
+    sorted_values: Dict[str, np.ndarray]
+
+    def __init__(self, columns: Dict[str, np.ndarray],
+                 variables: Optional[List[str]] = None) -> None:
+        """Sort each of the given variables of columns (by default, every column but the
+        timestamp), and 'month' if columns has a timestamp.
+
+        Preconditions:
+         - variables is None or all(variable in columns for variable in variables)
+        """
+        if variables is None:
+            variables = [key for key in columns if key != 'timestamp']
+
+        self.columns = {key: columns[key] for key in variables}
+        if 'timestamp' in columns:
+            self.columns['month'] = month_numbers(columns['timestamp'])
+
+        self.orders = {}
+        self.sorted_values = {}
+        for key, column in self.columns.items():
+            self.orders[key] = np.argsort(column, kind='stable')
+            self.sorted_values[key] = column[self.orders[key]]
+
+    def rows(self, variable: str, start: Optional[float] = None,
+             end: Optional[float] = None) -> np.ndarray:
+        """Return the indices of the rows whose value of variable is greater than start
+        and at most end (with no bound where either is None), in increasing order of
+        their value of variable.
+
+        Preconditions:
+         - variable in self.orders
+
+        >>> index = SortedIndex({'a': np.array([3.0, 1.0, 2.0, 5.0])})
+        >>> index.rows('a', 1.0, 3.0).tolist()
+        [2, 0]
+        """
+        values = self.sorted_values[variable]
+        first = 0 if start is None else np.searchsorted(values, start, side='right')
+        last = len(values) if end is None else np.searchsorted(values, end, side='right')
+        return self.orders[variable][first:max(first, last)]
+
+    def percentile_rows(self, variable: str, lower: float, upper: float) -> np.ndarray:
+        """Return the indices of the rows whose rank by their value of variable lies
+        between the lower and upper percentiles, in increasing order of that value.
+
+        Of rows with equal values, those that come first in the data rank lower.
+
+        Raise ValueError unless 0 <= lower <= upper <= 100.
+
+        Preconditions:
+         - variable in self.orders
+
+        >>> index = SortedIndex({'a': np.arange(10.0)[::-1]})
+        >>> index.percentile_rows('a', 0, 30).tolist()
+        [9, 8, 7]
+        >>> index.percentile_rows('a', 50, 10)
+        Traceback (most recent call last):
+        ...
+        ValueError: percentiles must satisfy 0 <= lower <= upper <= 100, not (50, 10)
+        """
+        if not 0 <= lower <= upper <= 100:
+            raise ValueError(f'percentiles must satisfy 0 <= lower <= upper <= 100, '
+                             f'not ({lower}, {upper})')
+
+        n = len(self.orders[variable])
+        return self.orders[variable][round(lower * n / 100):round(upper * n / 100)]
+
+    def month_rows(self, first: int, last: int) -> np.ndarray:
+        """Return the indices of the rows recorded in the months from first to last,
+        inclusive, which wraps around the end of the year if last comes before first.
+
+        Raise ValueError unless first and last are both from 1 to 12.
+
+        Preconditions:
+         - 'month' in self.orders
+
+        >>> index = SortedIndex({'timestamp': np.array(['2000-01-01', '2000-06-01',
+        ...                                             '2000-12-01'], dtype='datetime64[D]')})
+        >>> index.month_rows(12, 1).tolist()
+        [0, 2]
+        """
+        if not (1 <= first <= 12 and 1 <= last <= 12):
+            raise ValueError(f'months must be from 1 to 12, not ({first}, {last})')
+
+        if first <= last:
+            return self.rows('month', first - 1, last)
+        return np.concatenate([self.rows('month', None, last), self.rows('month', first - 1)])
+
+    @instrumented
+    def restrict(self, x_axis: str, y_axis: str, start: Optional[float] = None,
+                 end: Optional[float] = None, months: Optional[Tuple[int, int]] = None,
+                 percentiles: Optional[Tuple[float, float]] = None
+                 ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the values of x_axis and y_axis in the rows whose value of x_axis is
+        greater than start and at most end, whose rank by x_axis lies between the given
+        percentiles, and that were recorded in the given (first, last) window of months,
+        where each bound that is None does not restrict the rows.
+
+        If more than one kind of restriction is given, the rows are in their original
+        order, and otherwise in the order given by rows, percentile_rows or month_rows.
+
+        Raise ValueError if the rows left hold fewer than two distinct values of x_axis,
+        since no line can be fitted to them, or if the months or percentiles are invalid.
+
+        Preconditions:
+         - x_axis in self.orders and y_axis in self.columns
+         - months is None or 'month' in self.orders
+
+        >>> index = SortedIndex({'x': np.array([3.0, 1.0, 2.0]),
+        ...                      'y': np.array([30.0, 10.0, 20.0])})
+        >>> [values.tolist() for values in index.restrict('x', 'y', start=1.0)]
+        [[2.0, 3.0], [20.0, 30.0]]
+        >>> index.restrict('x', 'y', start=5.0)
+        Traceback (most recent call last):
+        ...
+        ValueError: the domain of x has fewer than two distinct values
+        """
+        selections = []  # ACCUMULATOR: the rows of each restriction given so far
+
+        if start is not None or end is not None:
+            selections.append(self.rows(x_axis, start, end))
+        if percentiles is not None:
+            selections.append(self.percentile_rows(x_axis, *percentiles))
+        if months is not None:
+            selections.append(self.month_rows(*months))
+
+        if selections == []:
+            return self.columns[x_axis], self.columns[y_axis]
+
+        rows = selections[0]
+        for selection in selections[1:]:
+            rows = np.intersect1d(rows, selection, assume_unique=True)
+
+        x_values = self.columns[x_axis][rows]
+        if len(x_values) == 0 or x_values.min() == x_values.max():
+            raise ValueError(f'the domain of {x_axis} has fewer than two distinct values')
+        return x_values, self.columns[y_axis][rows]
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 100,
+        'extra-imports': ['python_ta.contracts', 'typing', 'numpy', 'instrumentation'],
+        'allowed-io': []
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,550 @@
+"""forestfires Regression
+
+Overview and Description
+========================
+
+This Python module contains closed-form linear regression on NumPy arrays.
+Fitting a line here does not build any figure, so it can be used by code that
+only needs the regression results.
+
+Copyright and Usage Information
+===============================
+
+All forms of distribution of this code, whether as given or with any changes,
+are expressly prohibited.
+
+This file is Copyright (c) 2020 Will Assad, Jessica Zhai,
+Raghav Banka, and Fatimeh Hassan.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from instrumentation import instrumented
+
+# the fraction of a predictor's sum of squares that must be left unexplained by the
+# other predictors for it to be added to their fit
+COLLINEARITY_TOLERANCE = 1e-10
+
+
+@dataclass
+class LinearFit:
+    """The result of fitting the line y = intercept + slope * x by ordinary least squares.
+
+    Attributes:
+     - intercept: the estimated value of y when x is 0
+     - slope: the estimated change in y for each unit of x
+     - r_squared: the proportion of the variance of y explained by the line
+     - intercept_stderr: the standard error of the intercept
+     - slope_stderr: the standard error of the slope
+     - n: the number of points the line was fitted to
+
+    Representation Invariants:
+     - self.n >= 2
+     - 0.0 <= self.r_squared <= 1.0
+    """
+    intercept: float
+    slope: float
+    r_squared: float
+    intercept_stderr: float
+    slope_stderr: float
+    n: int
+
+    def predict(self, x: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        """Return the value of the line at x, which may be a number or an array.
+
+        >>> fit = fit_line([1.0, 2.0, 3.0], [3.0, 5.0, 7.0])
+        >>> fit.predict(4.0)
+        9.0
+        >>> fit.predict(np.array([0.0, 10.0])).tolist()
+        [1.0, 21.0]
+        """
+        return self.intercept + self.slope * x
+
+
+@instrumented
+def fit_line(x: Sequence[float], y: Sequence[float]) -> LinearFit:
+    """Return the ordinary least squares fit of the line through the points (x[i], y[i]).
+
+    Preconditions:
+     - len(x) == len(y)
+     - len(x) >= 2
+     - the values of x are not all equal
+
+    >>> fit = fit_line([1.0, 2.0, 3.0, 4.0, 5.0], [2.0, 4.0, 6.0, 8.0, 10.0])
+    >>> (fit.intercept, fit.slope, fit.r_squared)
+    (0.0, 2.0, 1.0)
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # solve the normal equations in terms of the centred sums of squares and products
+    x_mean = x.mean()
+    y_mean = y.mean()
+    x_centred = x - x_mean
+    y_centred = y - y_mean
+    return line_from_moments(len(x), (float(x_mean), float(y_mean)),
+                             (float(x_centred @ x_centred), float(x_centred @ y_centred),
+                              float(y_centred @ y_centred)))
+
+
+def line_from_moments(n: int, means: Tuple[float, float],
+                      products: Tuple[float, float, float],
+                      total_weight: Optional[float] = None) -> LinearFit:
+    """Return the ordinary least squares fit of a line to n points, given the means of
+    their x and y values and the centred sums of products sxx, sxy and syy.
+
+    If the points are weighted, the means and products are the weighted ones and
+    total_weight is the sum of the weights.
+
+    Preconditions:
+     - n >= 2
+     - products[0] > 0
+     - total_weight is None or total_weight > 0
+
+    >>> line_from_moments(3, (2.0, 5.0), (2.0, 4.0, 8.0)).slope
+    2.0
+    """
+    x_mean, y_mean = means
+    sxx, sxy, syy = products
+
+    slope = sxy / sxx
+    intercept = float(y_mean - slope * x_mean)
+
+    residual_ss = max(syy - slope * sxy, 0.0)
+    r_squared = 1.0 - residual_ss / syy if syy > 0 else 1.0
+    variance = residual_ss / (n - 2) if n > 2 else 0.0
+    total = n if total_weight is None else total_weight
+
+    return LinearFit(intercept=intercept, slope=slope, r_squared=r_squared,
+                     intercept_stderr=float(np.sqrt(variance * (1 / total + x_mean ** 2 / sxx))),
+                     slope_stderr=float(np.sqrt(variance / sxx)), n=n)
+
+
+@instrumented
+def fit_weighted_line(x: Sequence[float], y: Sequence[float],
+                      weights: Sequence[float]) -> LinearFit:
+    """Return the weighted least squares fit of the line through the points (x[i], y[i]),
+    where each point counts in proportion to weights[i], such as the inverse of the
+    variance of y[i].
+
+    The standard errors are scaled by the weighted variance of the residuals, so they
+    do not depend on the scale of the weights, and neither does the line.
+
+    Preconditions:
+     - len(x) == len(y) == len(weights)
+     - len(x) >= 2
+     - all(weight > 0 for weight in weights)
+     - the values of x are not all equal
+
+    >>> fit = fit_weighted_line([1.0, 2.0, 3.0, 4.0], [3.0, 5.0, 7.0, 100.0],
+    ...                         [1.0, 1.0, 1.0, 1e-12])
+    >>> (round(fit.intercept, 6), round(fit.slope, 6))
+    (1.0, 2.0)
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+
+    total_weight = weights.sum()
+    x_mean = weights @ x / total_weight
+    y_mean = weights @ y / total_weight
+    x_centred = x - x_mean
+    y_centred = y - y_mean
+    weighted_x = weights * x_centred
+    return line_from_moments(len(x), (float(x_mean), float(y_mean)),
+                             (float(weighted_x @ x_centred), float(weighted_x @ y_centred),
+                              float((weights * y_centred) @ y_centred)),
+                             float(total_weight))
+
+
+@dataclass
+class PairwiseFits:
+    """The ordinary least squares lines for every ordered pair of a set of variables.
+
+    Entry [i, j] of each matrix describes the line fitted with variables[i] on the
+    x-axis and variables[j] on the y-axis.
+
+    Attributes:
+     - variables: the names of the variables, in the order of the rows and columns
+     - slopes: the slope of each line
+     - intercepts: the intercept of each line
+     - correlations: the Pearson correlation of each pair of variables
+     - r_squared: the R squared of each line
+
+    Representation Invariants:
+     - all(matrix.shape == (len(self.variables), len(self.variables))
+           for matrix in [self.slopes, self.intercepts, self.correlations, self.r_squared])
+    """
+    variables: List[str]
+    slopes: np.ndarray
+    intercepts: np.ndarray
+    correlations: np.ndarray
+    r_squared: np.ndarray
+
+    def parameters(self, x_axis: str, y_axis: str) -> List[float]:
+        """Return the intercept and slope of the line of y_axis against x_axis.
+
+        Preconditions:
+         - x_axis in self.variables
+         - y_axis in self.variables
+
+        >>> fits = fit_all_pairs(np.array([[1.0, 3.0], [2.0, 5.0], [3.0, 7.0]]), ['x', 'y'])
+        >>> fits.parameters('x', 'y')
+        [1.0, 2.0]
+        """
+        i = self.variables.index(x_axis)
+        j = self.variables.index(y_axis)
+        return [float(self.intercepts[i, j]), float(self.slopes[i, j])]
+
+
+@instrumented
+def fit_all_pairs(data: np.ndarray, variables: List[str]) -> PairwiseFits:
+    """Return the least squares lines for every ordered pair of the columns of data,
+    computed together from one matrix of column means and covariances.
+
+    Pairs involving a column whose values are all equal have nan entries.
+
+    Preconditions:
+     - data.ndim == 2
+     - data.shape[1] == len(variables)
+     - data.shape[0] >= 2
+
+    >>> fits = fit_all_pairs(np.array([[1.0, 3.0], [2.0, 5.0], [3.0, 7.0]]), ['x', 'y'])
+    >>> fits.slopes.tolist()
+    [[1.0, 2.0], [0.5, 1.0]]
+    >>> fits.r_squared.tolist()
+    [[1.0, 1.0], [1.0, 1.0]]
+    """
+    means = data.mean(axis=0)
+    centred = data - means
+    products = centred.T @ centred  # the centred sums of products of every pair of columns
+    squares = np.diag(products)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # row i holds the lines with column i on the x-axis
+        slopes = products / squares[:, np.newaxis]
+        correlations = products / np.sqrt(np.outer(squares, squares))
+
+    intercepts = means[np.newaxis, :] - slopes * means[:, np.newaxis]
+    return PairwiseFits(variables=list(variables), slopes=slopes, intercepts=intercepts,
+                        correlations=correlations, r_squared=correlations ** 2)
+
+
+class RunningProducts:
+    """The number of rows, the mean of each variable and the centred sums of products
+    of every pair of variables, to which rows can be added without another pass
+    over the rows added before.
+
+    These hold the same information as the sums of each variable and of the products
+    of each pair (the sums of x, y, xy and x squared behind every line), but stay
+    accurate when the means are large compared to the spread of the values.
+
+    Instance Attributes:
+     - variables: the names of the variables, in the order of the rows of products
+     - n: the number of rows added
+     - means: the mean of each variable over the rows added
+     - products: the centred sums of products of every pair of variables
+
+    Representation Invariants:
+     - self.means.shape == (len(self.variables),)
+     - self.products.shape == (len(self.variables), len(self.variables))
+
+    >>> running = RunningProducts(['x', 'y'])
+    >>> running.add(np.array([[1.0, 3.0], [2.0, 5.0]]))
+    >>> running.add(np.array([[3.0, 7.0]]))
+    >>> running.line('x', 'y').slope
+    2.0
+    """
+    variables: List[str]
+    n: int
+    means: np.ndarray
+    products: np.ndarray
+
+    def __init__(self, variables: List[str]) -> None:
+        self.variables = list(variables)
+        self.n = 0
+        self.means = np.zeros(len(variables))
+        self.products = np.zeros((len(variables), len(variables)))
+
+    def add(self, data: np.ndarray) -> None:
+        """Add the rows of data, whose columns are the values of self.variables.
+
+        Preconditions:
+         - data.ndim == 2
+         - data.shape[1] == len(self.variables)
+        """
+        if len(data) == 0:
+            return
+
+        added = RunningProducts(self.variables)
+        added.n = len(data)
+        added.means = data.mean(axis=0)
+        centred = data - added.means
+        added.products = centred.T @ centred
+        self.merge(added)
+
+    def merge(self, other: 'RunningProducts') -> None:
+        """Add the rows that were added to other.
+
+        Preconditions:
+         - other.variables == self.variables
+
+        >>> first, second = RunningProducts(['x', 'y']), RunningProducts(['x', 'y'])
+        >>> first.add(np.array([[1.0, 3.0], [2.0, 5.0]]))
+        >>> second.add(np.array([[3.0, 7.0]]))
+        >>> first.merge(second)
+        >>> (first.n, first.means.tolist())
+        (3, [2.0, 5.0])
+        """
+        if other.n == 0:
+            return
+
+        # merge the two sets of rows, correcting for the distance between their means
+        total = self.n + other.n
+        difference = other.means - self.means
+        self.products = (self.products + other.products
+                         + np.outer(difference, difference) * (self.n * other.n / total))
+        self.means = self.means + difference * (other.n / total)
+        self.n = total
+
+    def line(self, x_axis: str, y_axis: str) -> LinearFit:
+        """Return the least squares line of y_axis against x_axis over the rows added.
+
+        Preconditions:
+         - x_axis in self.variables
+         - y_axis in self.variables
+         - self.n >= 2
+        """
+        i = self.variables.index(x_axis)
+        j = self.variables.index(y_axis)
+        return line_from_moments(self.n, (float(self.means[i]), float(self.means[j])),
+                                 (float(self.products[i, i]), float(self.products[i, j]),
+                                  float(self.products[j, j])))
+
+
+@dataclass
+class MultipleFit:
+    """The result of fitting response = coefficients[0] + coefficients[1] * predictors[0]
+    + coefficients[2] * predictors[1] + ... by ordinary least squares.
+
+    Attributes:
+     - predictors: the names of the independent variables
+     - response: the name of the dependent variable
+     - coefficients: the constant followed by the coefficient of each predictor
+     - r_squared: the proportion of the variance of the response explained by the fit
+     - n: the number of rows the fit was computed from
+
+    Representation Invariants:
+     - len(self.coefficients) == len(self.predictors) + 1
+    """
+    predictors: List[str]
+    response: str
+    coefficients: np.ndarray
+    r_squared: float
+    n: int
+
+    def predict(self, data: Dict[str, np.ndarray]) -> np.ndarray:
+        """Return the predicted response for each row of data, a dictionary mapping each
+        predictor to an array of its values.
+
+        Preconditions:
+         - all(predictor in data for predictor in self.predictors)
+
+        >>> fit = MultipleFit(['a', 'b'], 'y', np.array([1.0, 2.0, 3.0]), 1.0, 3)
+        >>> fit.predict({'a': np.array([1.0, 0.0]), 'b': np.array([0.0, 1.0])}).tolist()
+        [3.0, 4.0]
+        """
+        result = np.asarray(self.coefficients[0])
+        for coefficient, predictor in zip(self.coefficients[1:], self.predictors):
+            result = result + coefficient * data[predictor]
+        return result
+
+
+class RegressionDesign:
+    """The centred cross-products of a fixed set of columns, from which the least
+    squares fit of any column on any other columns is solved without another pass
+    over the data.
+
+    The Cholesky factor of the cross-products of each set of predictors is cached.
+    It is built one predictor at a time, so adding a predictor to a fitted set
+    extends the cached factor by one row instead of factorizing again, and a
+    predictor that is collinear with those before it is detected at its own row.
+
+    Instance Attributes:
+     - variables: the names of the variables, in the order of the rows of products
+     - n: the number of rows of data
+     - means: the mean of each variable
+     - products: the centred sums of products of every pair of variables
+     - factors: maps each tuple of predictors that has been fitted, and each prefix of
+                it, to the lower Cholesky factor of their block of products
+
+    Representation Invariants:
+     - self.products.shape == (len(self.variables), len(self.variables))
+
+    >>> data = {'a': np.array([0.0, 1.0, 2.0, 3.0]), 'b': np.array([1.0, 0.0, 1.0, 3.0]),
+    ...         'y': np.array([2.0, 2.0, 6.0, 12.0])}
+    >>> design = RegressionDesign(data, ['a', 'b', 'y'])
+    >>> [round(c, 6) for c in design.fit(['a', 'b'], 'y').coefficients.tolist()]
+    [0.0, 2.0, 2.0]
+    """
+    variables: List[str]
+    n: int
+    means: np.ndarray
+    products: np.ndarray
+    factors: Dict[Tuple[str, ...], np.ndarray]
+
+    def __init__(self, columns: Optional[Dict[str, np.ndarray]], variables: List[str],
+                 running: Optional[RunningProducts] = None) -> None:
+        """Compute the cross-products of the given variables of columns, or take them
+        from running if it is given, in which case columns is not read and may be None.
+
+        Preconditions:
+         - columns is not None or running is not None
+         - running is not None or all(variable in columns for variable in variables)
+         - running is not None or len({len(columns[variable]) for variable in variables}) == 1
+         - running is None or running.variables == variables
+
+        >>> running = RunningProducts(['a', 'y'])
+        >>> running.add(np.array([[0.0, 2.0], [1.0, 2.0], [2.0, 6.0], [3.0, 12.0]]))
+        >>> RegressionDesign(None, ['a', 'y'], running).fit(['a'], 'y').n
+        4
+        """
+        self.variables = list(variables)
+        if running is None:
+            running = RunningProducts(variables)
+            running.add(np.column_stack([columns[variable] for variable in variables]))
+
+        self.n = running.n
+        self.means = running.means.copy()
+        self.products = running.products.copy()
+        self.factors = {}
+
+    @instrumented
+    def fit(self, predictors: Sequence[str], response: str) -> MultipleFit:
+        """Return the least squares fit of response on predictors.
+
+        Raise np.linalg.LinAlgError if a predictor is constant or a linear combination
+        of the others (as when a predictor is given twice), since the fit is then not
+        unique.
+
+        Preconditions:
+         - all(predictor in self.variables for predictor in predictors)
+         - response in self.variables
+
+        >>> data = {'a': np.array([0.0, 1.0, 2.0, 3.0]), 'y': np.array([2.0, 2.0, 6.0, 12.0])}
+        >>> RegressionDesign(data, ['a', 'y']).fit(['a', 'a'], 'y')
+        Traceback (most recent call last):
+        ...
+        numpy.linalg.LinAlgError: a is constant or a linear combination of ['a']
+        """
+        return self.solve(tuple(predictors), response, self.factor(tuple(predictors)))
+
+    def add_predictor(self, fit: MultipleFit, predictor: str) -> MultipleFit:
+        """Return the fit of fit.response on fit.predictors and predictor, extending the
+        Cholesky factor of fit.predictors by one row.
+
+        Raise np.linalg.LinAlgError if predictor is constant or a linear combination of
+        fit.predictors, since the fit is then not unique.
+
+        Preconditions:
+         - predictor in self.variables
+         - predictor not in fit.predictors
+
+        >>> data = {'a': np.array([0.0, 1.0, 2.0, 3.0]), 'b': np.array([1.0, 0.0, 1.0, 3.0]),
+        ...         'y': np.array([2.0, 2.0, 6.0, 12.0])}
+        >>> design = RegressionDesign(data, ['a', 'b', 'y'])
+        >>> both = design.add_predictor(design.fit(['a'], 'y'), 'b')
+        >>> [round(c, 6) for c in both.coefficients.tolist()]
+        [0.0, 2.0, 2.0]
+        >>> design = RegressionDesign({'a': data['a'], 'c': 2 * data['a'], 'y': data['y']},
+        ...                           ['a', 'c', 'y'])
+        >>> design.add_predictor(design.fit(['a'], 'y'), 'c')
+        Traceback (most recent call last):
+        ...
+        numpy.linalg.LinAlgError: c is constant or a linear combination of ['a']
+        """
+        extended = tuple(fit.predictors) + (predictor,)
+        return self.solve(extended, fit.response, self.factor(extended))
+
+    def drop_predictor(self, fit: MultipleFit, predictor: str) -> MultipleFit:
+        """Return the fit of fit.response on fit.predictors without predictor.
+
+        Preconditions:
+         - predictor in fit.predictors
+        """
+        return self.fit([name for name in fit.predictors if name != predictor], fit.response)
+
+    def factor(self, predictors: Tuple[str, ...]) -> np.ndarray:
+        """Return the (cached) lower Cholesky factor of the products of predictors,
+        extending the factor of all but the last predictor by one row.
+
+        Raise np.linalg.LinAlgError if a predictor is constant or a linear combination of
+        the predictors before it.
+        """
+        # scipy takes far longer to import than numpy, so it is only imported once needed
+        from scipy.linalg import solve_triangular
+
+        if predictors == ():
+            return np.zeros((0, 0))
+        if predictors in self.factors:
+            return self.factors[predictors]
+
+        factor = self.factor(predictors[:-1])
+        indices = [self.variables.index(name) for name in predictors[:-1]]
+        new = self.variables.index(predictors[-1])
+
+        # the new row of the factor solves factor @ row = products between old and new
+        row = solve_triangular(factor, self.products[indices, new], lower=True)
+        # the part of the new predictor's sum of squares not explained by the others,
+        # which is (up to rounding) zero if it is a combination of them
+        remainder = self.products[new, new] - row @ row
+        if not remainder > COLLINEARITY_TOLERANCE * self.products[new, new]:
+            raise np.linalg.LinAlgError(f'{predictors[-1]} is constant or a linear '
+                                        f'combination of {list(predictors[:-1])}')
+
+        size = len(predictors)
+        extended = np.zeros((size, size))
+        extended[:-1, :-1] = factor
+        extended[-1, :-1] = row
+        extended[-1, -1] = np.sqrt(remainder)
+        self.factors[predictors] = extended
+        return extended
+
+    def solve(self, predictors: Tuple[str, ...], response: str,
+              factor: np.ndarray) -> MultipleFit:
+        """Return the fit of response on predictors, given the Cholesky factor of the
+        products of predictors."""
+        from scipy.linalg import cho_solve
+
+        indices = [self.variables.index(name) for name in predictors]
+        target = self.variables.index(response)
+        right_side = self.products[indices, target]
+
+        # solve (factor @ factor.T) @ slopes = right_side by two triangular solves
+        slopes = cho_solve((factor, True), right_side)
+        constant = self.means[target] - slopes @ self.means[indices]
+
+        total = self.products[target, target]
+        r_squared = float(slopes @ right_side / total) if total > 0 else 1.0
+        return MultipleFit(predictors=list(predictors), response=response,
+                           coefficients=np.concatenate([[constant], slopes]),
+                           r_squared=r_squared, n=self.n)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 100,
+        'extra-imports': ['python_ta.contracts', 'dataclasses', 'typing', 'numpy',
+                          'scipy.linalg', 'instrumentation'],
+        'allowed-io': [],
+        'disable': ['C0415']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,421 @@
+"""forestfires Rendering
+
+Overview and Description
+========================
+
+This Python module builds the figures of the models so that they stay small
+enough to open quickly, however many points or cities they show.
+
+Every statistic a figure shows (the trendline, the quartiles of a box plot, the
+counts of a histogram) is computed from all of the data with numpy, but only a
+bounded number of points is sent to plotly: above max_points, the points of a
+scatter plot are either sampled or binned into a grid of cells drawn once each,
+and above SCATTERGL_THRESHOLD they are drawn with WebGL. Animations are built
+from arrays of precomputed averages, with one bar per city in each frame.
+
+Figures can be written to .html files, or to .png/.svg/.pdf files (which needs
+kaleido), from a pool of background threads:
+
+    results = run_cities(FIRES_FILE, TEMPERATURES_FILE)
+    periods, values = align_periods({city: results[city]['average_temperatures']
+                                     for city in results})
+    with FigureExporter('figures', 'html') as exporter:
+        exporter.submit('temperatures', temperature_animation(list(results), periods, values))
+        for city in results:
+            projection = results[city]['dc_projection']
+            exporter.submit(f'dc_{city}', trendline_figure(('year', list(projection.keys())),
+                                                           ('dc', list(projection.values()))))
+
+Copyright and Usage Information
+===============================
+
+All forms of distribution of this code, whether as given or with any changes,
+are expressly prohibited.
+
+This file is Copyright (c) 2020 Will Assad, Jessica Zhai,
+Raghav Banka, and Fatimeh Hassan.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+import os
+from typing import TYPE_CHECKING, Any, Dict, Hashable, List, Optional, Sequence, Tuple
+import numpy as np
+from instrumentation import instrumented
+from regression import fit_line
+
+# plotly takes far longer to import than the rest of the program, so it is only
+# imported inside the functions that build figures.
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+# the most points drawn by a 2D scatter plot
+MAX_POINTS = 20000
+
+# the most points drawn by a 3D scatter plot, which is slower to rotate than a 2D one is to pan
+MAX_POINTS_3D = 5000
+
+# scatter plots with more points than this are drawn with WebGL
+SCATTERGL_THRESHOLD = 1000
+
+# the number of bins of each histogram, and of each axis of the grid points are binned into
+HISTOGRAM_BINS = 40
+
+
+def sample_indices(n: int, max_points: int, seed: int = 0) -> np.ndarray:
+    """Return the indices, in increasing order, of at most max_points of n points,
+    chosen uniformly at random without replacement (or all of them if n <= max_points).
+
+    The same indices are returned for the same arguments.
+
+    Preconditions:
+     - n >= 0
+     - max_points >= 1
+
+    >>> sample_indices(5, 10).tolist()
+    [0, 1, 2, 3, 4]
+    >>> indices = sample_indices(1000, 10)
+    >>> (len(indices), bool(np.all(np.diff(indices) > 0)))
+    (10, True)
+    """
+    if n <= max_points:
+        return np.arange(n)
+    return np.sort(np.random.default_rng(seed).choice(n, size=max_points, replace=False))
+
+
+def bin_points(x: np.ndarray, y: np.ndarray,
+               bins: int = HISTOGRAM_BINS) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the x and y coordinates of the centre of each cell of a bins by bins grid
+    over the points (x[i], y[i]) that holds at least one point, and the number of
+    points in each of those cells.
+
+    Preconditions:
+     - len(x) == len(y)
+     - len(x) >= 1
+     - bins >= 1
+
+    >>> x_centres, y_centres, counts = bin_points(np.array([0.0, 0.1, 1.0]),
+    ...                                           np.array([0.0, 0.1, 1.0]), 2)
+    >>> (x_centres.tolist(), y_centres.tolist(), counts.tolist())
+    ([0.25, 0.75], [0.25, 0.75], [2, 1])
+    """
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=bins)
+    x_cells, y_cells = np.nonzero(counts)
+    return ((x_edges[x_cells] + x_edges[x_cells + 1]) / 2,
+            (y_edges[y_cells] + y_edges[y_cells + 1]) / 2,
+            counts[x_cells, y_cells].astype(np.int64))
+
+
+def box_statistics(values: np.ndarray) -> Dict[str, float]:
+    """Return the quartiles of values and the ends of the whiskers of their box plot,
+    which reach the most extreme values within 1.5 times the interquartile range of
+    the box.
+
+    Preconditions:
+     - len(values) >= 1
+
+    >>> box_statistics(np.array([1.0, 2.0, 3.0, 4.0, 5.0, 100.0]))
+    {'q1': 2.25, 'median': 3.5, 'q3': 4.75, 'lowerfence': 1.0, 'upperfence': 5.0}
+    """
+    q1, median, q3 = np.percentile(values, [25, 50, 75]).tolist()
+    reach = 1.5 * (q3 - q1)
+    return {'q1': q1, 'median': median, 'q3': q3,
+            'lowerfence': float(values[values >= q1 - reach].min()),
+            'upperfence': float(values[values <= q3 + reach].max())}
+
+
+def point_trace(x: np.ndarray, y: np.ndarray, **kwargs: Any) -> 'go.Scatter':
+    """Return a trace of the points (x[i], y[i]) as markers, drawn with WebGL if there
+    are more than SCATTERGL_THRESHOLD of them. kwargs are passed on to the trace.
+
+    Preconditions:
+     - len(x) == len(y)
+    """
+    import plotly.graph_objects as go
+
+    trace_type = go.Scattergl if len(x) > SCATTERGL_THRESHOLD else go.Scatter
+    return trace_type(x=x, y=y, mode='markers', **kwargs)
+
+
+def reduced_points(x: np.ndarray, y: np.ndarray, max_points: int,
+                   binned: bool) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    """Return the points to draw of the points (x[i], y[i]): all of them if there are at
+    most max_points, and otherwise the centres of the cells they are binned into if
+    binned is True, or a sample of max_points of them if it is not.
+
+    The third value is the number of points in each cell, or None if the points were
+    not binned.
+
+    Preconditions:
+     - len(x) == len(y)
+     - max_points >= 1
+    """
+    if len(x) <= max_points:
+        return x, y, None
+    elif binned:
+        return bin_points(x, y, min(HISTOGRAM_BINS * 4, int(np.sqrt(max_points))))
+    else:
+        indices = sample_indices(len(x), max_points)
+        return x[indices], y[indices], None
+
+
+@instrumented
+def trendline_figure(x_axis: Tuple[str, Sequence[float]], y_axis: Tuple[str, Sequence[float]],
+                     max_points: int = MAX_POINTS, binned: bool = False) -> 'go.Figure':
+    """Return a scatter plot of the input values with an ordinary least squares
+    trendline, a box plot of the x values above it and a histogram of the y values
+    beside it.
+
+    The trendline and marginals are computed from every point, but at most max_points
+    points are drawn, as by reduced_points. Binned points are drawn larger the more
+    points their cell holds.
+
+    Preconditions:
+     - len(x_axis[1]) == len(y_axis[1])
+     - len(x_axis[1]) >= 2
+     - max_points >= 1
+
+    >>> fig = trendline_figure(('x', np.arange(5000.0)), ('y', 2 * np.arange(5000.0)), 100)
+    >>> [trace.type for trace in fig.data]
+    ['scatter', 'scatter', 'box', 'bar']
+    >>> len(fig.data[0].x)
+    100
+    """
+    from plotly.subplots import make_subplots
+    import plotly.graph_objects as go
+
+    x = np.asarray(x_axis[1], dtype=float)
+    y = np.asarray(y_axis[1], dtype=float)
+
+    fig = make_subplots(rows=2, cols=2, shared_xaxes=True, shared_yaxes=True,
+                        column_widths=[0.8, 0.2], row_heights=[0.2, 0.8],
+                        horizontal_spacing=0.02, vertical_spacing=0.02)
+
+    points_x, points_y, counts = reduced_points(x, y, max_points, binned)
+    if counts is None:
+        fig.add_trace(point_trace(points_x, points_y, name='points'), row=2, col=1)
+    else:
+        sizes = 4 + 12 * np.sqrt(counts / counts.max())
+        fig.add_trace(point_trace(points_x, points_y, name='points', customdata=counts,
+                                  marker={'size': sizes},
+                                  hovertemplate='(%{x}, %{y}): %{customdata} points'),
+                      row=2, col=1)
+
+    fit = fit_line(x, y)
+    ends = np.array([x.min(), x.max()])
+    fig.add_trace(go.Scatter(x=ends, y=fit.predict(ends), mode='lines',
+                             name=f'OLS trendline (R²={fit.r_squared:.3f})'), row=2, col=1)
+
+    statistics = box_statistics(x)
+    fig.add_trace(go.Box(y=[x_axis[0]], orientation='h', name=x_axis[0], showlegend=False,
+                         **{key: [value] for key, value in statistics.items()}), row=1, col=1)
+
+    counts, edges = np.histogram(y, bins=HISTOGRAM_BINS)
+    fig.add_trace(go.Bar(x=counts, y=(edges[:-1] + edges[1:]) / 2, orientation='h',
+                         name=y_axis[0], showlegend=False), row=2, col=2)
+
+    fig.update_xaxes(title_text=x_axis[0], row=2, col=1)
+    fig.update_yaxes(title_text=y_axis[0], row=2, col=1)
+    fig.update_layout(bargap=0)
+    return fig
+
+
+@instrumented
+def scatter_figure(x_axis: Tuple[str, Sequence[float]], y_axis: Tuple[str, Sequence[float]],
+                   max_points: int = MAX_POINTS) -> 'go.Figure':
+    """Return a scatter plot of the input values, drawing a sample of at most max_points
+    of them.
+
+    Preconditions:
+     - len(x_axis[1]) == len(y_axis[1])
+     - max_points >= 1
+    """
+    import plotly.graph_objects as go
+
+    x = np.asarray(x_axis[1], dtype=float)
+    y = np.asarray(y_axis[1], dtype=float)
+    indices = sample_indices(len(x), max_points)
+
+    fig = go.Figure(point_trace(x[indices], y[indices]))
+    fig.update_layout(xaxis_title=x_axis[0], yaxis_title=y_axis[0])
+    return fig
+
+
+@instrumented
+def scatter_3d_figure(x_axis: Tuple[str, Sequence[float]], y_axis: Tuple[str, Sequence[float]],
+                      z_axis: Tuple[str, Sequence[float]],
+                      max_points: int = MAX_POINTS_3D) -> 'go.Figure':
+    """Return a 3d scatter plot of the input values, drawing a sample of at most
+    max_points of them.
+
+    Preconditions:
+     - len(x_axis[1]) == len(y_axis[1]) == len(z_axis[1])
+     - max_points >= 1
+    """
+    import plotly.graph_objects as go
+
+    indices = sample_indices(len(x_axis[1]), max_points)
+    x, y, z = (np.asarray(axis[1], dtype=float)[indices] for axis in [x_axis, y_axis, z_axis])
+
+    fig = go.Figure(go.Scatter3d(x=x, y=y, z=z, mode='markers', opacity=0.6,
+                                 marker={'size': 4}))
+    fig.update_layout(scene={'xaxis_title': x_axis[0], 'yaxis_title': y_axis[0],
+                             'zaxis_title': z_axis[0]})
+    return fig
+
+
+def align_periods(averages: Dict[str, Dict[Hashable, float]]) -> Tuple[List, np.ndarray]:
+    """Return every period of averages (a dictionary mapping each city to its average
+    temperature in each period, as returned by Model.get_average_temperatures), in
+    order, and an array whose value in row i and column j is the average of the ith
+    city of averages in the jth period, or nan if it has no average for that period.
+
+    >>> periods, values = align_periods({'a': {2000: 1.0, 2001: 2.0}, 'b': {2001: 3.0}})
+    >>> (periods, values.tolist())
+    ([2000, 2001], [[1.0, 2.0], [nan, 3.0]])
+    """
+    periods = sorted(set().union(*averages.values()))
+    columns = {period: j for j, period in enumerate(periods)}
+    values = np.full((len(averages), len(periods)), np.nan)
+
+    for i, city_averages in enumerate(averages.values()):
+        values[i, [columns[period] for period in city_averages]] = list(city_averages.values())
+
+    return periods, values
+
+
+@instrumented
+def temperature_animation(cities: List[str], periods: List, values: np.ndarray,
+                          range_y: Tuple[float, float] = (0, 30),
+                          frame_step: int = 1) -> 'go.Figure':
+    """Return an animated bar chart of the average temperature of each city in each
+    period, with one frame for every frame_step periods, where values[i, j] is the
+    average of cities[i] in periods[j] (as returned by align_periods).
+
+    Each frame holds only the averages of its period, so the figure grows with the
+    number of cities times the number of frames.
+
+    Preconditions:
+     - values.shape == (len(cities), len(periods))
+     - len(periods) >= 1
+     - frame_step >= 1
+
+    >>> fig = temperature_animation(['a', 'b'], [2000, 2001, 2002],
+    ...                             np.array([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]), frame_step=2)
+    >>> [(frame.name, frame.data[0].y.tolist()) for frame in fig.frames]
+    [('2000', [1.0, 4.0]), ('2002', [3.0, 6.0])]
+    """
+    import plotly.graph_objects as go
+
+    shown = range(0, len(periods), frame_step)
+    frames = [go.Frame(data=[go.Bar(x=cities, y=values[:, j])], name=str(periods[j]))
+              for j in shown]
+
+    play = {'frame': {'duration': 100, 'redraw': False}, 'fromcurrent': True,
+            'transition': {'duration': 0}}
+    pause = {'frame': {'duration': 0, 'redraw': False}, 'mode': 'immediate'}
+    steps = [{'method': 'animate', 'label': frame.name, 'args': [[frame.name], pause]}
+             for frame in frames]
+
+    fig = go.Figure(data=frames[0].data, frames=frames)
+    fig.update_layout(
+        xaxis_title='city', yaxis_title='temp', yaxis_range=list(range_y),
+        updatemenus=[{'type': 'buttons', 'direction': 'left', 'x': 0.1, 'y': 0,
+                      'xanchor': 'right', 'yanchor': 'top', 'pad': {'r': 10, 't': 70},
+                      'buttons': [{'label': '▶', 'method': 'animate',
+                                   'args': [None, play]},
+                                  {'label': '◼', 'method': 'animate',
+                                   'args': [[None], pause]}]}],
+        sliders=[{'steps': steps, 'x': 0.1, 'y': 0, 'len': 0.9, 'pad': {'b': 10, 't': 60},
+                  'currentvalue': {'prefix': 'period='}}])
+    return fig
+
+
+@instrumented
+def write_figure(figure: 'go.Figure', file_path: str) -> str:
+    """Write figure to file_path and return file_path. An .html file loads plotly.js from
+    its CDN instead of including it; any other file is written as a static image by
+    kaleido, in the format of its extension.
+    """
+    if file_path.endswith('.html'):
+        figure.write_html(file_path, include_plotlyjs='cdn')
+    else:
+        figure.write_image(file_path)
+    return file_path
+
+
+class FigureExporter:
+    """Writes figures to a directory from a pool of background threads, so that the
+    figures of a batch are written while the next ones are built.
+
+    Instance Attributes:
+     - directory: the directory the figures are written to
+     - figure_format: the extension of the files the figures are written to
+     - executor: the threads the figures are written from
+     - futures: the writes submitted so far, each returning the path it wrote to
+
+    >>> import shutil, tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> with FigureExporter(directory) as exporter:
+    ...     future = exporter.submit('line', scatter_figure(('x', [1.0, 2.0]), ('y', [3.0, 4.0])))
+    >>> os.path.basename(future.result())
+    'line.html'
+    >>> shutil.rmtree(directory)
+    """
+    directory: str
+    figure_format: str
+    executor: ThreadPoolExecutor
+    futures: List[Future]
+
+    def __init__(self, directory: str, figure_format: str = 'html',
+                 max_workers: Optional[int] = None) -> None:
+        """Create directory if it does not exist, and start a pool of max_workers
+        threads (by default, as many as ThreadPoolExecutor chooses).
+
+        Preconditions:
+         - figure_format in ['html', 'png', 'svg', 'pdf']
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.figure_format = figure_format
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='figure-export')
+        self.futures = []
+
+    def submit(self, name: str, figure: 'go.Figure') -> Future:
+        """Start writing figure to the file called name in self.directory, and return
+        the future of the write."""
+        path = os.path.join(self.directory, f'{name}.{self.figure_format}')
+        future = self.executor.submit(write_figure, figure, path)
+        self.futures.append(future)
+        return future
+
+    def close(self) -> List[str]:
+        """Wait for every write to finish, stop the threads, and return the paths
+        written to, raising the error of the first write that failed, if any."""
+        self.executor.shutdown(wait=True)
+        return [future.result() for future in self.futures]
+
+    def __enter__(self) -> 'FigureExporter':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 100,
+        'extra-imports': ['python_ta.contracts', 'concurrent.futures', 'os', 'typing', 'numpy',
+                          'plotly.graph_objects', 'plotly.subplots', 'instrumentation',
+                          'regression'],
+        'allowed-io': ['write_figure'],
+        'disable': ['C0415']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+
+    import doctest
+    doctest.testmod()
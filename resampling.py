@@ -0,0 +1,324 @@
+"""forestfires Resampling
+
+Overview and Description
+========================
+
+This Python module computes bootstrap confidence intervals and permutation
+p-values for the fits of the models. The coefficient of each predictor of a
+multiple regression is tested by the Freedman-Lane procedure, permuting the
+residuals of the fit on the other predictors rather than the response.
+
+Rather than fitting each resample in turn, a batch of resamples is drawn as a
+matrix with one row of row indices per resample, the data is gathered through
+it into arrays with one more dimension, and every resample in the batch is
+fitted at once with array operations. Batches are bounded in size so memory
+stays bounded, and can be spread over several processes, each drawing its own
+resamples from an independent random stream.
+
+Copyright and Usage Information
+===============================
+
+All forms of distribution of this code, whether as given or with any changes,
+are expressly prohibited.
+
+This file is Copyright (c) 2020 Will Assad, Jessica Zhai,
+Raghav Banka, and Fatimeh Hassan.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from instrumentation import instrumented
+
+# the most values of each array gathered through a batch of resamples at once
+BATCH_VALUES = 1 << 22
+
+
+@dataclass
+class Intervals:
+    """Bootstrap confidence intervals of a set of estimates, with their permutation
+    p-values if they were computed.
+
+    Attributes:
+     - names: the name of each estimate
+     - estimates: the value of each estimate on the original data
+     - lower: the lower bound of the confidence interval of each estimate
+     - upper: the upper bound of the confidence interval of each estimate
+     - confidence: the probability each interval was computed to cover its estimate
+     - resamples: the number of bootstrap resamples the intervals were computed from
+     - p_values: the permutation p-value of each estimate, which is nan where there is
+                 no test, or None if no permutations were computed
+
+    Representation Invariants:
+     - len(self.estimates) == len(self.lower) == len(self.upper) == len(self.names)
+     - 0 < self.confidence < 1
+    """
+    names: List[str]
+    estimates: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+    confidence: float
+    resamples: int
+    p_values: Optional[np.ndarray] = None
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        """Return a dictionary mapping the name of each estimate to its value, bounds
+        and p-value (if computed).
+
+        >>> intervals = Intervals(['slope'], np.array([2.0]), np.array([1.5]),
+        ...                       np.array([2.5]), 0.95, 100)
+        >>> intervals.as_dict()
+        {'slope': {'estimate': 2.0, 'lower': 1.5, 'upper': 2.5}}
+        """
+        result = {}  # ACCUMULATOR: the estimates described so far
+
+        for i, name in enumerate(self.names):
+            result[name] = {'estimate': float(self.estimates[i]),
+                            'lower': float(self.lower[i]), 'upper': float(self.upper[i])}
+            if self.p_values is not None:
+                result[name]['p_value'] = float(self.p_values[i])
+
+        return result
+
+
+def batched_lines(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Return the intercept and slope of the least squares line through each row of
+    points, where row i of x and y holds the points of resample i.
+
+    Either array may have a single row, which is shared by every resample.
+
+    >>> batched_lines(np.array([[1.0, 2.0, 3.0]]), np.array([[3.0, 5.0, 7.0],
+    ...                                                     [3.0, 3.0, 3.0]])).tolist()
+    [[1.0, 2.0], [3.0, 0.0]]
+    """
+    x_means = x.mean(axis=1, keepdims=True)
+    y_means = y.mean(axis=1, keepdims=True)
+    x_centred = x - x_means
+    slopes = ((x_centred * (y - y_means)).sum(axis=1)
+              / (x_centred * x_centred).sum(axis=1))
+    intercepts = y_means[:, 0] - slopes * x_means[:, 0]
+    return np.column_stack([intercepts, slopes])
+
+
+def batched_regressions(predictors: np.ndarray, response: np.ndarray) -> np.ndarray:
+    """Return the constant and coefficients of the least squares fit of each row of
+    response on the same row of predictors, where predictors[i, j, k] is the value of
+    predictor k in row j of resample i.
+
+    Either array may have a single resample, which is shared by every resample.
+
+    >>> predictors = np.array([[[0.0, 1.0], [1.0, 0.0], [2.0, 1.0], [3.0, 3.0]]])
+    >>> response = np.array([[2.0, 2.0, 6.0, 12.0]])
+    >>> [round(c, 6) for c in batched_regressions(predictors, response)[0].tolist()]
+    [0.0, 2.0, 2.0]
+    """
+    predictor_means = predictors.mean(axis=1, keepdims=True)
+    response_means = response.mean(axis=1, keepdims=True)
+    centred = predictors - predictor_means
+
+    # the normal equations of every resample, solved together
+    products = np.swapaxes(centred, 1, 2) @ centred
+    right_sides = np.swapaxes(centred, 1, 2) @ (response - response_means)[:, :, np.newaxis]
+    batch = max(len(products), len(right_sides))
+    products = np.broadcast_to(products, (batch,) + products.shape[1:])
+    right_sides = np.broadcast_to(right_sides, (batch,) + right_sides.shape[1:])
+    slopes = np.linalg.solve(products, right_sides)[..., 0]
+
+    constants = response_means[:, 0] - (slopes * predictor_means[:, 0, :]).sum(axis=1)
+    return np.column_stack([constants, slopes])
+
+
+def line_statistic(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Return batched_lines(x, y), for use as the statistic of resample_statistics."""
+    return batched_lines(x, y)
+
+
+def regression_statistic(predictors: np.ndarray, response: np.ndarray) -> np.ndarray:
+    """Return batched_regressions(predictors, response), for use as the statistic of
+    resample_statistics."""
+    return batched_regressions(predictors, response)
+
+
+def freedman_lane_data(predictors: np.ndarray,
+                       response: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the fitted values and the residuals of the least squares fit of response
+    on every predictor but one, with column k of each for the fit without predictor k,
+    where predictors[j, k] is the value of predictor k in row j.
+
+    These are the data of freedman_lane_statistic, whose permutations are those of the
+    residuals only.
+
+    Preconditions:
+     - predictors.shape[1] >= 1
+     - len(predictors) == len(response)
+
+    >>> predictors = np.array([[0.0, 1.0], [1.0, 0.0], [2.0, 1.0], [3.0, 3.0]])
+    >>> fitted, residuals = freedman_lane_data(predictors, np.array([2.0, 2.0, 6.0, 12.0]))
+    >>> np.allclose(fitted + residuals, [[2.0, 2.0], [2.0, 2.0], [6.0, 6.0], [12.0, 12.0]])
+    True
+    """
+    columns = []  # ACCUMULATOR: the fitted values without each predictor so far
+
+    for k in range(predictors.shape[1]):
+        others = np.delete(predictors, k, axis=1)
+        fit = batched_regressions(others[np.newaxis], response[np.newaxis])[0]
+        columns.append(fit[0] + others @ fit[1:])
+
+    fitted = np.column_stack(columns)
+    return fitted, response[:, np.newaxis] - fitted
+
+
+def freedman_lane_statistic(predictors: np.ndarray, fitted: np.ndarray,
+                            residuals: np.ndarray) -> np.ndarray:
+    """Return, for each resample, nan in place of the constant, then the coefficient of
+    each predictor k in the least squares fit on predictors of fitted[..., k] plus the
+    residuals[..., k] of that resample, for use as the statistic of resample_statistics
+    with permute=True on the data returned by freedman_lane_data.
+
+    With the residuals permuted, this is the Freedman-Lane permutation test of each
+    coefficient: the fit without predictor k is kept, so only the association of the
+    response with predictor k, and not with the other predictors, is broken.
+
+    >>> predictors = np.array([[0.0, 1.0], [1.0, 0.0], [2.0, 1.0], [3.0, 3.0]])
+    >>> data = freedman_lane_data(predictors, np.array([2.0, 2.0, 6.0, 12.0]))
+    >>> statistic = freedman_lane_statistic(*(array[np.newaxis] for array in (predictors,)
+    ...                                       + data))
+    >>> [round(c, 6) for c in statistic[0, 1:].tolist()]
+    [2.0, 2.0]
+    """
+    batch = max(len(predictors), len(residuals))
+    coefficients = np.full((batch, predictors.shape[2] + 1), np.nan)
+
+    for k in range(predictors.shape[2]):
+        fits = batched_regressions(predictors, fitted[..., k] + residuals[..., k])
+        coefficients[:, k + 1] = fits[:, k + 1]
+
+    return coefficients
+
+
+def resample_shard(statistic: Callable[..., np.ndarray], data: Tuple[np.ndarray, ...],
+                   resamples: int, seed: np.random.SeedSequence, permute: bool) -> np.ndarray:
+    """Return the value of statistic on each of resamples resamples of data, drawn from
+    the random stream of seed, with one row per resample.
+
+    If permute is False, each resample is a bootstrap resample: rows of data drawn with
+    replacement, the same rows from every array of data. If permute is True, each
+    resample is a random permutation of the rows of the last array of data only, and
+    the other arrays are left as they are.
+
+    statistic is called with each array of data gathered into an array with a leading
+    dimension of resamples (of size 1 for the arrays left as they are).
+
+    Preconditions:
+     - len(data) >= 1
+     - len({len(array) for array in data}) == 1
+     - resamples >= 0
+    """
+    rng = np.random.default_rng(seed)
+    n = len(data[-1])
+    batch_size = max(1, BATCH_VALUES // max(n * max(array[0].size for array in data), 1))
+    results = []  # ACCUMULATOR: the values of statistic on each batch so far
+
+    for start in range(0, resamples, batch_size):
+        size = min(batch_size, resamples - start)
+        if permute:
+            indices = rng.permuted(np.broadcast_to(np.arange(n), (size, n)), axis=1)
+            gathered = [array[np.newaxis] for array in data[:-1]] + [data[-1][indices]]
+        else:
+            indices = rng.integers(0, n, size=(size, n))
+            gathered = [array[indices] for array in data]
+        results.append(statistic(*gathered))
+
+    return np.concatenate(results) if results else np.zeros((0, 0))
+
+
+@instrumented
+def resample_statistics(statistic: Callable[..., np.ndarray], data: Tuple[np.ndarray, ...],
+                        resamples: int, seed: Optional[int] = None, permute: bool = False,
+                        workers: Optional[int] = None) -> np.ndarray:
+    """Return the value of statistic on each of resamples resamples of data, as by
+    resample_shard, with one row per resample.
+
+    If workers is given, the resamples are split into that many shards computed in
+    separate processes, in which case statistic must be a function defined at the top
+    level of a module. The result depends on seed and workers, but not on how the
+    shards are scheduled.
+
+    Preconditions:
+     - len(data) >= 1
+     - len({len(array) for array in data}) == 1
+     - resamples >= 1
+     - workers is None or workers >= 1
+
+    >>> x, y = np.arange(10.0), 2 * np.arange(10.0) + 1
+    >>> lines = resample_statistics(line_statistic, (x, y), 50, seed=0)
+    >>> (lines.shape, np.allclose(lines, [1.0, 2.0]))
+    ((50, 2), True)
+    """
+    data = tuple(np.asarray(array, dtype=float) for array in data)
+    shards = 1 if workers is None else workers
+    # permutations and bootstrap resamples with the same seed come from different streams
+    seeds = np.random.SeedSequence(seed, spawn_key=(int(permute),)).spawn(shards)
+    sizes = [resamples // shards + (1 if i < resamples % shards else 0) for i in range(shards)]
+
+    if workers is None:
+        return resample_shard(statistic, data, resamples, seeds[0], permute)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(resample_shard, [statistic] * shards, [data] * shards,
+                               sizes, seeds, [permute] * shards)
+        return np.concatenate([result for result in results if len(result) > 0])
+
+
+def confidence_intervals(names: List[str], estimates: np.ndarray, resampled: np.ndarray,
+                         confidence: float,
+                         permuted: Optional[np.ndarray] = None) -> Intervals:
+    """Return the percentile bootstrap intervals of estimates, given their values on
+    each resample (one row per resample) and, optionally, on each permutation, from
+    which two-sided p-values are computed for every estimate but the first (which is
+    the constant or intercept of a fit, and is given a p-value of nan).
+
+    Preconditions:
+     - 0 < confidence < 1
+     - resampled.shape[1] == len(names) == len(estimates)
+
+    >>> resampled = np.column_stack([np.zeros(101), np.linspace(1.0, 3.0, 101)])
+    >>> permuted = np.column_stack([np.zeros(99), np.linspace(-1.0, 1.0, 99)])
+    >>> intervals = confidence_intervals(['intercept', 'slope'], np.array([0.0, 2.0]),
+    ...                                  resampled, 0.9, permuted)
+    >>> (np.round(intervals.lower, 6).tolist(), np.round(intervals.upper, 6).tolist())
+    ([0.0, 1.1], [0.0, 2.9])
+    >>> intervals.p_values.tolist()[1]
+    0.01
+    """
+    tail = (1 - confidence) / 2
+    lower, upper = np.quantile(resampled, [tail, 1 - tail], axis=0)
+
+    p_values = None
+    if permuted is not None:
+        # the observed fit counts as one of the permutations, so p-values are never 0
+        extreme = (np.abs(permuted) >= np.abs(estimates)[np.newaxis, :]).sum(axis=0)
+        p_values = (extreme + 1) / (len(permuted) + 1)
+        p_values[0] = np.nan
+
+    return Intervals(names=list(names), estimates=np.asarray(estimates, dtype=float),
+                     lower=lower, upper=upper, confidence=confidence,
+                     resamples=len(resampled), p_values=p_values)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 100,
+        'extra-imports': ['python_ta.contracts', 'concurrent.futures', 'dataclasses', 'typing',
+                          'numpy', 'instrumentation'],
+        'allowed-io': []
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,353 @@
+"""forestfires Result Cache
+
+Overview and Description
+========================
+
+This Python module keeps the results of the models (average temperatures and
+fits) on disk, so that a process does not repeat the work of an earlier process
+on the same data. Parsed data is not kept here: a pickled copy would take a
+private copy of the columns in every process, while the .npy files written by
+entities.convert_to_binary are memory-mapped and share their pages.
+
+Each result is stored in its own file, addressed by a hash of the contents of
+the data file it was computed from and of the query that computed it (the
+method and its arguments), so it is found again for as long as the contents of
+the data file are unchanged, even if the file is copied or touched. Files are
+written atomically, so any number of processes can share a cache directory
+without locks, and the least recently used results are removed once the
+directory grows past a size limit. The directory is only scanned for its size
+when a running estimate of it, kept as results are stored, passes the limit.
+
+Setting the environment variable FORESTFIRES_CACHE to a directory makes every
+Model created without a result cache share one in that directory.
+
+Results are stored with pickle, so a cache directory must only be writable by
+users whose results are trusted.
+
+Copyright and Usage Information
+===============================
+
+All forms of distribution of this code, whether as given or with any changes,
+are expressly prohibited.
+
+This file is Copyright (c) 2020 Will Assad, Jessica Zhai,
+Raghav Banka, and Fatimeh Hassan.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ENVIRONMENT_VARIABLE = 'FORESTFIRES_CACHE'
+
+# changed whenever the form of any stored result changes, so old results are not read
+FORMAT_VERSION = 1
+
+# the most bytes of results a cache directory holds by default
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# the fraction of its size limit that an eviction shrinks a cache directory to, so that
+# the directory is not scanned again on every store once it is full
+EVICTION_TARGET = 0.75
+
+# the extension of the files results are stored in
+RESULT_EXTENSION = '.pickle'
+
+# the extension of the files results are written to before they are renamed
+TEMPORARY_EXTENSION = '.tmp'
+
+# how many seconds after it was last written a temporary file is taken to have been left
+# by a process that stopped before renaming it, and is removed
+TEMPORARY_GRACE_SECONDS = 60 * 60
+
+
+class ResultCache:
+    """A directory of results, each keyed by the contents of a data file and a query.
+
+    Instance Attributes:
+     - directory: the directory the results are stored in
+     - max_bytes: the most bytes of results the directory holds after a result is stored
+     - digests: maps the absolute path, modification time and size of each data file
+                hashed by this cache to the hash of its contents
+     - hits: the number of lookups that found their result
+     - misses: the number of lookups that had to compute their result
+     - evictions: the number of results this cache removed to stay within max_bytes
+     - estimated_bytes: the bytes of results in the directory when it was last scanned,
+                        plus those this cache has stored since, or None if it has not
+                        been scanned yet
+
+    Representation Invariants:
+     - self.max_bytes >= 0
+     - self.estimated_bytes is None or self.estimated_bytes >= 0
+
+    >>> import shutil
+    >>> directory = tempfile.mkdtemp()
+    >>> first, second = ResultCache(directory), ResultCache(directory)
+    >>> first.get('data/forestfires.csv', ('answer',), lambda: 42)
+    42
+    >>> second.get('data/forestfires.csv', ('answer',), lambda: 0)
+    42
+    >>> (first.stats()['misses'], second.stats()['hits'])
+    (1, 1)
+    >>> shutil.rmtree(directory)
+    """
+    directory: str
+    max_bytes: int
+    digests: Dict[Tuple[str, int, int], str]
+    hits: int
+    misses: int
+    evictions: int
+    estimated_bytes: Optional[int]
+    _lock: threading.Lock
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.digests = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.estimated_bytes = None
+        self._lock = threading.Lock()
+
+    def get(self, file_path: str, query: Tuple, compute: Callable[[], Any]) -> Any:
+        """Return the result of query on the contents of the file at file_path, computing
+        and storing it with compute if it is not in this cache.
+
+        query must be a tuple of values whose repr identifies them, such as strings,
+        numbers, None and tuples of these.
+
+        Preconditions:
+         - os.path.exists(file_path)
+        """
+        path = self.path(file_path, query)
+        try:
+            with open(path, 'rb') as file:
+                result = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            # missing, removed by another process, or written by a different version of
+            # the program, so compute it again
+            with self._lock:
+                self.misses += 1
+            result = compute()
+            try:
+                self.store(path, result)
+            except OSError:
+                pass  # a full or read-only disk only costs computing the result again
+            return result
+
+        touch(path)
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def path(self, file_path: str, query: Tuple) -> str:
+        """Return the path of the file the result of query on the contents of the file
+        at file_path is stored in.
+
+        Preconditions:
+         - os.path.exists(file_path)
+        """
+        address = hashlib.sha256(
+            repr((FORMAT_VERSION, self.digest(file_path), query)).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, address[:2], address + RESULT_EXTENSION)
+
+    def digest(self, file_path: str) -> str:
+        """Return the SHA-256 hash of the contents of the file at file_path, which is
+        only read again once its modification time or size changes.
+
+        Preconditions:
+         - os.path.exists(file_path)
+        """
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if key in self.digests:
+                return self.digests[key]
+
+        file_hash = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                file_hash.update(block)
+
+        with self._lock:
+            self.digests[key] = file_hash.hexdigest()
+        return self.digests[key]
+
+    def store(self, path: str, result: Any) -> None:
+        """Write result to path, then, if the estimated bytes of results in the directory
+        are more than self.max_bytes, evict the least recently used results.
+
+        The result is written to a temporary file that is then renamed to path, so other
+        processes see either no file at path or the whole result.
+
+        The estimate only counts the results of other processes when the directory is
+        scanned, so with several processes the directory may grow past self.max_bytes
+        until the estimate of one of them does.
+        """
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=TEMPORARY_EXTENSION)
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+                size = file.tell()
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+        with self._lock:
+            if self.estimated_bytes is not None:
+                self.estimated_bytes += size
+            over_limit = self.estimated_bytes is None or self.estimated_bytes > self.max_bytes
+
+        if over_limit:
+            self.evict()
+
+    def evict(self) -> None:
+        """Scan the directory and remove the least recently used results until it holds
+        at most EVICTION_TARGET * self.max_bytes of results, along with any temporary
+        file last written more than TEMPORARY_GRACE_SECONDS ago.
+
+        >>> import shutil
+        >>> import time
+        >>> cache = ResultCache(tempfile.mkdtemp(), max_bytes=0)
+        >>> cache.get('data/forestfires.csv', ('answer',), lambda: 42)
+        42
+        >>> (cache.stats()['evictions'], cache.size())
+        (1, 0)
+        >>> os.makedirs(os.path.join(cache.directory, '00'))
+        >>> stale = os.path.join(cache.directory, '00', 'stale' + TEMPORARY_EXTENSION)
+        >>> open(stale, 'wb').close()
+        >>> os.utime(stale, (0, time.time() - TEMPORARY_GRACE_SECONDS - 1))
+        >>> cache.evict()
+        >>> os.path.exists(stale)
+        False
+        >>> shutil.rmtree(cache.directory)
+        """
+        self.remove_stale_temporaries()
+
+        entries = sorted(self.entries(), key=lambda entry: entry[1])
+        total = sum(entry[2] for entry in entries)
+
+        for path, _, size in entries:
+            if total <= EVICTION_TARGET * self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # already removed by another process, or (on Windows) open in one
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+        with self._lock:
+            self.estimated_bytes = total
+
+    def remove_stale_temporaries(self) -> None:
+        """Remove every temporary file in the directory that was last written more than
+        TEMPORARY_GRACE_SECONDS ago, which a process stopped before renaming it to its
+        result. Newer ones may still be being written, so they are kept."""
+        cutoff = time.time() - TEMPORARY_GRACE_SECONDS
+
+        for subdirectory in os.scandir(self.directory):
+            if not subdirectory.is_dir():
+                continue
+            for entry in os.scandir(subdirectory.path):
+                if entry.name.endswith(TEMPORARY_EXTENSION):
+                    try:
+                        if entry.stat().st_mtime < cutoff:
+                            os.remove(entry.path)
+                    except OSError:
+                        continue  # renamed or removed by the process writing it
+
+    def entries(self) -> List[Tuple[str, int, int]]:
+        """Return the path, time of last use and size of every result in the directory."""
+        entries = []  # ACCUMULATOR: the results found so far
+
+        for subdirectory in os.scandir(self.directory):
+            if not subdirectory.is_dir():
+                continue
+            for entry in os.scandir(subdirectory.path):
+                if entry.name.endswith(RESULT_EXTENSION):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((entry.path, stat.st_mtime_ns, stat.st_size))
+
+        return entries
+
+    def size(self) -> int:
+        """Return the bytes of results in the directory."""
+        return sum(entry[2] for entry in self.entries())
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hits, misses and evictions of this cache, and the bytes of results
+        in its directory."""
+        with self._lock:
+            counts = {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+        counts['bytes'] = self.size()
+        return counts
+
+    def clear(self) -> None:
+        """Remove every result from the directory."""
+        for path, _, _ in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+        with self._lock:
+            self.estimated_bytes = None
+
+
+def touch(path: str) -> None:
+    """Set the modification time of the file at path to now, which marks its result as
+    the most recently used. Do nothing if the file has been removed."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+# maps each directory named by ENVIRONMENT_VARIABLE to the cache opened in it
+DEFAULT_CACHES = {}
+DEFAULT_CACHES_LOCK = threading.Lock()
+
+
+def default_result_cache() -> Optional[ResultCache]:
+    """Return the ResultCache in the directory named by the environment variable
+    FORESTFIRES_CACHE, or None if it is not set."""
+    directory = os.environ.get(ENVIRONMENT_VARIABLE)
+    if not directory:
+        return None
+
+    with DEFAULT_CACHES_LOCK:
+        if directory not in DEFAULT_CACHES:
+            DEFAULT_CACHES[directory] = ResultCache(directory)
+        return DEFAULT_CACHES[directory]
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 100,
+        'extra-imports': ['python_ta.contracts', 'hashlib', 'os', 'pickle', 'tempfile',
+                          'threading', 'time', 'typing'],
+        'allowed-io': ['ResultCache.get', 'ResultCache.digest', 'ResultCache.store']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+
+    import doctest
+    doctest.testmod()
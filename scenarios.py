@@ -0,0 +1,191 @@
+"""forestfires Scenario Sweeps
+
+Overview and Description
+========================
+
+This Python module projects forest fire variables under many warming
+scenarios at once. A scenario is a city, a year and a warming offset: the
+temperature of the city in that year, as predicted by the line fitted to its
+yearly averages, plus the offset in degrees Celsius. Each target variable is
+then predicted from that temperature by its regression on temperature (and on
+any covariates, which are held at their means in the forest fire data).
+
+Both kinds of fit reduce to a line, so every combination of cities, years,
+offsets and targets is evaluated as one array computation from the cached
+coefficients, with no parsing, fitting or plotting per scenario:
+
+    table = sweep(FIRES_FILE, TEMPERATURES_FILE, ['Braga', 'Lisbon'],
+                  years=range(2030, 2101), offsets=np.linspace(0, 4, 41),
+                  targets=['dc', 'isi', 'area'])
+
+The result is a tidy table, a dictionary mapping each column to an array with
+one value per scenario and target.
+
+Copyright and Usage Information
+===============================
+
+All forms of distribution of this code, whether as given or with any changes,
+are expressly prohibited.
+
+This file is Copyright (c) 2020 Will Assad, Jessica Zhai,
+Raghav Banka, and Fatimeh Hassan.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from entities import DatasetCache, load_temperature_store
+from instrumentation import instrumented
+from models import FitCache, Model
+
+TARGETS = ['dc', 'isi', 'area']
+
+# the forest fire variables each target is regressed on along with temperature, as in
+# the double regression of isi on temperature and humidity
+COVARIATES = {'dc': [], 'isi': ['humidity'], 'area': ['humidity']}
+
+# the columns of the table returned by sweep, in order
+TABLE_COLUMNS = ['city', 'year', 'offset', 'target', 'temperature', 'value']
+
+
+def temperature_lines(models: List[Model],
+                      weighted: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the intercept and slope of the line fitted to the yearly average
+    temperatures of the city of each model in models, by Model.temperature_fit.
+
+    >>> model = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Amadora')
+    >>> intercepts, slopes = temperature_lines([model])
+    >>> round(float(intercepts[0] + slopes[0] * 2060), 3)
+    16.069
+    """
+    fits = [model.temperature_fit(weighted) for model in models]
+    return (np.array([fit.intercept for fit in fits]),
+            np.array([fit.slope for fit in fits]))
+
+
+def target_lines(model: Model, targets: Sequence[str],
+                 covariates: Dict[str, List[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the intercept and slope of the line predicting each target from
+    temperature, given by the regression of the target on temperature and on its
+    covariates in the forest fire data of model, with every covariate held at its mean.
+
+    Preconditions:
+     - all(target in covariates for target in targets)
+     - all('temperature' not in covariates[target] for target in targets)
+
+    >>> model = Model('data/forestfires.csv', 'data/portugaltemperatures.csv', 'Braga')
+    >>> intercepts, slopes = target_lines(model, ['dc'], COVARIATES)
+    >>> fit = model.trendline_fit('temperature', 'dc')
+    >>> bool(np.isclose(intercepts[0], fit.intercept) and np.isclose(slopes[0], fit.slope))
+    True
+    """
+    design = model.fire_design()
+    intercepts = []  # ACCUMULATOR: the intercept of the line of each target so far
+    slopes = []  # ACCUMULATOR: the slope of the line of each target so far
+
+    for target in targets:
+        fit = model.regression(['temperature'] + covariates[target], target)
+        means = np.array([design.means[design.variables.index(covariate)]
+                          for covariate in covariates[target]])
+        intercepts.append(fit.coefficients[0] + fit.coefficients[2:] @ means)
+        slopes.append(fit.coefficients[1])
+
+    return np.array(intercepts, dtype=float), np.array(slopes, dtype=float)
+
+
+@instrumented
+def sweep_models(models: List[Model], years: Sequence[int], offsets: Sequence[float] = (0.0,),
+                 targets: Sequence[str] = ('dc',),
+                 covariates: Optional[Dict[str, List[str]]] = None,
+                 weighted: bool = False) -> Dict[str, np.ndarray]:
+    """Return the table of every scenario of the cities of models (which share their
+    forest fire data), years and offsets, as described by sweep.
+
+    Preconditions:
+     - len(models) >= 1
+     - all(target in TARGETS for target in targets) or covariates is not None
+    """
+    covariates = COVARIATES if covariates is None else covariates
+    city_intercepts, city_slopes = temperature_lines(models, weighted)
+    target_intercepts, target_slopes = target_lines(models[0], targets, covariates)
+    years = np.asarray(years, dtype=float)
+    offsets = np.asarray(offsets, dtype=float)
+
+    # temperatures[c, y, o] is the temperature of city c in year y under offset o
+    temperatures = (city_intercepts[:, np.newaxis, np.newaxis]
+                    + city_slopes[:, np.newaxis, np.newaxis] * years[:, np.newaxis]
+                    + offsets)
+    # values[c, y, o, t] is the value of target t in that scenario
+    values = target_intercepts + target_slopes * temperatures[..., np.newaxis]
+
+    cities, rows, columns, kinds = np.indices(values.shape).reshape(4, -1)
+    return {'city': np.array([model.city for model in models])[cities],
+            'year': years.astype(np.int64)[rows],
+            'offset': offsets[columns],
+            'target': np.array(targets)[kinds],
+            'temperature': np.repeat(temperatures.ravel(), len(targets)),
+            'value': values.ravel()}
+
+
+def sweep(fires_file: str, temperatures_file: str, cities: Optional[List[str]] = None,
+          years: Sequence[int] = (2060,), offsets: Sequence[float] = (0.0,),
+          targets: Sequence[str] = ('dc',), covariates: Optional[Dict[str, List[str]]] = None,
+          weighted: bool = False, cache: Optional[DatasetCache] = None,
+          fits: Optional[FitCache] = None) -> Dict[str, np.ndarray]:
+    """Return the table of every scenario of cities (or every city in temperatures_file
+    if cities is None), years and offsets, with one row per scenario and target.
+
+    The table maps each of TABLE_COLUMNS to an array of its values: the city, year and
+    warming offset of the scenario, the target, the temperature of the scenario, and
+    the predicted value of the target. Targets are regressed on temperature and on
+    their covariates (COVARIATES by default), and temperatures are predicted by the
+    weighted fit of Model.temperature_fit if weighted is True.
+
+    Fits are taken from fits, and stored there, so that repeated sweeps of the same
+    files pass a shared FitCache to skip fitting altogether.
+
+    Preconditions:
+     - os.path.exists(fires_file)
+     - os.path.exists(temperatures_file)
+     - cities is None or all(city in the cities of temperatures_file for city in cities)
+     - all(target in TARGETS for target in targets) or covariates is not None
+
+    >>> table = sweep('data/forestfires.csv', 'data/portugaltemperatures.csv', ['Braga'],
+    ...               years=[2060], offsets=[0.0, 2.0], targets=['dc', 'isi'])
+    >>> [(row['offset'], row['target'], round(row['value'], 1)) for row in table_records(table)]
+    [(0.0, 'dc', 451.8), (0.0, 'isi', 7.4), (2.0, 'dc', 494.2), (2.0, 'isi', 8.1)]
+    """
+    cache = DatasetCache() if cache is None else cache
+    fits = FitCache() if fits is None else fits
+    if cities is None:
+        cities = cache.get(temperatures_file, load_temperature_store).cities()
+
+    models = [Model(fires_file, temperatures_file, city, cache, fits=fits) for city in cities]
+    return sweep_models(models, years, offsets, targets, covariates, weighted)
+
+
+def table_records(table: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """Return the rows of table (as returned by sweep) as a list of records, one
+    dictionary per row mapping each column to its value.
+
+    >>> table_records({'city': np.array(['Braga']), 'value': np.array([1.5])})
+    [{'city': 'Braga', 'value': 1.5}]
+    """
+    return [dict(zip(table.keys(), row))
+            for row in zip(*(column.tolist() for column in table.values()))]
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 100,
+        'extra-imports': ['python_ta.contracts', 'typing', 'numpy', 'entities',
+                          'instrumentation', 'models'],
+        'allowed-io': []
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+
+    import doctest
+    doctest.testmod()
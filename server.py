@@ -0,0 +1,321 @@
+"""forestfires Query Server
+
+Overview and Description
+========================
+
+This Python module serves the results of the models over HTTP as JSON, from one
+long-running process. Both datasets are loaded once at startup, fits run in a
+pool of worker threads so that the event loop never waits on them, and
+identical requests that arrive while one is being computed share its result.
+
+    python server.py --port 8080
+
+Run without arguments, this module is checked with python_ta and its doctests.
+
+Every endpoint takes GET requests with the parameters in the query string:
+
+ - /cities
+ - /trendline?x=temperature&y=dc[&start=10][&end=30][&months=6,9][&percentiles=5,95]
+ - /double_regression?x1=temperature&x2=humidity&y=isi
+ - /predict_temperature?city=Braga&year=2040&year=2060[&weighted=true]
+ - /dc_projection?city=Braga[&year=2060][&weighted=true]
+
+With weighted=true, temperatures are predicted by the weighted fit of
+Model.temperature_fit, and a projection without a year uses the inverse-variance
+weighted yearly averages of Model.weighted_temperature_groups.
+
+Copyright and Usage Information
+===============================
+
+All forms of distribution of this code, whether as given or with any changes,
+are expressly prohibited.
+
+This file is Copyright (c) 2020 Will Assad, Jessica Zhai,
+Raghav Banka, and Fatimeh Hassan.
+"""
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+from entities import FIRE_VARIABLES, DatasetCache, load_forestfire_columns, \
+    load_temperature_store
+from models import FitCache, Model
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               500: 'Internal Server Error'}
+
+
+class QueryError(Exception):
+    """An error in a request, to be reported to the client with the given HTTP status."""
+    status: int
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class QueryServer:
+    """A server of model results for every city of a temperature file.
+
+    Instance Attributes:
+     - fires_file: the path of the forest fire data
+     - temperatures_file: the path of the temperature data
+     - cache: the parsed datasets, shared by every model
+     - fits: the fitted models, shared by every model
+     - executor: the worker threads that compute results
+     - in_flight: maps each request being computed to the future of its result
+
+    >>> server = QueryServer('data/forestfires.csv', 'data/portugaltemperatures.csv')
+    >>> server.compute('/predict_temperature', {'city': ['Amadora'], 'year': ['2060']})
+    {'city': 'Amadora', 'predictions': {'2060': 16.06886913640867}}
+    >>> server.compute('/trendline', {'x': ['temperature'], 'y': ['dc'], 'months': ['13,14']})
+    Traceback (most recent call last):
+    ...
+    server.QueryError: months must be from 1 to 12, not (13, 14)
+    >>> server.compute('/double_regression', {'x1': ['ffmc'], 'x2': ['ffmc'], 'y': ['dc']})
+    Traceback (most recent call last):
+    ...
+    server.QueryError: ffmc is constant or a linear combination of ['ffmc']
+    """
+    fires_file: str
+    temperatures_file: str
+    cache: DatasetCache
+    fits: FitCache
+    executor: ThreadPoolExecutor
+    in_flight: Dict[Tuple, asyncio.Future]
+
+    def __init__(self, fires_file: str, temperatures_file: str,
+                 max_workers: Optional[int] = None) -> None:
+        self.fires_file = fires_file
+        self.temperatures_file = temperatures_file
+        self.cache = DatasetCache()
+        self.fits = FitCache()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.in_flight = {}
+
+    def preload(self) -> None:
+        """Load both datasets into self.cache."""
+        self.cache.get(self.fires_file, load_forestfire_columns)
+        self.cache.get(self.temperatures_file, load_temperature_store)
+
+    def cities(self) -> List[str]:
+        """Return the cities of the temperature data."""
+        return self.cache.get(self.temperatures_file, load_temperature_store).cities()
+
+    def model(self, city: str) -> Model:
+        """Return a model of city sharing this server's caches.
+
+        Preconditions:
+         - city is None or city in self.cities()
+        """
+        return Model(self.fires_file, self.temperatures_file, city, self.cache, fits=self.fits)
+
+    def compute(self, path: str, params: Dict[str, List[str]]) -> Any:
+        """Return the result of the request for path with the given query parameters.
+
+        Raise QueryError if the path does not exist or the parameters are invalid.
+        """
+        if path == '/cities':
+            return self.cities()
+        elif path == '/trendline':
+            x, y = variable(params, 'x'), variable(params, 'y')
+            start, end = numbers(params, 'start', 1), numbers(params, 'end', 1)
+            domain = {'start': None if start is None else start[0],
+                      'end': None if end is None else end[0],
+                      'months': numbers(params, 'months', 2, int),
+                      'percentiles': numbers(params, 'percentiles', 2)}
+            try:
+                fit = self.model(self.cities()[0]).trendline_fit(x, y, **domain)
+            except ValueError as error:
+                # an invalid month window or percentiles, or too few points to fit a line
+                raise QueryError(400, str(error)) from error
+            return {'x': x, 'y': y, **domain, 'intercept': fit.intercept,
+                    'slope': fit.slope, 'r_squared': fit.r_squared}
+        elif path == '/double_regression':
+            x1, x2, y = variable(params, 'x1'), variable(params, 'x2'), variable(params, 'y')
+            try:
+                fit = self.model(self.cities()[0]).regression([x1, x2], y)
+            except np.linalg.LinAlgError as error:
+                # x1 and x2 are the same variable, or one is constant
+                raise QueryError(400, str(error)) from error
+            constant, x1_coefficient, x2_coefficient = fit.coefficients.tolist()
+            return {'x1': x1, 'x2': x2, 'y': y, 'constant': constant,
+                    'x1_coefficient': x1_coefficient, 'x2_coefficient': x2_coefficient,
+                    'r_squared': fit.r_squared}
+        elif path in {'/predict_temperature', '/dc_projection'}:
+            return self.compute_city(path, params)
+        else:
+            raise QueryError(404, f'no such endpoint: {path}')
+
+    def compute_city(self, path: str, params: Dict[str, List[str]]) -> Dict[str, Any]:
+        """Return the result of a '/predict_temperature' or '/dc_projection' request."""
+        city = params.get('city', [''])[0]
+        if city not in self.cities():
+            raise QueryError(400, f'unknown city: {city!r}')
+        model = self.model(city)
+
+        try:
+            years = np.array([int(year) for year in params.get('year', [])], dtype=np.int64)
+        except ValueError:
+            raise QueryError(400, 'year must be an integer')
+        weighted = flag(params, 'weighted')
+
+        if path == '/predict_temperature':
+            if len(years) == 0:
+                raise QueryError(400, 'missing parameter: year')
+            predictions = model.predict_temperature(years, weighted).tolist()
+            return {'city': city,
+                    'predictions': dict(zip([str(year) for year in years], predictions))}
+        elif len(years) == 0:
+            return {'city': city, 'projection': {str(year): dc for year, dc
+                                                 in model.project_dc(weighted).items()}}
+        else:
+            predictions = model.predict_dc(years, weighted).tolist()
+            return {'city': city,
+                    'predictions': dict(zip([str(year) for year in years], predictions))}
+
+    async def query(self, path: str, params: Dict[str, List[str]]) -> Any:
+        """Return the result of the request for path with the given query parameters,
+        computed in a worker thread. Requests identical to one already being computed
+        wait for its result instead of computing it again."""
+        key = (path, tuple(sorted((name, tuple(values)) for name, values in params.items())))
+
+        if key not in self.in_flight:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, self.compute, path, params)
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+
+        # shield the shared future, so one client disconnecting does not cancel the others
+        return await asyncio.shield(self.in_flight[key])
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer one HTTP request read from reader and close the connection."""
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            # skip the headers, which no endpoint uses
+            while (await reader.readline()) not in {b'\r\n', b'\n', b''}:
+                pass
+
+            if len(request_line) != 3:
+                raise QueryError(400, 'malformed request line')
+            if request_line[0] != 'GET':
+                raise QueryError(405, 'only GET is supported')
+
+            url = urlsplit(request_line[1])
+            status, body = 200, await self.query(url.path, parse_qs(url.query))
+        except QueryError as error:
+            status, body = error.status, {'error': str(error)}
+        except ValueError as error:
+            status, body = 400, {'error': str(error)}
+        except Exception as error:
+            # any other failure is a fault of the server, which must still answer
+            status, body = 500, {'error': f'{type(error).__name__}: {error}'}
+
+        payload = json.dumps(body).encode('utf-8')
+        try:
+            writer.write(f'HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n'
+                         f'Content-Type: application/json\r\n'
+                         f'Content-Length: {len(payload)}\r\n'
+                         f'Connection: close\r\n\r\n'.encode('latin-1') + payload)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int) -> None:
+        """Preload the datasets and answer requests on host and port until cancelled."""
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.preload)
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def variable(params: Dict[str, List[str]], name: str) -> str:
+    """Return the forest fire variable given as parameter name, raising QueryError if
+    it is missing or not a forest fire variable.
+
+    >>> variable({'x': ['dc']}, 'x')
+    'dc'
+    """
+    value = params.get(name, [''])[0]
+    if value not in FIRE_VARIABLES:
+        raise QueryError(400, f'{name} must be one of {", ".join(FIRE_VARIABLES)}')
+    return value
+
+
+def numbers(params: Dict[str, List[str]], name: str, count: int,
+            kind: type = float) -> Optional[Tuple]:
+    """Return the count comma-separated numbers of the given kind given as parameter
+    name, or None if it is missing, raising QueryError if it is malformed.
+
+    >>> numbers({'months': ['6,9']}, 'months', 2, int)
+    (6, 9)
+    """
+    if name not in params:
+        return None
+
+    try:
+        values = tuple(kind(value) for value in params[name][0].split(','))
+    except ValueError:
+        values = ()
+    if len(values) != count:
+        raise QueryError(400, f'{name} must be {count} comma-separated number(s)')
+    return values
+
+
+def flag(params: Dict[str, List[str]], name: str) -> bool:
+    """Return whether the flag given as parameter name is true, raising QueryError if it
+    is neither 'true' nor 'false'. A missing flag is false.
+
+    >>> (flag({'weighted': ['true']}, 'weighted'), flag({}, 'weighted'))
+    (True, False)
+    """
+    value = params.get(name, ['false'])[0].lower()
+    if value not in {'true', 'false'}:
+        raise QueryError(400, f'{name} must be true or false')
+    return value == 'true'
+
+
+def run_cli(arguments: List[str]) -> int:
+    """Serve the datasets named in arguments until interrupted, and return the exit status."""
+    parser = argparse.ArgumentParser(description='Serve forest fire model results over HTTP.')
+    parser.add_argument('--fires', default='data/forestfires.csv')
+    parser.add_argument('--temperatures', default='data/portugaltemperatures.csv')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=None)
+    options = parser.parse_args(arguments)
+
+    server = QueryServer(options.fires, options.temperatures, options.workers)
+    try:
+        asyncio.run(server.serve(options.host, options.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        # serve the datasets, e.g. python server.py --port 8080
+        sys.exit(run_cli(sys.argv[1:]))
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 100,
+        'extra-imports': ['python_ta.contracts', 'argparse', 'asyncio', 'concurrent.futures',
+                          'json', 'sys', 'typing', 'urllib.parse', 'numpy', 'entities',
+                          'models'],
+        'allowed-io': []
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,158 @@
+"""forestfires Spatial Index
+
+Overview and Description
+========================
+
+This Python module indexes forest fire data by the cell of the park's grid
+that each fire was recorded in, given by its X and Y coordinates, so that
+analyses can be restricted to one cell or to the cells around it.
+
+The rows of each cell are found without a scan of the data, and the running
+statistics of the forest fire variables in each cell are computed once, so a
+line or regression over any group of cells is solved from the statistics of
+those cells alone.
+
+Copyright and Usage Information
+===============================
+
+All forms of distribution of this code, whether as given or with any changes,
+are expressly prohibited.
+
+This file is Copyright (c) 2020 Will Assad, Jessica Zhai,
+Raghav Banka, and Fatimeh Hassan.
+"""
+from typing import Dict, List, Tuple
+import numpy as np
+from entities import FIRE_VARIABLES
+from instrumentation import instrumented
+from regression import RunningProducts
+
+
+class GridIndex:
+    """The rows of forest fire data grouped by the cell of the grid they were recorded in.
+
+    Instance Attributes:
+     - order: the indices of the rows of the data, grouped by cell
+     - offsets: maps each (x, y) cell with at least one row to the (start, stop)
+                indices of its rows in order
+     - statistics: maps each cell to the running statistics of the forest fire
+                   variables over its rows
+     - summaries: maps each cell to its number of rows, number of fires that burned
+                  any area, total burned area in hectares and mean DC
+
+    Representation Invariants:
+     - self.offsets.keys() == self.statistics.keys() == self.summaries.keys()
+     - sorted(self.order.tolist()) == list(range(len(self.order)))
+
+    >>> from entities import load_forestfire_columns
+    >>> grid = GridIndex(load_forestfire_columns('data/forestfires.csv'))
+    >>> grid.summaries[(7, 5)]['rows']
+    11
+    >>> len(grid.rows([(7, 5), (8, 6)]))
+    63
+    """
+    order: np.ndarray
+    offsets: Dict[Tuple[int, int], Tuple[int, int]]
+    statistics: Dict[Tuple[int, int], RunningProducts]
+    summaries: Dict[Tuple[int, int], Dict[str, float]]
+
+    def __init__(self, columns: Dict[str, np.ndarray]) -> None:
+        """Index the rows of columns, as returned by load_forestfire_columns.
+
+        Preconditions:
+         - 'x' in columns and 'y' in columns
+         - all(variable in columns for variable in FIRE_VARIABLES)
+        """
+        x = columns['x'].astype(np.int64)
+        y = columns['y'].astype(np.int64)
+        codes = x * (y.max() + 1 if len(y) > 0 else 1) + y
+
+        # a stable sort keeps the rows of each cell in their original order
+        self.order = np.argsort(codes, kind='stable')
+        sorted_codes = codes[self.order]
+        starts = np.flatnonzero(np.diff(sorted_codes, prepend=-1))
+        stops = np.append(starts[1:], len(sorted_codes))
+
+        data = np.column_stack([columns[key] for key in FIRE_VARIABLES])[self.order]
+        area = data[:, FIRE_VARIABLES.index('area')]
+        dc = data[:, FIRE_VARIABLES.index('dc')]
+
+        self.offsets = {}
+        self.statistics = {}
+        self.summaries = {}
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            row = self.order[start]
+            cell = (int(x[row]), int(y[row]))
+            self.offsets[cell] = (start, stop)
+
+            self.statistics[cell] = RunningProducts(FIRE_VARIABLES)
+            self.statistics[cell].add(data[start:stop])
+
+            self.summaries[cell] = {'rows': stop - start,
+                                    'fires': int(np.count_nonzero(area[start:stop] > 0)),
+                                    'burned_area': float(area[start:stop].sum()),
+                                    'mean_dc': float(dc[start:stop].mean())}
+
+    def cells(self) -> List[Tuple[int, int]]:
+        """Return the cells with at least one row, in sorted order."""
+        return sorted(self.offsets)
+
+    def neighborhood(self, cell: Tuple[int, int], radius: int = 0) -> List[Tuple[int, int]]:
+        """Return the cells with at least one row that are at most radius cells away from
+        cell horizontally and vertically (including diagonally), in sorted order.
+
+        Preconditions:
+         - radius >= 0
+
+        >>> from entities import load_forestfire_columns
+        >>> grid = GridIndex(load_forestfire_columns('data/forestfires.csv'))
+        >>> grid.neighborhood((1, 2), 1)
+        [(1, 2), (1, 3), (2, 2), (2, 3)]
+        """
+        return [other for other in self.cells()
+                if max(abs(other[0] - cell[0]), abs(other[1] - cell[1])) <= radius]
+
+    def rows(self, cells: List[Tuple[int, int]]) -> np.ndarray:
+        """Return the indices of the rows recorded in any of cells, grouped by cell.
+
+        Cells with no rows are ignored.
+        """
+        slices = [self.order[slice(*self.offsets[cell])] for cell in cells
+                  if cell in self.offsets]
+        return np.concatenate(slices) if slices else np.zeros(0, dtype=np.int64)
+
+    @instrumented
+    def combined_statistics(self, cells: List[Tuple[int, int]]) -> RunningProducts:
+        """Return the running statistics of the forest fire variables over the rows
+        recorded in any of cells, merged from the statistics of each cell.
+
+        Cells with no rows are ignored.
+
+        >>> from entities import load_forestfire_columns
+        >>> grid = GridIndex(load_forestfire_columns('data/forestfires.csv'))
+        >>> grid.combined_statistics([(7, 5), (8, 6)]).n
+        63
+        """
+        combined = RunningProducts(FIRE_VARIABLES)
+        for cell in cells:
+            if cell in self.statistics:
+                combined.merge(self.statistics[cell])
+        return combined
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 100,
+        'extra-imports': ['python_ta.contracts', 'typing', 'numpy', 'entities',
+                          'instrumentation', 'regression'],
+        'allowed-io': []
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+
+    import doctest
+    doctest.testmod()